@@ -0,0 +1,16 @@
+from typing import Optional, Union
+
+from foxy_farmer.binary_manager.binary_manager import BinaryManager
+from foxy_farmer.binary_manager.dr_plotter_binary_manager import DrPlotterBinaryManager
+from foxy_farmer.binary_manager.gigahorse_binary_manager import GigahorseBinaryManager
+from foxy_farmer.config.backend import Backend
+
+
+def get_backend_binary_manager(backend: Union[str, Backend]) -> Optional[BinaryManager]:
+    """ Returns the binary manager of the binaries a backend runs, BladeBit runs embedded and needs none. """
+    if backend == Backend.Gigahorse:
+        return GigahorseBinaryManager()
+    if backend == Backend.DrPlotter:
+        return DrPlotterBinaryManager()
+
+    return None
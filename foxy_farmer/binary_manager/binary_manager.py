@@ -1,11 +1,15 @@
 from abc import ABC
 from os.path import expanduser, join
 from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
 from sys import platform
 from typing import List
 
 from foxy_farmer.download.download_manager import DownloadManager
 
+bin_cache_path = Path(expanduser("~/.foxy-farmer/bin-cache")).resolve()
+
 
 class BinaryManager(ABC):
     @property
@@ -35,23 +39,52 @@ class BinaryManager(ABC):
     def _binary_sub_directory_paths(self) -> List[str]:
         return []
 
-    _cache_path: Path = Path(expanduser("~/.foxy-farmer/bin-cache")).resolve()
-    _download_manager: DownloadManager = DownloadManager()
+    @property
+    def _product_cache_path(self) -> Path:
+        return Path(join(self._cache_path, self._product_name.lower()))
+
+    @property
+    def _release_cache_path(self) -> Path:
+        return Path(join(self._product_cache_path, self._binary_release))
+
+    @property
+    def binary_directory_path(self) -> Path:
+        return Path(join(self._release_cache_path, *self._binary_sub_directory_paths))
+
+    @property
+    def is_staged(self) -> bool:
+        return Path(join(self.binary_directory_path, self.binary_name)).exists()
+
+    _cache_path: Path = bin_cache_path
+    _download_manager: DownloadManager = DownloadManager(download_directory=Path(join(bin_cache_path, "downloads")))
 
     async def get_binary_directory_path(self) -> Path:
-        product_cache_base_path = Path(join(self._cache_path, self._product_name.lower()))
-        cache_base_path = Path(join(product_cache_base_path, self._binary_release))
-        binary_directory_path = Path(join(cache_base_path, *self._binary_sub_directory_paths))
-        if binary_directory_path.exists():
-            return binary_directory_path
+        if not self.is_staged:
+            await self.stage()
+
+        return self.binary_directory_path
 
-        product_cache_base_path.mkdir(parents=True, exist_ok=True)
+    async def stage(self) -> None:
+        """ Downloads the release next to the cache, it is only moved into the cache once the archive checksums matched. """
+        if self.is_staged:
+            return
+        self._product_cache_path.mkdir(parents=True, exist_ok=True)
+        # Every stage has its own directory, so a background prefetch and a startup never extract into the same one
+        staging_path = Path(mkdtemp(prefix=f".{self._binary_release}.staging-", dir=self._product_cache_path))
         file_description = f"{self._product_name} {self._binary_release}"
-        await self._download_manager.download_archive_and_extract(
-            file_url=self._release_download_url,
-            file_name=self._archive_file_name,
-            to_path=cache_base_path,
-            file_description=file_description,
-        )
-
-        return binary_directory_path
+        try:
+            await self._download_manager.download_archive_and_extract(
+                file_url=self._release_download_url,
+                file_name=self._archive_file_name,
+                to_path=staging_path,
+                file_description=file_description,
+            )
+            if not Path(join(staging_path, *self._binary_sub_directory_paths, self.binary_name)).exists():
+                raise RuntimeError(f"{file_description} does not contain {self.binary_name}")
+            if self.is_staged:
+                return
+            # Releases extracted before staging existed might be incomplete
+            rmtree(self._release_cache_path, ignore_errors=True)
+            staging_path.rename(self._release_cache_path)
+        finally:
+            rmtree(staging_path, ignore_errors=True)
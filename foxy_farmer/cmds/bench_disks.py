@@ -0,0 +1,130 @@
+from datetime import datetime
+from json import dump, load
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+import click
+
+from foxy_farmer.config.foxy_config_manager import FoxyConfigManager
+from foxy_farmer.version import version
+
+
+@click.command("bench-disks", short_help="Benchmark the random read latency of the disks holding plots")
+@click.option("-s", "--samples", default=256, type=click.IntRange(min=1), show_default=True, help="Random reads per disk")
+@click.option("--read-size", default=8192, type=click.IntRange(min=512), show_default=True, help="Bytes per random read")
+@click.option("--threads-per-disk", default=1, type=click.IntRange(min=1), show_default=True, help="Concurrent reads per disk")
+@click.option("--max-threads", default=32, type=click.IntRange(min=1), show_default=True, help="Maximum number of concurrent reads over all disks")
+@click.option("--plot-filter", default=512, type=click.IntRange(min=1), show_default=True, help="Current plot filter, used to estimate the eligible plots per signage point")
+@click.option("--reads-per-lookup", default=7, type=click.IntRange(min=1), show_default=True, help="Random reads needed to look up the qualities of one plot")
+@click.option("-o", "--output", type=click.Path(dir_okay=False, path_type=Path), default=None, help="Path of the json result, defaults to the bench directory in the root path")
+@click.pass_context
+def bench_disks_cmd(
+    ctx,
+    samples: int,
+    read_size: int,
+    threads_per_disk: int,
+    max_threads: int,
+    plot_filter: int,
+    reads_per_lookup: int,
+    output: Optional[Path],
+) -> None:
+    from foxy_farmer.plots.disk_benchmark import DiskBenchmark, group_plots_by_device
+    from foxy_farmer.plots.plot_files import get_configured_plot_paths
+
+    foxy_root: Path = ctx.obj["root_path"]
+    foxy_config = FoxyConfigManager(ctx.obj["config_path"]).load_config_or_get_default()
+    lookup_time_budget_seconds = foxy_config.get("lookup_time_budget_seconds", 5)
+    bench_directory = foxy_root / "bench"
+
+    plot_paths = get_configured_plot_paths(foxy_config)
+    devices = group_plots_by_device(plot_paths)
+    if len(devices) == 0:
+        print("No plots found in the configured plot directories")
+
+        return
+    print(f"Benchmarking {len(devices)} disks with {len(plot_paths)} plots ({samples} random reads of {read_size} bytes per disk) ..")
+
+    started_at = datetime.now()
+    benchmark = DiskBenchmark(
+        read_size=read_size,
+        samples_per_device=samples,
+        threads_per_device=threads_per_disk,
+        max_threads=max_threads,
+    )
+    results = [result.to_dict(plot_filter, reads_per_lookup) for result in benchmark.run(devices)]
+    previous_run = load_previous_run(bench_directory)
+    run_result = {
+        "version": version,
+        "started_at": started_at.isoformat(),
+        "duration_seconds": (datetime.now() - started_at).total_seconds(),
+        "read_size": read_size,
+        "threads_per_disk": threads_per_disk,
+        "plot_filter": plot_filter,
+        "reads_per_lookup": reads_per_lookup,
+        "lookup_time_budget_seconds": lookup_time_budget_seconds,
+        "devices": results,
+    }
+
+    for line in render_bench_disks_result(run_result, previous_run):
+        print(line)
+
+    if output is None:
+        output = bench_directory / f"disks-{started_at.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as output_file:
+        dump(run_result, output_file, indent=2)
+    print(f"Saved the results to {output}")
+
+
+def load_previous_run(bench_directory: Path) -> Optional[Dict[str, Any]]:
+    # The timestamp in the file name sorts chronologically
+    previous_run_paths = sorted(bench_directory.glob("disks-*.json"))
+    if len(previous_run_paths) == 0:
+        return None
+    try:
+        with open(previous_run_paths[-1], "r") as previous_run_file:
+            return load(previous_run_file)
+    except (OSError, ValueError):
+        return None
+
+
+def render_bench_disks_result(run_result: Dict[str, Any], previous_run: Optional[Dict[str, Any]]) -> List[str]:
+    previous_p99_latencies: Dict[str, float] = {}
+    if previous_run is not None:
+        for device in previous_run["devices"]:
+            if device["latency_ms"] is not None:
+                previous_p99_latencies[device["device"]] = device["latency_ms"]["p99"]
+
+    def format_ms(value: Optional[float]) -> str:
+        return f"{value:.2f}ms" if value is not None else "-"
+
+    lookup_time_budget_seconds = run_result["lookup_time_budget_seconds"]
+    lines = [
+        f"{'Disk':<24} {'Plots':>7} {'p50':>9} {'p90':>9} {'p99':>9} {'Max':>9} {'Prev p99':>9} {'Eligible':>9} {'Worst lookup':>13}",
+    ]
+    slow_devices: List[str] = []
+    for device in run_result["devices"]:
+        latency_ms = device["latency_ms"] or {}
+        worst_case_lookup_seconds = device["worst_case_lookup_seconds"]
+        worst_case_lookup = f"{worst_case_lookup_seconds:.2f}s" if worst_case_lookup_seconds is not None else "-"
+        if worst_case_lookup_seconds is not None and worst_case_lookup_seconds > lookup_time_budget_seconds:
+            slow_devices.append(device["device"])
+            worst_case_lookup = f"{worst_case_lookup} !"
+        lines.append(
+            f"{device['device']:<24} {device['plots']:>7} {format_ms(latency_ms.get('p50')):>9} {format_ms(latency_ms.get('p90')):>9} "
+            f"{format_ms(latency_ms.get('p99')):>9} {format_ms(latency_ms.get('max')):>9} "
+            f"{format_ms(previous_p99_latencies.get(device['device'])):>9} {device['worst_case_eligible_plots']:>9} {worst_case_lookup:>13}"
+        )
+        if device["errors"] > 0:
+            lines.append(f"   {device['errors']} reads failed on {device['device']}")
+    lines.append("")
+    lines.append(
+        f"Eligible is the number of eligible plots not exceeded in 99.9% of signage points, the worst lookup assumes "
+        f"{run_result['reads_per_lookup']} reads per eligible plot at p99 latency."
+    )
+    if len(slow_devices) > 0:
+        lines.append(
+            f"The worst case lookup time of {', '.join(slow_devices)} exceeds the lookup time budget of {lookup_time_budget_seconds}s"
+        )
+
+    return lines
@@ -1,37 +1,176 @@
-from asyncio import run
+from asyncio import run, gather, sleep
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Any
+from sys import stdout
+from time import monotonic, time
+from typing import Dict, Any, Optional, List
 
 import click
-from chia.cmds.cmds_util import get_any_service_client
-from chia.cmds.farm_funcs import get_harvesters_summary
-from chia.cmds.peer_funcs import print_connections
-from chia.rpc.farmer_rpc_client import FarmerRpcClient
-from chia.cmds.cmds_util import format_bytes
-from chia.util.network import is_localhost
+from aiohttp import ClientSession, ClientTimeout
+
+from foxy_farmer.config.foxy_config_manager import FoxyConfigManager
 
 
 @click.command("summary", short_help="Summary of farming information")
+@click.option("-w", "--watch", is_flag=True, default=False, help="Keep the summary open and refresh it periodically")
+@click.option("-i", "--interval", default=5.0, type=click.FloatRange(min=1), show_default=True, help="Refresh interval in seconds for --watch")
+@click.option("--json", "output_json", is_flag=True, default=False, help="Output the summary and all plots as a single json document")
+@click.option("--ndjson", "output_ndjson", is_flag=True, default=False, help="Output the summary and all plots as newline delimited json records")
+@click.option("--no-plots", is_flag=True, default=False, help="Only output the aggregates for --json and --ndjson")
+@click.option("--page-size", default=5000, type=click.IntRange(min=1), show_default=True, help="Plots fetched per request for --json and --ndjson")
 @click.pass_context
-def summary_cmd(ctx) -> None:
+def summary_cmd(ctx, watch: bool, interval: float, output_json: bool, output_ndjson: bool, no_plots: bool, page_size: int) -> None:
     foxy_root: Path = ctx.obj["root_path"]
+    foxy_config = FoxyConfigManager(ctx.obj["config_path"]).load_config_or_get_default()
+    monitoring_server_port = foxy_config.get("monitoring_server_port", 18570)
+
+    if output_json or output_ndjson:
+        if watch or (output_json and output_ndjson):
+            raise click.UsageError("--json and --ndjson can not be combined with each other or with --watch")
+        run(print_farm_summary_json(foxy_root, ndjson=output_ndjson, include_plots=not no_plots, page_size=page_size))
+    elif watch:
+        try:
+            run(watch_farm_summary(foxy_root, monitoring_server_port=monitoring_server_port, interval_seconds=interval))
+        except KeyboardInterrupt:
+            pass
+    else:
+        run(print_farm_summary(foxy_root, monitoring_server_port=monitoring_server_port))
+
+
+@dataclass
+class FarmState:
+    harvesters: List[Dict[str, Any]]
+    connections: List[Dict[str, Any]]
+    signage_point_arrivals: Optional[Dict[str, Any]]
+
+
+@dataclass
+class PlotLoadingProgress:
+    files_processed: int
+    measured_at: float
+    files_per_second: Optional[float] = None
+
 
-    run(print_farm_summary(foxy_root))
+@dataclass
+class PlotLoadingTracker:
+    """ Derives the plot loading rate and ETA per harvester from consecutive `syncing` states. """
+    progress: Dict[str, PlotLoadingProgress] = field(default_factory=dict)
 
+    def update(self, harvesters: List[Dict[str, Any]]) -> None:
+        now = monotonic()
+        for harvester in harvesters:
+            node_id = harvester["connection"]["node_id"]
+            syncing = harvester["syncing"]
+            if syncing is None or not syncing["initial"]:
+                self.progress.pop(node_id, None)
+                continue
+            files_processed = syncing["plot_files_processed"]
+            progress = self.progress.get(node_id)
+            if progress is None or files_processed < progress.files_processed:
+                self.progress[node_id] = PlotLoadingProgress(files_processed=files_processed, measured_at=now)
+                continue
+            elapsed = now - progress.measured_at
+            if elapsed <= 0:
+                continue
+            files_per_second = (files_processed - progress.files_processed) / elapsed
+            if progress.files_per_second is not None:
+                files_per_second = 0.7 * progress.files_per_second + 0.3 * files_per_second
+            progress.files_processed = files_processed
+            progress.measured_at = now
+            progress.files_per_second = files_per_second
+
+    def describe(self, harvester: Dict[str, Any]) -> str:
+        progress = self.progress.get(harvester["connection"]["node_id"])
+        if progress is None or progress.files_per_second is None:
+            return ""
+        if progress.files_per_second <= 0:
+            return ", stalled"
+        syncing = harvester["syncing"]
+        remaining_seconds = (syncing["plot_files_total"] - syncing["plot_files_processed"]) / progress.files_per_second
+
+        return f", {progress.files_per_second:.1f} plots/s, ETA {format_duration(remaining_seconds)}"
+
+
+async def print_farm_summary(root_path: Path, monitoring_server_port: int):
+    # Imported lazily so other commands do not pay for loading the chia rpc stack
+    from chia.cmds.cmds_util import get_any_service_client
+    from chia.rpc.farmer_rpc_client import FarmerRpcClient
+
+    async with get_any_service_client(FarmerRpcClient, root_path=root_path) as (farmer_client, _):
+        async with ClientSession(timeout=ClientTimeout(total=2)) as session:
+            farm_state = await get_farm_state(farmer_client, session, monitoring_server_port)
+    for line in render_farm_summary(farm_state):
+        print(line)
 
-async def print_farm_summary(root_path: Path):
-    harvesters_summary = await get_harvesters_summary(farmer_rpc_port=None, root_path=root_path)
 
-    print("Farming status: Farming")
+async def print_farm_summary_json(root_path: Path, ndjson: bool, include_plots: bool, page_size: int):
+    from chia.cmds.cmds_util import get_any_service_client
+    from chia.rpc.farmer_rpc_client import FarmerRpcClient
 
-    class PlotStats:
-        total_plot_size = 0
-        total_effective_plot_size = 0
-        total_plots = 0
+    from foxy_farmer.cmds.farm_summary_json import write_farm_summary_json
+
+    async with get_any_service_client(FarmerRpcClient, root_path=root_path) as (farmer_client, _):
+        await write_farm_summary_json(farmer_client, ndjson=ndjson, include_plots=include_plots, page_size=page_size)
+
+
+async def watch_farm_summary(root_path: Path, monitoring_server_port: int, interval_seconds: float):
+    from chia.cmds.cmds_util import get_any_service_client
+    from chia.rpc.farmer_rpc_client import FarmerRpcClient
+
+    screen = ScreenUpdater()
+    plot_loading_tracker = PlotLoadingTracker()
+    # Keep one rpc client and http session open for the whole session instead of reconnecting on every refresh
+    async with get_any_service_client(FarmerRpcClient, root_path=root_path) as (farmer_client, _):
+        async with ClientSession(timeout=ClientTimeout(total=2)) as session:
+            while True:
+                started_at = monotonic()
+                try:
+                    farm_state = await get_farm_state(farmer_client, session, monitoring_server_port)
+                    plot_loading_tracker.update(farm_state.harvesters)
+                    lines = render_farm_summary(farm_state, plot_loading_tracker)
+                except Exception as e:
+                    lines = [f"Could not fetch the farm state: {e}"]
+                screen.update([f"Foxy-Farmer summary, refreshing every {interval_seconds:g}s (Ctrl+C to exit)", ""] + lines)
+                await sleep(max(0.0, interval_seconds - (monotonic() - started_at)))
+
+
+async def get_farm_state(farmer_client: Any, session: ClientSession, monitoring_server_port: int) -> FarmState:
+    from chia.server.outbound_message import NodeType
+
+    harvesters_summary, connections, signage_point_arrivals = await gather(
+        farmer_client.get_harvesters_summary(),
+        farmer_client.get_connections(node_type=NodeType.FULL_NODE),
+        get_signage_point_arrivals(session, monitoring_server_port),
+    )
+
+    return FarmState(
+        harvesters=harvesters_summary["harvesters"],
+        connections=connections,
+        signage_point_arrivals=signage_point_arrivals,
+    )
+
+
+async def get_signage_point_arrivals(session: ClientSession, monitoring_server_port: int) -> Optional[Dict[str, Any]]:
+    # Only available while foxy-farmer runs with the monitoring server and an embedded farmer
+    try:
+        async with session.get(f"http://127.0.0.1:{monitoring_server_port}/signage_points") as response:
+            return await response.json()
+    except Exception:
+        return None
+
+
+def render_farm_summary(farm_state: FarmState, plot_loading_tracker: Optional[PlotLoadingTracker] = None) -> List[str]:
+    from chia.cmds.cmds_util import format_bytes
+    from chia.util.network import is_localhost
+
+    lines: List[str] = ["Farming status: Farming"]
+    total_plot_size = 0
+    total_effective_plot_size = 0
+    total_plots = 0
 
     harvesters_local: Dict[str, Dict[str, Any]] = {}
-    harvesters_remote: Dict[str, Dict[str, Any]] = {}
-    for harvester in harvesters_summary["harvesters"]:
+    harvesters_remote: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for harvester in farm_state.harvesters:
         ip = harvester["connection"]["host"]
         if is_localhost(ip):
             harvesters_local[harvester["connection"]["node_id"]] = harvester
@@ -40,37 +179,111 @@ async def print_farm_summary(root_path: Path):
                 harvesters_remote[ip] = {}
             harvesters_remote[ip][harvester["connection"]["node_id"]] = harvester
 
-    def process_harvesters(harvester_peers_in: Dict[str, Dict[str, Any]]) -> None:
-        for harvester_peer_id, harvester_dict in harvester_peers_in.items():
+    def render_harvesters(harvester_peers_in: Dict[str, Dict[str, Any]]) -> None:
+        nonlocal total_plot_size, total_effective_plot_size, total_plots
+        for harvester_dict in harvester_peers_in.values():
             syncing = harvester_dict["syncing"]
             if syncing is not None and syncing["initial"]:
-                print(f"   Loading plots: {syncing['plot_files_processed']} / {syncing['plot_files_total']}")
+                progress = plot_loading_tracker.describe(harvester_dict) if plot_loading_tracker is not None else ""
+                lines.append(f"   Loading plots: {syncing['plot_files_processed']} / {syncing['plot_files_total']}{progress}")
             else:
-                total_plot_size_harvester = harvester_dict["total_plot_size"]
-                total_effective_plot_size_harvester = harvester_dict["total_effective_plot_size"]
-                plot_count_harvester = harvester_dict["plots"]
-                PlotStats.total_plot_size += total_plot_size_harvester
-                PlotStats.total_effective_plot_size += total_effective_plot_size_harvester
-                PlotStats.total_plots += plot_count_harvester
-                print(
-                    f"   {plot_count_harvester} plots of size: {format_bytes(total_plot_size_harvester)} on-disk, "
-                    f"{format_bytes(total_effective_plot_size_harvester)}e (effective)"
+                total_plot_size += harvester_dict["total_plot_size"]
+                total_effective_plot_size += harvester_dict["total_effective_plot_size"]
+                total_plots += harvester_dict["plots"]
+                lines.append(
+                    f"   {harvester_dict['plots']} plots of size: {format_bytes(harvester_dict['total_plot_size'])} on-disk, "
+                    f"{format_bytes(harvester_dict['total_effective_plot_size'])}e (effective)"
                 )
 
     if len(harvesters_local) > 0:
-        print(f"Local Harvester{'s' if len(harvesters_local) > 1 else ''}")
-        process_harvesters(harvesters_local)
+        lines.append(f"Local Harvester{'s' if len(harvesters_local) > 1 else ''}")
+        render_harvesters(harvesters_local)
     for harvester_ip, harvester_peers in harvesters_remote.items():
-        print(f"Remote Harvester{'s' if len(harvester_peers) > 1 else ''} for IP: {harvester_ip}")
-        process_harvesters(harvester_peers)
-
-    print(f"Plot count for all harvesters: {PlotStats.total_plots}")
+        lines.append(f"Remote Harvester{'s' if len(harvester_peers) > 1 else ''} for IP: {harvester_ip}")
+        render_harvesters(harvester_peers)
 
-    print(
-        f"Total size of plots: {format_bytes(PlotStats.total_plot_size)}, "
-        f"{format_bytes(PlotStats.total_effective_plot_size)}e (effective)"
+    lines.append(f"Plot count for all harvesters: {total_plots}")
+    lines.append(
+        f"Total size of plots: {format_bytes(total_plot_size)}, "
+        f"{format_bytes(total_effective_plot_size)}e (effective)"
     )
 
-    async with get_any_service_client(FarmerRpcClient, root_path=root_path) as (farmer_client, _):
-        print()
-        await print_connections(farmer_client, {}, [])
+    lines.append("")
+    lines.extend(render_connections(farm_state.connections))
+
+    if farm_state.signage_point_arrivals is not None and len(farm_state.signage_point_arrivals) > 0:
+        lines.append("")
+        lines.extend(render_signage_point_arrivals(farm_state.signage_point_arrivals))
+
+    return lines
+
+
+def render_connections(connections: List[Dict[str, Any]]) -> List[str]:
+    lines = ["Full node connections:"]
+    if len(connections) == 0:
+        lines.append("   None")
+
+        return lines
+    lines.append(f"   {'Address':<46} {'Node ID':<10} {'Last message':>12} {'Up':>10} {'Down':>10}")
+    now = time()
+    for connection in sorted(connections, key=lambda connection: f"{connection['peer_host']}:{connection['peer_port']}"):
+        address = f"{connection['peer_host']}:{connection['peer_port']}"
+        last_message_age = f"{max(0.0, now - connection['last_message_time']):.0f}s ago"
+        lines.append(
+            f"   {address:<46} {connection['node_id'].hex()[:8]:<10} {last_message_age:>12} "
+            f"{connection['bytes_written'] / 2 ** 20:>8.1f}MiB {connection['bytes_read'] / 2 ** 20:>8.1f}MiB"
+        )
+
+    return lines
+
+
+def render_signage_point_arrivals(signage_point_arrivals: Dict[str, Any]) -> List[str]:
+    def format_seconds(seconds: Optional[float]) -> str:
+        return "-" if seconds is None else f"{seconds * 1000:.0f}ms"
+
+    lines = [
+        "Signage point arrival per gateway (lag behind the first arrival):",
+        f"   {'Gateway':<46} {'SPs':>6} {'First':>6} {'p50':>7} {'p90':>7} {'p99':>7} {'Lead p50':>9}",
+    ]
+    for gateway, stats in sorted(signage_point_arrivals.items(), key=lambda item: item[1]["lag_seconds"]["p50"] or 0):
+        lines.append(
+            f"   {gateway:<46} {stats['arrivals']:>6} {stats['first_arrival_share'] * 100:>5.0f}% "
+            f"{format_seconds(stats['lag_seconds']['p50']):>7} {format_seconds(stats['lag_seconds']['p90']):>7} "
+            f"{format_seconds(stats['lag_seconds']['p99']):>7} {format_seconds(stats['lead_seconds']['p50']):>9}"
+        )
+
+    return lines
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60}s"
+
+    return f"{seconds // 3600}h {seconds % 3600 // 60}m"
+
+
+class ScreenUpdater:
+    """ Redraws only the terminal rows which changed since the last update. """
+    _lines: List[str]
+
+    def __init__(self):
+        self._lines = []
+
+    def update(self, lines: List[str]) -> None:
+        output: List[str] = []
+        if len(self._lines) == 0:
+            # Clear the screen once and start at the top left
+            output.append("\x1b[2J\x1b[H")
+        for index, line in enumerate(lines):
+            if index < len(self._lines) and self._lines[index] == line:
+                continue
+            output.append(f"\x1b[{index + 1};1H{line}\x1b[K")
+        if len(lines) < len(self._lines):
+            output.append(f"\x1b[{len(lines) + 1};1H\x1b[J")
+        output.append(f"\x1b[{len(lines) + 1};1H")
+        stdout.write("".join(output))
+        stdout.flush()
+        self._lines = lines
@@ -0,0 +1,235 @@
+from asyncio import Task, create_task
+from dataclasses import dataclass
+from json import dumps
+from ntpath import dirname as windows_dirname
+from posixpath import dirname as posix_dirname
+from sys import stdout
+from typing import Dict, Any, List, Optional, AsyncIterator, TextIO
+
+
+@dataclass
+class PlotAggregate:
+    plots: int = 0
+    file_size: int = 0
+    effective_size: int = 0
+
+    def add(self, plots: int, file_size: int, effective_size: int) -> None:
+        self.plots += plots
+        self.file_size += file_size
+        self.effective_size += effective_size
+
+    def to_dict(self) -> Dict[str, int]:
+        return {"plots": self.plots, "file_size": self.file_size, "effective_size": self.effective_size}
+
+
+def get_aggregate(aggregates: Dict[str, PlotAggregate], key: str) -> PlotAggregate:
+    aggregate = aggregates.get(key)
+    if aggregate is None:
+        aggregate = PlotAggregate()
+        aggregates[key] = aggregate
+
+    return aggregate
+
+
+def get_effective_plot_size(k: int) -> int:
+    from chia.consensus.pos_quality import UI_ACTUAL_SPACE_CONSTANT_FACTOR, _expected_plot_size
+
+    return int(UI_ACTUAL_SPACE_CONSTANT_FACTOR * int(_expected_plot_size(k)))
+
+
+def normalize_hex(value: str) -> str:
+    return value[2:] if value.startswith("0x") else value
+
+
+def get_plot_directory(filename: str) -> str:
+    # Remote harvesters may run on another OS than this command
+    return windows_dirname(filename) if "\\" in filename else posix_dirname(filename)
+
+
+class PlotAggregator:
+    """ Aggregates plots by directory, k-size, compression level and PlotNFT without keeping the plots around. """
+    _launcher_ids: Dict[str, str]
+    _effective_plot_sizes: Dict[int, int]
+    total: PlotAggregate
+    by_directory: Dict[str, PlotAggregate]
+    by_k_size: Dict[str, PlotAggregate]
+    by_compression_level: Dict[str, PlotAggregate]
+    by_plot_nft: Dict[str, PlotAggregate]
+
+    def __init__(self, launcher_ids: Dict[str, str]):
+        self._launcher_ids = launcher_ids
+        self._effective_plot_sizes = {}
+        self.total = PlotAggregate()
+        self.by_directory = {}
+        self.by_k_size = {}
+        self.by_compression_level = {}
+        self.by_plot_nft = {}
+
+    def add(self, plot: Dict[str, Any]) -> None:
+        k = plot["size"]
+        effective_size = self._effective_plot_sizes.get(k)
+        if effective_size is None:
+            effective_size = get_effective_plot_size(k)
+            self._effective_plot_sizes[k] = effective_size
+        compression_level = plot.get("compression_level")
+        pool_contract_puzzle_hash = plot.get("pool_contract_puzzle_hash")
+        if pool_contract_puzzle_hash is not None:
+            pool_contract_puzzle_hash = normalize_hex(pool_contract_puzzle_hash)
+            plot_nft = self._launcher_ids.get(pool_contract_puzzle_hash, pool_contract_puzzle_hash)
+        else:
+            plot_nft = "og"
+
+        self.total.add(1, plot["file_size"], effective_size)
+        for aggregates, key in (
+            (self.by_directory, get_plot_directory(plot["filename"])),
+            (self.by_k_size, str(k)),
+            (self.by_compression_level, str(compression_level or 0)),
+            (self.by_plot_nft, plot_nft),
+        ):
+            get_aggregate(aggregates, key).add(1, plot["file_size"], effective_size)
+
+    def merge(self, other: "PlotAggregator") -> None:
+        self.total.add(other.total.plots, other.total.file_size, other.total.effective_size)
+        for aggregates, other_aggregates in (
+            (self.by_directory, other.by_directory),
+            (self.by_k_size, other.by_k_size),
+            (self.by_compression_level, other.by_compression_level),
+            (self.by_plot_nft, other.by_plot_nft),
+        ):
+            for key, other_aggregate in other_aggregates.items():
+                get_aggregate(aggregates, key).add(other_aggregate.plots, other_aggregate.file_size, other_aggregate.effective_size)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total.to_dict(),
+            "by_directory": {key: aggregate.to_dict() for key, aggregate in self.by_directory.items()},
+            "by_k_size": {key: aggregate.to_dict() for key, aggregate in self.by_k_size.items()},
+            "by_compression_level": {key: aggregate.to_dict() for key, aggregate in self.by_compression_level.items()},
+            "by_plot_nft": {key: aggregate.to_dict() for key, aggregate in self.by_plot_nft.items()},
+        }
+
+
+class SummaryWriter:
+    """ Writes the records as soon as they are available, either as a single json document or as ndjson. """
+    _output: TextIO
+    _ndjson: bool
+    _include_plots: bool
+    _harvester_count: int = 0
+    _plot_count: int = 0
+
+    def __init__(self, ndjson: bool, include_plots: bool, output: TextIO = stdout):
+        self._output = output
+        self._ndjson = ndjson
+        self._include_plots = include_plots
+
+    def begin(self) -> None:
+        if not self._ndjson:
+            self._output.write('{"harvesters":[')
+
+    def begin_harvester(self) -> None:
+        self._plot_count = 0
+        if not self._ndjson:
+            if self._harvester_count > 0:
+                self._output.write(",")
+            self._output.write('{"plots":[')
+        self._harvester_count += 1
+
+    def write_plots(self, node_id: str, plots: List[Dict[str, Any]]) -> None:
+        if not self._include_plots or len(plots) == 0:
+            return
+        if self._ndjson:
+            self._output.write("".join(f"{dumps({'type': 'plot', 'node_id': node_id, **plot}, separators=(',', ':'))}\n" for plot in plots))
+        else:
+            if self._plot_count > 0:
+                self._output.write(",")
+            self._output.write(",".join(dumps(plot, separators=(",", ":")) for plot in plots))
+        self._plot_count += len(plots)
+
+    def end_harvester(self, harvester: Dict[str, Any]) -> None:
+        if self._ndjson:
+            self._output.write(f"{dumps({'type': 'harvester', **harvester}, separators=(',', ':'))}\n")
+        else:
+            # Append the remaining harvester fields to the object opened in `begin_harvester`
+            self._output.write(f"],{dumps(harvester, separators=(',', ':'))[1:]}")
+
+    def end(self, farm: Dict[str, Any]) -> None:
+        if self._ndjson:
+            self._output.write(f"{dumps({'type': 'farm', **farm}, separators=(',', ':'))}\n")
+        else:
+            self._output.write(f"],{dumps(farm, separators=(',', ':'))[1:]}\n")
+        self._output.flush()
+
+
+async def iterate_plot_pages(farmer_client: Any, node_id: str, page_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    from chia.rpc.farmer_rpc_api import PlotInfoRequestData
+    from chia_rs.sized_bytes import bytes32
+    from chia_rs.sized_ints import uint32
+
+    def fetch_page(page: int) -> Task[Dict[str, Any]]:
+        request = PlotInfoRequestData(bytes32.from_hexstr(node_id), uint32(page), uint32(page_size))
+
+        return create_task(farmer_client.get_harvester_plots_valid(request))
+
+    # Fetch the next page while the current one is written
+    next_page_task: Optional[Task[Dict[str, Any]]] = fetch_page(0)
+    page = 0
+    try:
+        while next_page_task is not None:
+            response = await next_page_task
+            page += 1
+            next_page_task = fetch_page(page) if page < response["page_count"] else None
+            yield response["plots"]
+    finally:
+        if next_page_task is not None:
+            next_page_task.cancel()
+
+
+async def write_farm_summary_json(farmer_client: Any, ndjson: bool, include_plots: bool, page_size: int) -> None:
+    from chia.server.outbound_message import NodeType
+
+    harvesters_summary = await farmer_client.get_harvesters_summary()
+    pool_state = await farmer_client.get_pool_state()
+    launcher_ids = {
+        normalize_hex(pool["pool_config"]["p2_singleton_puzzle_hash"]): normalize_hex(pool["pool_config"]["launcher_id"])
+        for pool in pool_state["pool_state"]
+    }
+
+    writer = SummaryWriter(ndjson=ndjson, include_plots=include_plots)
+    farm_aggregator = PlotAggregator(launcher_ids)
+    writer.begin()
+    for harvester in harvesters_summary["harvesters"]:
+        node_id = harvester["connection"]["node_id"]
+        harvester_aggregator = PlotAggregator(launcher_ids)
+        writer.begin_harvester()
+        async for plots in iterate_plot_pages(farmer_client, node_id, page_size):
+            for plot in plots:
+                harvester_aggregator.add(plot)
+            writer.write_plots(node_id, plots)
+        farm_aggregator.merge(harvester_aggregator)
+        writer.end_harvester({
+            "node_id": node_id,
+            "host": harvester["connection"]["host"],
+            "port": harvester["connection"]["port"],
+            "plots_count": harvester["plots"],
+            "total_plot_size": harvester["total_plot_size"],
+            "total_effective_plot_size": harvester["total_effective_plot_size"],
+            "failed_to_open": harvester["failed_to_open_filenames"],
+            "no_key": harvester["no_key_filenames"],
+            "duplicates": harvester["duplicates"],
+            "syncing": harvester["syncing"],
+            "aggregates": harvester_aggregator.to_dict(),
+        })
+
+    connections = await farmer_client.get_connections(node_type=NodeType.FULL_NODE)
+    writer.end({
+        "connections": [
+            {
+                "host": connection["peer_host"],
+                "port": connection["peer_port"],
+                "node_id": connection["node_id"].hex(),
+                "last_message_time": connection["last_message_time"],
+            }
+            for connection in connections
+        ],
+        "aggregates": farm_aggregator.to_dict(),
+    })
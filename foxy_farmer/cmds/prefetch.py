@@ -0,0 +1,44 @@
+import sys
+from asyncio import run
+from asyncio.subprocess import create_subprocess_exec, DEVNULL, PIPE
+from pathlib import Path
+from typing import Optional
+
+import click
+
+
+@click.command("prefetch", hidden=True, short_help="Download and verify a release and the backend binaries in the background")
+@click.option("--release", default=None, help="Foxy-Farmer version to stage for a self-update")
+@click.option("--backend", default=None, help="Backend to stage the binaries of")
+def prefetch_cmd(release: Optional[str], backend: Optional[str]) -> None:
+    from foxy_farmer.util.process_priority import lower_process_priority
+
+    lower_process_priority()
+    run(prefetch(release, backend))
+
+
+async def prefetch(release: Optional[str], backend: Optional[str]) -> None:
+    if release is not None:
+        from foxy_farmer.self_update.self_update_manager import SelfUpdateManager
+
+        staged_binary_path = await SelfUpdateManager().stage_release(release)
+        if backend is not None:
+            await prefetch_backend_binaries_of_release(staged_binary_path, backend)
+
+        return
+    if backend is not None:
+        from foxy_farmer.binary_manager.backend_binary_manager import get_backend_binary_manager
+
+        binary_manager = get_backend_binary_manager(backend)
+        if binary_manager is not None:
+            await binary_manager.stage()
+
+
+async def prefetch_backend_binaries_of_release(staged_binary_path: Path, backend: str) -> None:
+    # Only the new release knows which backend binaries it runs, so it stages them itself
+    process = await create_subprocess_exec(str(staged_binary_path), "prefetch", "--backend", backend, stdout=DEVNULL, stderr=PIPE)
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        # The new release downloads missing binaries on startup as well, so the update continues and only logs this
+        output = stderr.decode("utf-8", errors="replace")[-2000:]
+        print(f"Staging the {backend} binaries failed with code {process.returncode}:\n{output}", file=sys.stderr)
@@ -0,0 +1,61 @@
+from pathlib import Path
+from typing import Dict, Any, List
+
+import click
+
+from foxy_farmer.config.foxy_config_manager import FoxyConfigManager
+
+
+@click.command("tune-decompressor", short_help="Benchmark the BladeBit decompressor settings on your compressed plots")
+@click.option("--rounds", default=10, type=click.IntRange(min=1), show_default=True, help="Simulated signage points per setting")
+@click.option("--plot-filter", default=512, type=click.IntRange(min=1), show_default=True, help="Current plot filter, used to estimate the eligible plots per signage point")
+@click.option("--dry-run", is_flag=True, default=False, help="Only show the results without updating the config")
+@click.pass_context
+def tune_decompressor_cmd(ctx, rounds: int, plot_filter: int, dry_run: bool) -> None:
+    from foxy_farmer.plots.decompressor_tuner import DecompressorTuner
+    from foxy_farmer.plots.plot_files import get_configured_plot_paths
+
+    foxy_root: Path = ctx.obj["root_path"]
+    foxy_config_manager = FoxyConfigManager(ctx.obj["config_path"])
+    foxy_config = foxy_config_manager.load_config_or_get_default()
+
+    tuner = DecompressorTuner(foxy_root, foxy_config, rounds=rounds, plot_filter=plot_filter)
+    print("Benchmarking the decompressor settings, this can take a few minutes ..")
+    tuning_result = tuner.tune(get_configured_plot_paths(foxy_config))
+    if tuning_result is None:
+        print("No compressed plots found or the benchmark failed, nothing to tune")
+
+        return
+
+    for line in render_tuning_result(tuning_result):
+        print(line)
+    if dry_run:
+        return
+    tuner.apply(foxy_config_manager, tuning_result)
+    print(f"Saved the settings to {ctx.obj['config_path']}, restart foxy-farmer to use them")
+
+
+def render_tuning_result(tuning_result: Dict[str, Any]) -> List[str]:
+    settings = tuning_result["settings"]
+    lines = [
+        f"Worst case signage point: {tuning_result['burst_size']} eligible compressed plots",
+        f"{'Decompressors':>13} {'Threads':>8} {'SP p50':>8} {'SP max':>8}   Lookup p50 per level",
+    ]
+    for candidate in tuning_result["candidates"]:
+        is_selected = (
+            candidate["parallel_decompressor_count"] == settings["parallel_decompressor_count"]
+            and candidate["decompressor_thread_count"] == settings["decompressor_thread_count"]
+        )
+        lookups = ", ".join(
+            f"C{level}: {lookup_seconds['p50']:.2f}s"
+            for level, lookup_seconds in sorted(candidate["lookup_seconds"].items())
+            if lookup_seconds is not None
+        )
+        lines.append(
+            f"{candidate['parallel_decompressor_count']:>13} {candidate['decompressor_thread_count']:>8} "
+            f"{candidate['burst_seconds']['p50']:>7.2f}s {candidate['burst_seconds']['max']:>7.2f}s   {lookups}{' <' if is_selected else ''}"
+        )
+    if not tuning_result["meets_lookup_time_budget"]:
+        lines.append(f"Even the fastest settings exceed the lookup time budget of {tuning_result['lookup_time_budget_seconds']}s")
+
+    return lines
@@ -1,3 +1,4 @@
+from logging import Logger, getLogger
 from os import environ
 from pathlib import Path
 from shutil import copyfile
@@ -17,18 +18,24 @@ from foxy_farmer.first_run.first_run_wizard import run_first_run_wizard
 from foxy_farmer.config.backend import Backend
 from foxy_farmer.config.config_patcher import ConfigPatcher
 from foxy_farmer.config.foxy_config_manager import FoxyConfigManager
-from foxy_farmer.config.foxy_farming_gateway import dus1_foxy_farming_gateway_address, foxy_farming_gateway_port, \
-    nue1_foxy_farming_gateway_address, dus1_foxy_gigahorse_farming_gateway_address, foxy_gigahorse_farming_gateway_port, \
-    nue1_foxy_gigahorse_farming_gateway_address
+from foxy_farmer.config.foxy_farming_gateway import get_farming_gateway_peers
 from foxy_farmer.config.migration.make_migration_manager import make_migration_manager
+from foxy_farmer.gateway.gateway_selector import GatewaySelector
 from foxy_farmer.version import version
 
 
 class FoxyChiaConfigManager:
     _root_path: Path
+    _gateway_selector: GatewaySelector
+    _logger: Logger = getLogger("foxy_chia_config_manager")
 
     def __init__(self, root_path: Path):
         self._root_path = root_path
+        self._gateway_selector = GatewaySelector(root_path / "db" / "gateway_timings.json")
+
+    @property
+    def gateway_selector(self) -> GatewaySelector:
+        return self._gateway_selector
 
     async def ensure_foxy_config(self, config_path: Path):
         foxy_chia_config_file_path = self._root_path / "config" / "config.yaml"
@@ -115,6 +122,13 @@ class FoxyChiaConfigManager:
         if config_patcher_result.chia_config_was_updated:
             save_config(self._root_path, "config.yaml", config)
 
+    def get_full_node_peers(self, foxy_farmer_config: FoxyConfig) -> List[Dict[str, Any]]:
+        full_node_peers = get_farming_gateway_peers(foxy_farmer_config.get("backend", Backend.BladeBit))
+        if not foxy_farmer_config.get("enable_gateway_selection", True):
+            return full_node_peers
+
+        return self._gateway_selector.select(full_node_peers, max_peers=foxy_farmer_config.get("max_farming_gateways"))
+
     def patch_configs(
         self,
         config_patcher: ConfigPatcher,
@@ -123,21 +137,7 @@ class FoxyChiaConfigManager:
     ):
         backend: Union[str, Backend] = foxy_farmer_config.get("backend", Backend.BladeBit)
         require_syslog = backend != Backend.BladeBit
-        full_node_peers: List[Dict[str, Any]] = [{
-            "host": dus1_foxy_farming_gateway_address,
-            "port": foxy_farming_gateway_port,
-        }, {
-            "host": nue1_foxy_farming_gateway_address,
-            "port": foxy_farming_gateway_port,
-        }]
-        if backend == Backend.Gigahorse:
-            full_node_peers = [{
-                "host": dus1_foxy_gigahorse_farming_gateway_address,
-                "port": foxy_gigahorse_farming_gateway_port,
-            }, {
-                "host": nue1_foxy_gigahorse_farming_gateway_address,
-                "port": foxy_gigahorse_farming_gateway_port,
-            }]
+        full_node_peers = self.get_full_node_peers(foxy_farmer_config)
 
         (config_patcher
             # Ensure different ports
@@ -23,6 +23,7 @@ class FoxyConfig(TypedDict):
     farmer_reward_address: str
     pool_payout_address: str
     log_level: str
+    queued_logging: NotRequired[bool]
     listen_host: str
     enable_harvester: NotRequired[bool]
     plot_nfts: NotRequired[List[PlotNft]]
@@ -33,7 +34,28 @@ class FoxyConfig(TypedDict):
     chia_wallet_rpc_port: NotRequired[int]
     syslog_port: NotRequired[int]
     auto_update: NotRequired[bool]
+    self_update_handover: NotRequired[bool]
+    self_update_handover_timeout_seconds: NotRequired[float]
     monitor_farmer_connections: NotRequired[bool]
+    stale_connection_threshold_multiplier: NotRequired[float]
+    stale_connection_missed_signage_points: NotRequired[int]
+    enable_loop_monitor: NotRequired[bool]
+    slow_callback_threshold_ms: NotRequired[int]
+    enable_monitoring_server: NotRequired[bool]
+    monitoring_server_port: NotRequired[int]
+    enable_metrics_exporter: NotRequired[bool]
+    enable_gateway_selection: NotRequired[bool]
+    lookup_time_budget_seconds: NotRequired[float]
+    max_farming_gateways: NotRequired[int]
+    enable_process_supervisor: NotRequired[bool]
+    log_binary_daemon_output: NotRequired[bool]
+    enable_plot_inventory: NotRequired[bool]
+    plot_scan_exclude_globs: NotRequired[List[str]]
+    enable_plot_directory_watcher: NotRequired[bool]
+    plot_mount_roots: NotRequired[List[str]]
+    plot_consistency_check_interval_seconds: NotRequired[int]
+    enable_adaptive_plot_refresh: NotRequired[bool]
+    harvester_shards: NotRequired[Union[int, str, List[List[str]]]]
     # BB
     enable_og_pooling: NotRequired[bool]
     parallel_decompressor_count: NotRequired[int]
@@ -44,6 +66,7 @@ class FoxyConfig(TypedDict):
     decompressor_timeout: NotRequired[int]
     disable_cpu_affinity: NotRequired[bool]
     max_compression_level_allowed: NotRequired[int]
+    auto_tune_decompressor: NotRequired[bool]
     # GH
     recompute_hosts: NotRequired[Union[List[str], str]]
     recompute_connect_timeout: NotRequired[int]
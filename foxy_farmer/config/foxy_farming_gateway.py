@@ -1,3 +1,7 @@
+from typing import List, Dict, Any, Union
+
+from foxy_farmer.config.backend import Backend
+
 dus1_foxy_farming_gateway_address = "dus1.farming-gateway.chia.foxypool.io"
 nue1_foxy_farming_gateway_address = "nue1.farming-gateway.chia.foxypool.io"
 foxy_farming_gateway_port = 28444
@@ -5,3 +9,22 @@ foxy_farming_gateway_port = 28444
 dus1_foxy_gigahorse_farming_gateway_address = "dus1.gh-farming-gateway.chia.foxypool.io"
 nue1_foxy_gigahorse_farming_gateway_address = "nue1.gh-farming-gateway.chia.foxypool.io"
 foxy_gigahorse_farming_gateway_port = 48445
+
+
+def get_farming_gateway_peers(backend: Union[str, Backend]) -> List[Dict[str, Any]]:
+    if backend == Backend.Gigahorse:
+        return [{
+            "host": dus1_foxy_gigahorse_farming_gateway_address,
+            "port": foxy_gigahorse_farming_gateway_port,
+        }, {
+            "host": nue1_foxy_gigahorse_farming_gateway_address,
+            "port": foxy_gigahorse_farming_gateway_port,
+        }]
+
+    return [{
+        "host": dus1_foxy_farming_gateway_address,
+        "port": foxy_farming_gateway_port,
+    }, {
+        "host": nue1_foxy_farming_gateway_address,
+        "port": foxy_farming_gateway_port,
+    }]
@@ -1,18 +1,84 @@
 from asyncio import get_running_loop, sleep
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
+from aiohttp import ClientSession, ClientError
 from chia.cmds.passphrase_funcs import get_current_passphrase
-from chia.daemon.client import DaemonProxy, connect_to_daemon_and_validate
+from chia.daemon.client import DaemonProxy
+from chia.server.server import ssl_context_for_client
 from chia.util.keychain import Keychain
+from chia.util.task_referencer import create_referenced_task
 
 
-async def get_daemon_proxy(root_path: Path, chia_config: Dict[str, Any]) -> DaemonProxy:
-    daemon_proxy = await connect_to_daemon_and_validate(root_path, chia_config, quiet=True)
+class FastDaemonProxy(DaemonProxy):
+    """ A DaemonProxy which is usable right after connecting, the chia one always waits a second after connecting. """
+    async def start(self, wait_for_start: bool = False) -> None:
+        self.client_session = ClientSession()
+        try:
+            self.websocket = await self.client_session.ws_connect(
+                self._uri,
+                autoclose=True,
+                autoping=True,
+                heartbeat=self.heartbeat,
+                ssl=self.ssl_context if self.ssl_context is not None else True,
+                max_msg_size=self.max_message_size,
+            )
+        except ClientError:
+            await self.close()
+
+            raise Exception("Failed to connect to daemon")
+
+        async def listener_task() -> None:
+            try:
+                await self.listener()
+            finally:
+                await self.close()
+
+        create_referenced_task(listener_task(), known_unreferenced=True)
+
+
+async def connect_to_daemon_and_validate(root_path: Path, chia_config: Dict[str, Any]) -> Optional[DaemonProxy]:
+    daemon_proxy: Optional[DaemonProxy] = None
+    is_connected = False
+    try:
+        ssl_context = ssl_context_for_client(
+            root_path / chia_config["private_ssl_ca"]["crt"],
+            root_path / chia_config["private_ssl_ca"]["key"],
+            root_path / chia_config["daemon_ssl"]["private_crt"],
+            root_path / chia_config["daemon_ssl"]["private_key"],
+        )
+        daemon_proxy = FastDaemonProxy(
+            f"wss://{chia_config['self_hostname']}:{chia_config['daemon_port']}",
+            ssl_context=ssl_context,
+            max_message_size=chia_config.get("daemon_max_message_size", 50 * 1000 * 1000),
+            heartbeat=chia_config.get("daemon_heartbeat", 300),
+        )
+        await daemon_proxy.start()
+        response = await daemon_proxy.ping()
+        is_connected = response["data"].get("value") == "pong"
+    except Exception:
+        pass
+    finally:
+        if not is_connected and daemon_proxy is not None:
+            await daemon_proxy.close()
+
+    return daemon_proxy if is_connected else None
+
+
+async def get_daemon_proxy(
+    root_path: Path,
+    chia_config: Dict[str, Any],
+    initial_retry_delay_seconds: float = 0.05,
+    max_retry_delay_seconds: float = 1,
+) -> DaemonProxy:
+    retry_delay_seconds = initial_retry_delay_seconds
+    daemon_proxy = await connect_to_daemon_and_validate(root_path, chia_config)
     while daemon_proxy is None:
-        await sleep(1)
-        daemon_proxy = await connect_to_daemon_and_validate(root_path, chia_config, quiet=True)
+        await sleep(retry_delay_seconds)
+        # Daemons usually listen within a few hundred milliseconds, back off for ones which take longer
+        retry_delay_seconds = min(max_retry_delay_seconds, retry_delay_seconds * 2)
+        daemon_proxy = await connect_to_daemon_and_validate(root_path, chia_config)
 
     return daemon_proxy
 
@@ -1,20 +1,117 @@
+import gzip
+import json
 import tarfile
+from asyncio import Task, create_task, sleep, wait, gather, to_thread, FIRST_EXCEPTION, TimeoutError
+from dataclasses import dataclass
 from logging import getLogger
+from os import getpid
 from os.path import join
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Union
+from time import monotonic
+from typing import Union, Optional, List, Dict, Any, Tuple
+from zipfile import ZipFile, BadZipFile
 
-from aiohttp import ClientSession, ClientTimeout
+from aiohttp import ClientSession, ClientTimeout, ClientError, ClientPayloadError
 from yaspin import yaspin
 from yaspin.core import Yaspin
 
+from foxy_farmer.exceptions.download_changed_exception import DownloadChangedException
 from foxy_farmer.util.ssl_context import ssl_context
 from foxy_farmer.util.zip_file_with_permissions import ZipFileWithPermissions
 
+one_mib_in_bytes = 2 ** 20
+
+
+@dataclass
+class DownloadSegment:
+    start: int
+    end: int
+    downloaded: int = 0
+
+    @property
+    def is_complete(self) -> bool:
+        return self.start + self.downloaded > self.end
+
+    @property
+    def position(self) -> int:
+        return self.start + self.downloaded
+
+
+@dataclass
+class DownloadStats:
+    total_bytes: int
+    resumed_bytes: int
+    seconds: float
+    connections: int
+    retries: int
+
+    @property
+    def bytes_per_second(self) -> float:
+        if self.seconds <= 0:
+            return 0
+
+        return (self.total_bytes - self.resumed_bytes) / self.seconds
+
+
+class DownloadProgress:
+    """ Tracks the bytes downloaded in this run and shows the throughput on the spinner. """
+    _total_bytes: int
+    _downloaded_bytes: int
+    _resumed_bytes: int
+    _file_description: str
+    _connections: int
+    _spinner: Optional[Yaspin]
+    started_at: float
+    retries: int = 0
+
+    def __init__(self, total_bytes: int, resumed_bytes: int, file_description: str, connections: int, spinner: Optional[Yaspin]):
+        self._total_bytes = total_bytes
+        self._downloaded_bytes = resumed_bytes
+        self._resumed_bytes = resumed_bytes
+        self._file_description = file_description
+        self._connections = connections
+        self._spinner = spinner
+        self.started_at = monotonic()
+
+    def add(self, byte_count: int) -> None:
+        self._downloaded_bytes += byte_count
+        if self._spinner is None:
+            return
+        downloaded_mib = self._downloaded_bytes / one_mib_in_bytes
+        total_mib = self._total_bytes / one_mib_in_bytes
+        percentage = (self._downloaded_bytes / self._total_bytes) * 100 if self._total_bytes > 0 else 100
+        elapsed_seconds = max(monotonic() - self.started_at, 0.001)
+        mib_per_second = (self._downloaded_bytes - self._resumed_bytes) / one_mib_in_bytes / elapsed_seconds
+        self._spinner.text = (
+            f"Downloading {self._file_description} ({downloaded_mib:.2f}/{total_mib:.2f} MiB, {percentage:.2f}%, "
+            f"{mib_per_second:.2f} MiB/s over {self._connections} connections) .."
+        )
+
 
 class DownloadManager:
     _logger = getLogger("download_manager")
+    _chunk_size: int = one_mib_in_bytes
+    _journal_interval_seconds: float = 1
+    _download_directory: Optional[Path]
+    _connections: int
+    _segment_size: int
+    _max_segment_attempts: int
+    _retry_delay_seconds: float
+
+    def __init__(
+        self,
+        download_directory: Optional[Path] = None,
+        connections: int = 4,
+        segment_size: int = 16 * one_mib_in_bytes,
+        max_segment_attempts: int = 5,
+        retry_delay_seconds: float = 1,
+    ):
+        self._download_directory = download_directory
+        self._connections = connections
+        self._segment_size = segment_size
+        self._max_segment_attempts = max_segment_attempts
+        self._retry_delay_seconds = retry_delay_seconds
 
     async def download_archive_and_extract(
         self,
@@ -23,33 +120,293 @@ class DownloadManager:
         to_path: Union[str, Path],
         file_description: str,
     ):
+        from chia.util.lock import Lockfile, LockfileError
+
         with yaspin(f"Preparing to download {file_description} ..") as spinner:
             with TemporaryDirectory() as temp_dir:
-                archive_path = join(temp_dir, file_name)
-                await self.download_file(
-                    file_url=file_url,
-                    to_path=archive_path,
-                    file_description=file_description,
-                    spinner=spinner,
-                )
-                spinner.text = f"Extracting {file_description} .."
-                self._extract_file(archive_path, to_path)
+                # Archives in the download directory survive restarts, so an interrupted download resumes
+                archive_path = Path(join(self._download_directory or temp_dir, file_name))
+                remove_stale_archive_copies(archive_path)
+                try:
+                    with Lockfile.create(archive_path, timeout=0):
+                        await self._download_and_extract(file_url, archive_path, to_path, file_description, spinner)
+                except LockfileError:
+                    # Another process downloads the same archive, use a copy of our own instead of waiting for it
+                    archive_copy_path = archive_path.with_name(f"{getpid()}-{archive_path.name}")
+                    await self._download_and_extract(file_url, archive_copy_path, to_path, file_description, spinner)
         self._logger.info(f"✅ Downloaded {file_description}")
 
-    async def download_file(self, file_url: str, to_path: Union[str, Path], file_description: str, spinner: Yaspin):
-        one_mib_in_bytes = 2 ** 20
-        chunk_size = 5 * one_mib_in_bytes
-        downloaded_size_mib = 0
-        async with ClientSession(timeout=ClientTimeout(total=15 * 60, connect=60)) as client:
-            async with client.get(file_url, ssl=ssl_context) as res:
-                total_bytes = int(res.headers.get('content-length'))
-                total_mib = total_bytes / one_mib_in_bytes
-                with open(to_path, 'wb') as fd:
-                    async for chunk in res.content.iter_chunked(chunk_size):
-                        fd.write(chunk)
-                        downloaded_size_mib += len(chunk) / one_mib_in_bytes
-                        percentage = (downloaded_size_mib / total_mib) * 100
-                        spinner.text = f"Downloading {file_description} ({downloaded_size_mib:.2f}/{total_mib:.2f} MiB, {percentage:.2f}%) .."
+    async def _download_and_extract(
+        self,
+        file_url: str,
+        archive_path: Path,
+        to_path: Union[str, Path],
+        file_description: str,
+        spinner: Yaspin,
+    ) -> None:
+        await self.download_file(
+            file_url=file_url,
+            to_path=archive_path,
+            file_description=file_description,
+            spinner=spinner,
+        )
+        spinner.text = f"Verifying {file_description} .."
+        try:
+            await to_thread(self._verify_archive, str(archive_path))
+        except RuntimeError:
+            # Download it again on the next attempt instead of verifying the same archive over and over
+            archive_path.unlink(missing_ok=True)
+
+            raise
+        spinner.text = f"Extracting {file_description} .."
+        self._extract_file(str(archive_path), to_path)
+        archive_path.unlink(missing_ok=True)
+
+    async def download_file(
+        self,
+        file_url: str,
+        to_path: Union[str, Path],
+        file_description: str,
+        spinner: Optional[Yaspin] = None,
+    ) -> DownloadStats:
+        """ Downloads the file in segments over several connections, a journal next to the partial file allows to resume. """
+        to_path = Path(to_path)
+        to_path.parent.mkdir(parents=True, exist_ok=True)
+        partial_path = to_path.with_name(f"{to_path.name}.part")
+
+        return await self._download_file(file_url, to_path, partial_path, file_description, spinner)
+
+    async def _download_file(
+        self,
+        file_url: str,
+        to_path: Path,
+        partial_path: Path,
+        file_description: str,
+        spinner: Optional[Yaspin],
+    ) -> DownloadStats:
+        journal_path = partial_path.with_name(f"{partial_path.name}.json")
+        async with ClientSession(timeout=ClientTimeout(total=None, connect=60, sock_read=60)) as client:
+            try:
+                stats = await self._download_segments(client, file_url, partial_path, journal_path, file_description, spinner)
+            except DownloadChangedException:
+                # Either the file changed or the server ignores ranges with this validator, both work over a single connection
+                self._logger.warning(f"{file_description} changed on the server or the server ignored a range request, starting over")
+                journal_path.unlink(missing_ok=True)
+                stats = await self._download_segments(
+                    client,
+                    file_url,
+                    partial_path,
+                    journal_path,
+                    file_description,
+                    spinner,
+                    use_ranges=False,
+                )
+        partial_path.replace(to_path)
+        journal_path.unlink(missing_ok=True)
+        resumed_infos = f", resumed from {stats.resumed_bytes / one_mib_in_bytes:.2f} MiB" if stats.resumed_bytes > 0 else ""
+        self._logger.info(
+            f"Downloaded {file_description} ({stats.total_bytes / one_mib_in_bytes:.2f} MiB) in {stats.seconds:.1f}s "
+            f"at {stats.bytes_per_second / one_mib_in_bytes:.2f} MiB/s over {stats.connections} connections "
+            f"with {stats.retries} retries{resumed_infos}"
+        )
+
+        return stats
+
+    async def _download_segments(
+        self,
+        client: ClientSession,
+        file_url: str,
+        partial_path: Path,
+        journal_path: Path,
+        file_description: str,
+        spinner: Optional[Yaspin],
+        use_ranges: bool = True,
+    ) -> DownloadStats:
+        total_bytes, validator, supports_ranges = await self._probe(client, file_url)
+        supports_ranges = supports_ranges and use_ranges
+        # Without a validator the server can not tell whether resumed bytes still belong to the same file
+        can_resume = supports_ranges and validator is not None
+        segments = self._load_journal(journal_path, file_url, total_bytes, validator) if can_resume else None
+        if not can_resume:
+            journal_path.unlink(missing_ok=True)
+        if segments is None or not partial_path.exists():
+            segments = self._make_segments(total_bytes, supports_ranges)
+            with open(partial_path, "wb") as file:
+                file.truncate(total_bytes)
+        resumed_bytes = sum(segment.downloaded for segment in segments)
+        pending_segments = [segment for segment in segments if not segment.is_complete]
+        connections = min(self._connections, len(pending_segments)) if supports_ranges else 1
+        progress = DownloadProgress(total_bytes, resumed_bytes, file_description, connections, spinner)
+
+        async def download_pending_segments() -> None:
+            while len(pending_segments) > 0:
+                await self._download_segment(client, file_url, partial_path, pending_segments.pop(0), validator, supports_ranges, progress)
+
+        async def write_journal_periodically() -> None:
+            while True:
+                await sleep(self._journal_interval_seconds)
+                self._write_journal(journal_path, file_url, total_bytes, validator, segments)
+
+        tasks: List[Task] = [create_task(download_pending_segments()) for _ in range(connections)]
+        journal_tasks: List[Task] = [create_task(write_journal_periodically())] if can_resume else []
+        try:
+            if len(tasks) > 0:
+                await wait(tasks, return_when=FIRST_EXCEPTION)
+            # Once a segment failed for good the other connections are cancelled
+            for task in tasks:
+                if task.done():
+                    task.result()
+        finally:
+            for task in [*tasks, *journal_tasks]:
+                task.cancel()
+            await gather(*tasks, *journal_tasks, return_exceptions=True)
+            if can_resume:
+                # Failed and cancelled downloads resume from the last journal
+                self._write_journal(journal_path, file_url, total_bytes, validator, segments)
+
+        return DownloadStats(
+            total_bytes=total_bytes,
+            resumed_bytes=resumed_bytes,
+            seconds=monotonic() - progress.started_at,
+            connections=connections,
+            retries=progress.retries,
+        )
+
+    async def _probe(self, client: ClientSession, file_url: str) -> Tuple[int, Optional[str], bool]:
+        """ Returns the size, the validator and whether the server supports range requests. """
+        async with client.get(file_url, headers={"Range": "bytes=0-0"}, ssl=ssl_context) as res:
+            res.raise_for_status()
+            etag = res.headers.get("ETag")
+            # Servers ignore ranges with a weak validator (RFC 9110) and would answer every segment with the whole file
+            validator = etag if etag is not None and not etag.startswith("W/") else res.headers.get("Last-Modified")
+            content_range = res.headers.get("Content-Range", "")
+            if res.status == 206 and "/" in content_range and not content_range.endswith("/*"):
+                return int(content_range.rsplit("/", 1)[1]), validator, True
+            content_length = res.headers.get("Content-Length")
+            if content_length is None:
+                raise RuntimeError(f"The size of {file_url} is unknown")
+
+            return int(content_length), validator, False
+
+    async def _download_segment(
+        self,
+        client: ClientSession,
+        file_url: str,
+        partial_path: Path,
+        segment: DownloadSegment,
+        validator: Optional[str],
+        supports_ranges: bool,
+        progress: DownloadProgress,
+    ) -> None:
+        failed_attempts = 0
+        while not segment.is_complete:
+            headers = {}
+            if supports_ranges:
+                headers["Range"] = f"bytes={segment.position}-{segment.end}"
+                if validator is not None:
+                    headers["If-Range"] = validator
+            elif segment.downloaded > 0:
+                # Without range support a retry starts over
+                progress.add(-segment.downloaded)
+                segment.downloaded = 0
+            downloaded_before = segment.downloaded
+            try:
+                async with client.get(file_url, headers=headers, ssl=ssl_context) as res:
+                    res.raise_for_status()
+                    if supports_ranges and res.status != 206:
+                        # The server answers an If-Range with the whole file once the file changed, or ignored the range
+                        raise DownloadChangedException()
+                    # Writes are unbuffered, so the journal never counts bytes which are not handed to the OS yet
+                    with open(partial_path, "r+b", buffering=0) as file:
+                        file.seek(segment.position)
+                        async for chunk in res.content.iter_chunked(self._chunk_size):
+                            chunk = chunk[:segment.end - segment.position + 1]
+                            file.write(chunk)
+                            segment.downloaded += len(chunk)
+                            progress.add(len(chunk))
+                            if segment.is_complete:
+                                break
+                if not segment.is_complete:
+                    raise ClientPayloadError(f"Response ended at byte {segment.position} of segment {segment.start}-{segment.end}")
+            except (ClientError, TimeoutError) as e:
+                # Only attempts without any progress count, so a flaky but working connection keeps going
+                failed_attempts = failed_attempts + 1 if segment.downloaded == downloaded_before else 1
+                if failed_attempts >= self._max_segment_attempts:
+                    raise
+                progress.retries += 1
+                retry_delay_seconds = self._retry_delay_seconds * 2 ** (failed_attempts - 1)
+                self._logger.debug(f"Segment {segment.start}-{segment.end} failed, retrying in {retry_delay_seconds:.0f}s: {e}")
+                await sleep(retry_delay_seconds)
+
+    def _make_segments(self, total_bytes: int, supports_ranges: bool) -> List[DownloadSegment]:
+        if not supports_ranges or total_bytes == 0:
+            return [DownloadSegment(start=0, end=total_bytes - 1)]
+
+        return [
+            DownloadSegment(start=start, end=min(start + self._segment_size, total_bytes) - 1)
+            for start in range(0, total_bytes, self._segment_size)
+        ]
+
+    def _load_journal(
+        self,
+        journal_path: Path,
+        file_url: str,
+        total_bytes: int,
+        validator: Optional[str],
+    ) -> Optional[List[DownloadSegment]]:
+        try:
+            journal: Dict[str, Any] = json.loads(journal_path.read_text())
+        except (OSError, ValueError):
+            return None
+        if journal.get("url") != file_url or journal.get("total_bytes") != total_bytes or journal.get("validator") != validator:
+            return None
+
+        return [DownloadSegment(start=start, end=end, downloaded=downloaded) for start, end, downloaded in journal["segments"]]
+
+    def _write_journal(
+        self,
+        journal_path: Path,
+        file_url: str,
+        total_bytes: int,
+        validator: Optional[str],
+        segments: List[DownloadSegment],
+    ) -> None:
+        journal = {
+            "url": file_url,
+            "total_bytes": total_bytes,
+            "validator": validator,
+            "segments": [[segment.start, segment.end, segment.downloaded] for segment in segments],
+        }
+        temporary_journal_path = journal_path.with_name(f"{journal_path.name}.tmp")
+        temporary_journal_path.write_text(json.dumps(journal))
+        temporary_journal_path.replace(journal_path)
+
+    def _verify_archive(self, archive_file_path: str) -> None:
+        """ Checks every file against the checksums stored in the archive, so a corrupt or spliced download is never extracted. """
+        if archive_file_path.endswith(".zip"):
+            try:
+                with ZipFile(archive_file_path, 'r') as zip_file:
+                    corrupt_file_name = zip_file.testzip()
+            except (BadZipFile, OSError) as e:
+                raise RuntimeError(f"{archive_file_path} is not a valid archive: {e}")
+            if corrupt_file_name is not None:
+                raise RuntimeError(f"{archive_file_path} is corrupt, {corrupt_file_name} does not match its checksum")
+
+            return
+        if archive_file_path.endswith(".tar.gz"):
+            try:
+                # Reading the whole stream checks the CRC and size stored at the end of the gzip stream
+                with gzip.open(archive_file_path, "rb") as gzip_file:
+                    while gzip_file.read(self._chunk_size):
+                        pass
+                with tarfile.open(archive_file_path) as file:
+                    file.getmembers()
+            except (tarfile.TarError, OSError, EOFError) as e:
+                raise RuntimeError(f"{archive_file_path} is corrupt: {e}")
+
+            return
+
+        raise RuntimeError(f"Can not verify {archive_file_path}, unsupported extension")
 
     def _extract_file(self, archive_file_path: str, destination_path: Path):
         if archive_file_path.endswith(".zip"):
@@ -65,3 +422,21 @@ class DownloadManager:
             return
 
         raise RuntimeError(f"Can not extract {archive_file_path}, unsupported extension")
+
+
+def remove_stale_archive_copies(archive_path: Path) -> None:
+    """ Removes the archive copies and their partial files left behind by processes which are no longer running. """
+    from psutil import pid_exists
+
+    try:
+        paths = list(archive_path.parent.iterdir())
+    except OSError:
+        return
+    for path in paths:
+        pid, _, name = path.name.partition("-")
+        if not pid.isdigit() or not name.startswith(archive_path.name) or pid_exists(int(pid)):
+            continue
+        try:
+            path.unlink(missing_ok=True)
+        except OSError:
+            pass
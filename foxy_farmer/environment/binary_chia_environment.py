@@ -1,13 +1,16 @@
 import subprocess
+import sys
 from abc import ABC
+from asyncio import to_thread, create_task, wait, FIRST_COMPLETED
 from asyncio.subprocess import Process, create_subprocess_exec, PIPE
+from contextlib import asynccontextmanager
 from logging import Logger
 from os.path import join
 from pathlib import Path
 from sys import platform
-from typing import Any, Dict, Optional, List
+from typing import Any, AsyncIterator, Dict, Optional, List
 
-from chia.daemon.client import connect_to_daemon_and_validate, DaemonProxy
+from chia.daemon.client import DaemonProxy
 from chia.util.service_groups import services_for_groups
 from chia.util.ws_message import WsRpcMessage
 
@@ -15,7 +18,12 @@ from foxy_farmer.binary_manager.binary_manager import BinaryManager
 from foxy_farmer.config.foxy_config import FoxyConfig
 from foxy_farmer.exceptions.already_running_exception import AlreadyRunningException
 from foxy_farmer.environment.chia_environment import ChiaEnvironment
-from foxy_farmer.daemon.daemon_proxy import get_daemon_proxy, ensure_daemon_keyring_is_unlocked
+from foxy_farmer.environment.service.service_plan import run_service_plan, service_start_dependencies, format_service_timings
+from foxy_farmer.daemon.daemon_proxy import get_daemon_proxy, ensure_daemon_keyring_is_unlocked, \
+    connect_to_daemon_and_validate
+from foxy_farmer.ff_logging.log_pipeline import LogPipeline
+from foxy_farmer.ff_logging.process_output import ProcessOutput, make_text_sink
+from foxy_farmer.monitoring.process_supervisor import SupervisedComponent
 
 
 class BinaryChiaEnvironment(ABC, ChiaEnvironment):
@@ -24,6 +32,8 @@ class BinaryChiaEnvironment(ABC, ChiaEnvironment):
     _binary_manager: BinaryManager
     _binary_directory_path: Optional[Path] = None
     _chia_daemon_process: Optional[Process] = None
+    _daemon_process_output: Optional[ProcessOutput] = None
+    _daemon_output_log_pipeline: Optional[LogPipeline] = None
     _daemon_proxy: Optional[DaemonProxy] = None
 
     def __init__(
@@ -45,7 +55,7 @@ class BinaryChiaEnvironment(ABC, ChiaEnvironment):
     async def start_daemon(self) -> None:
         if self._daemon_proxy is not None:
             return
-        self._daemon_proxy = await connect_to_daemon_and_validate(self.root_path, self.config, quiet=True)
+        self._daemon_proxy = await connect_to_daemon_and_validate(self.root_path, self.config)
         if self._daemon_proxy is not None:
             if not self.allow_connecting_to_existing_daemon:
                 self._logger.error("Another instance of foxy-farmer is already running, exiting now ..")
@@ -57,9 +67,17 @@ class BinaryChiaEnvironment(ABC, ChiaEnvironment):
             return
 
         self._chia_daemon_process = await self._start_daemon_process()
-        if self._chia_daemon_process.stdout is not None:
-            await self._chia_daemon_process.stdout.readline()
-        self._daemon_proxy = await get_daemon_proxy(self.root_path, self.config)
+        # Probe the daemon right away instead of waiting for its first line of output
+        daemon_proxy_task = create_task(get_daemon_proxy(self.root_path, self.config))
+        daemon_exit_task = create_task(self._chia_daemon_process.wait())
+        await wait([daemon_proxy_task, daemon_exit_task], return_when=FIRST_COMPLETED)
+        if not daemon_proxy_task.done():
+            daemon_proxy_task.cancel()
+            tail = self._daemon_process_output.tail if self._daemon_process_output is not None else ""
+
+            raise RuntimeError(f"The daemon exited with code {self._chia_daemon_process.returncode} before it was listening:\n{tail[-2000:]}")
+        daemon_exit_task.cancel()
+        self._daemon_proxy = daemon_proxy_task.result()
         await ensure_daemon_keyring_is_unlocked(self._daemon_proxy)
 
     async def stop_daemon(self) -> None:
@@ -81,42 +99,132 @@ class BinaryChiaEnvironment(ABC, ChiaEnvironment):
         if self._chia_daemon_process is not None:
             await self._chia_daemon_process.wait()
             self._chia_daemon_process = None
+            await self._close_daemon_process_output()
+        if self._daemon_output_log_pipeline is not None:
+            await to_thread(self._daemon_output_log_pipeline.stop)
+            self._daemon_output_log_pipeline = None
 
     async def start_services(self, service_names: List[str]) -> None:
         if self._daemon_proxy is None:
             raise ValueError("Daemon Proxy not initialized")
-        for service in services_for_groups(service_names):
-            if await self._daemon_proxy.is_running(service_name=service):
-                continue
-            print(f"{service}: ", end="", flush=True)
-            msg = await self._daemon_proxy.start_service(service_name=service)
-            success = msg and msg["data"].get("success")
-
-            if success is True:
-                print("started")
-            else:
-                error = "no response"
-                if msg:
-                    error = msg["data"].get("error")
-                print(f"{service} failed to start. Error: {error}")
+        timings = await run_service_plan(
+            list(services_for_groups(service_names)),
+            self._start_service,
+            dependencies=service_start_dependencies,
+        )
+        if len(timings) > 0:
+            self._logger.info(f"Started services ({format_service_timings(timings)})")
 
     async def stop_services(self, service_names: List[str]) -> None:
         if self._daemon_proxy is None:
             raise ValueError("Daemon Proxy not initialized")
-        for service in services_for_groups(service_names):
-            if not await self._daemon_proxy.is_running(service_name=service):
-                continue
-            print(f"{service}: ", end="", flush=True)
-            msg = await self._daemon_proxy.stop_service(service_name=service)
-            success = msg and msg["data"].get("success")
-
-            if success is True:
-                print("stopped")
-            else:
-                error = "no response"
-                if msg:
-                    error = msg["data"].get("error")
-                print(f"{service} failed to stop. Error: {error}")
+        # Services shut down independently of each other, so all of them are stopped at once
+        timings = await run_service_plan(list(services_for_groups(service_names)), self._stop_service)
+        if len(timings) > 0:
+            self._logger.info(f"Stopped services ({format_service_timings(timings)})")
+
+    async def _start_service(self, service: str) -> None:
+        async with self._get_service_daemon_proxy() as daemon_proxy:
+            if await daemon_proxy.is_running(service_name=service):
+                return
+            msg = await daemon_proxy.start_service(service_name=service)
+        success = msg and msg["data"].get("success")
+
+        if success is True:
+            print(f"{service}: started")
+        else:
+            error = "no response"
+            if msg:
+                error = msg["data"].get("error")
+            print(f"{service} failed to start. Error: {error}")
+
+    async def _stop_service(self, service: str) -> None:
+        async with self._get_service_daemon_proxy() as daemon_proxy:
+            if not await daemon_proxy.is_running(service_name=service):
+                return
+            msg = await daemon_proxy.stop_service(service_name=service)
+        success = msg and msg["data"].get("success")
+
+        if success is True:
+            print(f"{service}: stopped")
+        else:
+            error = "no response"
+            if msg:
+                error = msg["data"].get("error")
+            print(f"{service} failed to stop. Error: {error}")
+
+    @asynccontextmanager
+    async def _get_service_daemon_proxy(self) -> AsyncIterator[DaemonProxy]:
+        # The daemon handles the requests of a connection one after another, a connection per service lets them run concurrently
+        daemon_proxy = await connect_to_daemon_and_validate(self.root_path, self.config)
+        if daemon_proxy is None:
+            yield self._daemon_proxy
+
+            return
+        try:
+            yield daemon_proxy
+        finally:
+            await daemon_proxy.close()
+
+    def get_supervised_components(self, service_names: List[str]) -> List[SupervisedComponent]:
+        if self._chia_daemon_process is None:
+            # Daemons of other instances are not ours to restart
+            return []
+        daemon_component = BinaryDaemonComponent(self, service_names)
+
+        return [
+            daemon_component,
+            *[BinaryServiceComponent(self, service, depends_on=daemon_component.name) for service in services_for_groups(service_names)],
+        ]
+
+    async def check_daemon(self) -> Optional[str]:
+        if self._chia_daemon_process is None:
+            return "daemon is not running"
+        if self._chia_daemon_process.returncode is not None:
+            tail = self._daemon_process_output.tail if self._daemon_process_output is not None else ""
+
+            return f"daemon exited with code {self._chia_daemon_process.returncode}, last output:\n{tail[-2000:]}"
+        if self._daemon_proxy is None:
+            return "not connected to the daemon"
+        response = await self._daemon_proxy.ping()
+        if response is None or response.get("data", {}).get("success") is not True:
+            return f"daemon ping failed: {response}"
+
+        return None
+
+    async def restart_daemon(self, service_names: List[str]) -> None:
+        if self._daemon_proxy is not None:
+            try:
+                await self._daemon_proxy.close()
+            except Exception:
+                pass
+            self._daemon_proxy = None
+        if self._chia_daemon_process is not None:
+            if platform != "win32":
+                from os import killpg
+                from signal import SIGKILL
+
+                # Also stop the services launched by the daemon, they would block the ports of the new ones
+                try:
+                    killpg(self._chia_daemon_process.pid, SIGKILL)
+                except ProcessLookupError:
+                    pass
+            elif self._chia_daemon_process.returncode is None:
+                self._chia_daemon_process.kill()
+            await self._chia_daemon_process.wait()
+            self._chia_daemon_process = None
+            await self._close_daemon_process_output()
+        await self.start_daemon()
+        await self.start_services(service_names)
+
+    async def restart_service(self, service: str) -> None:
+        await self._start_service(service)
+
+    async def check_service(self, service: str) -> Optional[str]:
+        if self._daemon_proxy is None or await self._daemon_proxy.is_running(service_name=service):
+            return None
+
+        return f"{service} is not running"
 
     async def _start_daemon_process(self) -> Process:
         creationflags = 0
@@ -130,6 +238,52 @@ class BinaryChiaEnvironment(ABC, ChiaEnvironment):
             stdout=PIPE,
             stderr=PIPE,
             creationflags=creationflags,
+            # A process group of its own allows stopping a hung daemon together with its services
+            start_new_session=platform != "win32",
         )
+        # Unread pipes fill up and block the daemon on its next write, so they are drained for the lifetime of the process
+        if self._farmer_config.get("log_binary_daemon_output", False) and self._daemon_output_log_pipeline is None:
+            self._daemon_output_log_pipeline = LogPipeline(name="binary_daemon_output_pipeline")
+            self._daemon_output_log_pipeline.start()
+        self._daemon_process_output = ProcessOutput(name="binary_daemon_output", log_pipeline=self._daemon_output_log_pipeline)
+        self._daemon_process_output.attach(process, stdout_sink=make_text_sink(sys.stdout), stderr_sink=make_text_sink(sys.stderr))
 
         return process
+
+    async def _close_daemon_process_output(self) -> None:
+        if self._daemon_process_output is not None:
+            await self._daemon_process_output.close()
+            self._daemon_process_output = None
+
+
+class BinaryDaemonComponent(SupervisedComponent):
+    _environment: BinaryChiaEnvironment
+    _service_names: List[str]
+
+    def __init__(self, environment: BinaryChiaEnvironment, service_names: List[str]):
+        self.name = "daemon"
+        self._environment = environment
+        self._service_names = service_names
+
+    async def check(self) -> Optional[str]:
+        return await self._environment.check_daemon()
+
+    async def restart(self) -> None:
+        await self._environment.restart_daemon(self._service_names)
+
+
+class BinaryServiceComponent(SupervisedComponent):
+    _environment: BinaryChiaEnvironment
+    _service: str
+
+    def __init__(self, environment: BinaryChiaEnvironment, service: str, depends_on: str):
+        self.name = service
+        self.depends_on = depends_on
+        self._environment = environment
+        self._service = service
+
+    async def check(self) -> Optional[str]:
+        return await self._environment.check_service(self._service)
+
+    async def restart(self) -> None:
+        await self._environment.restart_service(self._service)
@@ -1,7 +1,7 @@
 import subprocess
 import sys
 from abc import ABC
-from asyncio import StreamReader, create_task, Task
+from asyncio import to_thread
 from asyncio.subprocess import Process, create_subprocess_exec, PIPE
 from os.path import join
 from pathlib import Path
@@ -10,6 +10,9 @@ from sys import platform
 from typing import Optional, List
 
 from foxy_farmer.binary_manager.binary_manager import BinaryManager
+from foxy_farmer.ff_logging.log_pipeline import LogPipeline
+from foxy_farmer.ff_logging.process_output import ProcessOutput, make_text_sink
+from foxy_farmer.monitoring.process_supervisor import SupervisedComponent
 
 
 class BinaryEnvironment(ABC):
@@ -20,7 +23,11 @@ class BinaryEnvironment(ABC):
     _binary_manager: BinaryManager
     _binary_directory_path: Optional[Path] = None
     _process: Optional[Process] = None
-    _logging_tasks: List[Task] = []
+    _process_output: Optional[ProcessOutput] = None
+    _log_pipeline: LogPipeline
+
+    def __init__(self):
+        self._log_pipeline = LogPipeline(name="binary_output_pipeline")
 
     async def init(self) -> None:
         if self._binary_directory_path is None:
@@ -29,6 +36,7 @@ class BinaryEnvironment(ABC):
     async def start(self) -> None:
         if self._process is not None:
             return
+        self._log_pipeline.start()
         self._process = await self._start_process()
 
     async def stop(self) -> None:
@@ -36,12 +44,34 @@ class BinaryEnvironment(ABC):
             self._process.send_signal(CTRL_BREAK_EVENT)
             await self._process.wait()
             self._process = None
-            for task in self._logging_tasks:
-                task.cancel()
+            await self._close_process_output()
+            await to_thread(self._log_pipeline.stop)
 
     async def kill(self):
         await self.stop()
 
+    def get_supervised_components(self) -> List[SupervisedComponent]:
+        return [BinaryProcessComponent(self)]
+
+    def check_process(self) -> Optional[str]:
+        if self._process is None:
+            return "process is not running"
+        if self._process.returncode is not None:
+            tail = self._process_output.tail if self._process_output is not None else ""
+
+            return f"process exited with code {self._process.returncode}, last output:\n{tail[-2000:]}"
+
+        return None
+
+    async def restart(self) -> None:
+        if self._process is not None:
+            if self._process.returncode is None:
+                self._process.kill()
+            await self._process.wait()
+            self._process = None
+            await self._close_process_output()
+        self._process = await self._start_process()
+
     async def _start_process(self) -> Process:
         creationflags = 0
         if platform == "win32":
@@ -55,17 +85,27 @@ class BinaryEnvironment(ABC):
             stderr=PIPE,
             creationflags=creationflags,
         )
-        self._setup_stream_logger(process.stdout, sys.stdout)
-        self._setup_stream_logger(process.stderr, sys.stderr)
+        self._process_output = ProcessOutput(name="binary_output", log_pipeline=self._log_pipeline)
+        # Decoding and terminal I/O happen on the log pipeline thread
+        self._process_output.attach(process, stdout_sink=make_text_sink(sys.stdout), stderr_sink=make_text_sink(sys.stderr))
 
         return process
 
-    def _setup_stream_logger(self, input_stream: StreamReader, output_stream) -> None:
-        async def log_stream():
-            while True:
-                line = await input_stream.readline()
-                if not line:
-                    break
-                print(line.decode('utf-8'), end='', file=output_stream)
+    async def _close_process_output(self) -> None:
+        if self._process_output is not None:
+            await self._process_output.close()
+            self._process_output = None
+
+
+class BinaryProcessComponent(SupervisedComponent):
+    _environment: BinaryEnvironment
+
+    def __init__(self, environment: BinaryEnvironment):
+        self.name = "binary_harvester"
+        self._environment = environment
+
+    async def check(self) -> Optional[str]:
+        return self._environment.check_process()
 
-        self._logging_tasks.append(create_task(log_stream()))
+    async def restart(self) -> None:
+        await self._environment.restart()
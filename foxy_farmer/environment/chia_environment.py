@@ -1,6 +1,8 @@
 from pathlib import Path
 from typing import Protocol, Dict, Any, List
 
+from foxy_farmer.monitoring.process_supervisor import SupervisedComponent
+
 
 class ChiaEnvironment(Protocol):
     root_path: Path
@@ -24,3 +26,6 @@ class ChiaEnvironment(Protocol):
 
     async def kill(self):
         await self.stop_daemon()
+
+    def get_supervised_components(self, service_names: List[str]) -> List[SupervisedComponent]:
+        return []
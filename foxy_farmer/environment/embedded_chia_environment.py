@@ -1,16 +1,28 @@
-from asyncio import create_task, Task, Event, sleep
+from asyncio import Task, Event, wait, FIRST_COMPLETED, create_task, sleep, to_thread
 from logging import Logger, getLogger
+from time import monotonic
 from pathlib import Path
 from typing import Any, Dict, Optional, List
 
-from chia.daemon.client import connect_to_daemon_and_validate, DaemonProxy
+from chia.daemon.client import DaemonProxy
 from chia.types.aliases import FarmerService, HarvesterService, WalletService
 from chia.util.service_groups import services_for_groups
 
+from foxy_farmer.config.foxy_config import FoxyConfig
 from foxy_farmer.exceptions.already_running_exception import AlreadyRunningException
 from foxy_farmer.environment.chia_environment import ChiaEnvironment
-from foxy_farmer.daemon.daemon_proxy import get_daemon_proxy, ensure_daemon_keyring_is_unlocked
+from foxy_farmer.daemon.daemon_proxy import get_daemon_proxy, ensure_daemon_keyring_is_unlocked, \
+    connect_to_daemon_and_validate
+from foxy_farmer.environment.service.handover_harvester import prepare_handover_harvester
+from foxy_farmer.environment.service.harvester_hooks import HarvesterHooks
+from foxy_farmer.environment.service.harvester_shards import HarvesterShards
 from foxy_farmer.environment.service.service_factory import ServiceFactory
+from foxy_farmer.environment.service.service_plan import run_service_plan, service_start_dependencies, format_service_timings
+from foxy_farmer.monitoring.component_task import create_component_task
+from foxy_farmer.monitoring.farmer_api_hooks import FarmerApiHooks
+from foxy_farmer.monitoring.harvester_lookup_stats import HarvesterLookupStats
+from foxy_farmer.monitoring.process_supervisor import SupervisedComponent
+from foxy_farmer.plots.plot_shards import get_shard_plot_directories
 from foxy_farmer.util.awaitable import await_done
 
 
@@ -20,23 +32,39 @@ class EmbeddedChiaEnvironment(ChiaEnvironment):
     _daemon_run_task: Optional[Task[None]] = None
     _daemon_proxy: Optional[DaemonProxy] = None
     _shut_down_daemon_event: Event = Event()
+    _daemon_listening_event: Event = Event()
     _farmer_service: Optional[FarmerService] = None
+    farmer_api_hooks: Optional[FarmerApiHooks] = None
     _farmer_run_task: Optional[Task[None]] = None
     _harvester_service: Optional[HarvesterService] = None
     _harvester_run_task: Optional[Task[None]] = None
+    _harvester_lookup_stats: Optional[HarvesterLookupStats] = None
+    _harvester_hooks: Optional[HarvesterHooks] = None
+    _harvester_shards: Optional[HarvesterShards] = None
+    _is_harvester_warmed_up: bool = False
+    _farmer_config: Optional[FoxyConfig]
     _wallet_service: Optional[WalletService] = None
     _wallet_run_task: Optional[Task[None]] = None
 
-    def __init__(self, root_path: Path, config: Dict[str, Any], allow_connecting_to_existing_daemon: bool):
+    def __init__(
+        self,
+        root_path: Path,
+        config: Dict[str, Any],
+        allow_connecting_to_existing_daemon: bool,
+        harvester_lookup_stats: Optional[HarvesterLookupStats] = None,
+        farmer_config: Optional[FoxyConfig] = None,
+    ):
         self.root_path = root_path
         self.config = config
         self.allow_connecting_to_existing_daemon = allow_connecting_to_existing_daemon
+        self._harvester_lookup_stats = harvester_lookup_stats
+        self._farmer_config = farmer_config
         self._service_factory = ServiceFactory(root_path=root_path, config=config)
 
     async def start_daemon(self) -> None:
         if self._daemon_proxy is not None:
             return
-        self._daemon_proxy = await connect_to_daemon_and_validate(self.root_path, self.config, quiet=True)
+        self._daemon_proxy = await connect_to_daemon_and_validate(self.root_path, self.config)
         if self._daemon_proxy is not None:
             if not self.allow_connecting_to_existing_daemon:
                 self._logger.error("Another instance of foxy-farmer is already running, exiting now ..")
@@ -47,10 +75,21 @@ class EmbeddedChiaEnvironment(ChiaEnvironment):
 
             return
 
-        self._daemon_run_task = create_task(self._run_daemon_and_await_shutdown())
-        await sleep(1)
+        started_at = monotonic()
+        self._daemon_listening_event.clear()
+        daemon_run_task = create_component_task(self._run_daemon_and_await_shutdown(), component="daemon")
+        self._daemon_run_task = daemon_run_task
+        listening_task = create_task(self._daemon_listening_event.wait())
+        await wait([listening_task, daemon_run_task], return_when=FIRST_COMPLETED)
+        if not listening_task.done():
+            # The daemon stopped before it was listening, surface the error it stopped with
+            listening_task.cancel()
+            daemon_run_task.result()
+
+            raise RuntimeError("The daemon stopped before it was listening")
         self._daemon_proxy = await get_daemon_proxy(self.root_path, self.config)
         await ensure_daemon_keyring_is_unlocked(self._daemon_proxy)
+        self._logger.debug(f"Daemon ready after {monotonic() - started_at:.2f}s")
 
     async def stop_daemon(self) -> None:
         if self._daemon_proxy is not None:
@@ -63,39 +102,170 @@ class EmbeddedChiaEnvironment(ChiaEnvironment):
             self._daemon_run_task = None
 
     async def start_services(self, service_names: List[str]) -> None:
-        for service in services_for_groups(service_names):
-            if service == "chia_farmer" and self._farmer_service is None:
-                self._farmer_service = self._service_factory.make_farmer()
-                self._farmer_run_task = create_task(self._farmer_service.run())
-            elif service == "chia_harvester" and self._harvester_service is None:
-                self._harvester_service = self._service_factory.make_harvester()
-                self._harvester_run_task = create_task(self._harvester_service.run())
-            elif service == "chia_wallet" and self._wallet_service is None:
-                self._wallet_service = self._service_factory.make_wallet()
-                self._wallet_run_task = create_task(self._wallet_service.run())
+        timings = await run_service_plan(
+            list(services_for_groups(service_names)),
+            self._start_service,
+            dependencies=service_start_dependencies,
+        )
+        if len(timings) > 0:
+            self._logger.info(f"Started services ({format_service_timings(timings)})")
 
     async def stop_services(self, service_names: List[str]) -> None:
-        for service in services_for_groups(service_names):
-            if service == "chia_farmer" and self._farmer_service is not None:
-                self._farmer_service.stop_requested.set()
-                self._farmer_service = None
-                await await_done(self._farmer_run_task)
-                self._farmer_run_task = None
-            elif service == "chia_harvester" and self._harvester_service is not None:
-                self._harvester_service.stop_requested.set()
-                self._harvester_service = None
-                await await_done(self._harvester_run_task)
-                self._harvester_run_task = None
-            elif service == "chia_wallet" and self._wallet_service is not None:
-                self._wallet_service.stop_requested.set()
-                self._wallet_service = None
-                await await_done(self._wallet_run_task)
-                self._wallet_run_task = None
+        # Services shut down independently of each other, so all of them are stopped at once
+        timings = await run_service_plan(list(services_for_groups(service_names)), self._stop_service)
+        if len(timings) > 0:
+            self._logger.info(f"Stopped services ({format_service_timings(timings)})")
+
+    async def warm_up_harvester(self, harvester_handshake: bytes) -> Optional[int]:
+        """ Loads the plots of the harvester before the farmer started, returns the plot count or None if not supported. """
+        from chia.consensus.default_constants import DEFAULT_CONSTANTS
+        from chia.protocols.harvester_protocol import HarvesterHandshake
+        from chia.server.start_harvester import create_harvester_service
+        from chia.util.config import load_config
+
+        if self._harvester_service is not None or self._harvester_shards is not None:
+            return None
+        # Shards and GPUs would have to be shared with the harvester of the previous version
+        if len(self._get_shard_plot_directories()) > 1 or self.config["harvester"].get("use_gpu_harvesting", False):
+            return None
+        harvester_root_path = prepare_handover_harvester(self.root_path, self.config)
+        # The harvester connects to the farmer once it started, the previous version is still farming until then
+        self._harvester_service = create_harvester_service(
+            harvester_root_path,
+            load_config(harvester_root_path, "config.yaml"),
+            DEFAULT_CONSTANTS,
+            set(),
+            connect_to_daemon=False,
+        )
+        harvester = self._harvester_service._node
+        self._harvester_hooks = HarvesterHooks(harvester_root_path, harvester, self._farmer_config, self._harvester_lookup_stats)
+        self._harvester_hooks.install()
+        self._harvester_run_task = create_component_task(self._harvester_service.run(), component="harvester")
+        self._is_harvester_warmed_up = True
+        # The handshake of the farmer starts the plot refresh, which is what the previous version received last
+        handshake = HarvesterHandshake.from_bytes(harvester_handshake)
+        harvester.plot_manager.set_public_keys(handshake.farmer_public_keys, handshake.pool_public_keys)
+        harvester.plot_manager.start_refreshing()
+        while harvester.plot_manager.initial_refresh():
+            if self._harvester_run_task.done():
+                self._harvester_run_task.result()
+
+                raise RuntimeError("The harvester stopped before its plots were loaded")
+            await sleep(0.5)
+        # Like after a disconnect the plots stay loaded, the handshake of the farmer starts refreshing them again
+        await to_thread(harvester.plot_manager.stop_refreshing)
+
+        return harvester.plot_manager.plot_count()
+
+    async def _connect_warmed_up_harvester(self) -> None:
+        from chia.server.outbound_message import NodeType
+        from chia.types.peer_info import PeerInfo
+        from chia.util.config import get_unresolved_peer_infos
+        from chia.util.network import resolve
+
+        self._is_harvester_warmed_up = False
+        await self._wait_until_farmer_is_listening()
+        for farmer_peer in get_unresolved_peer_infos(self.config["harvester"], NodeType.FARMER):
+            # Connecting right away saves waiting for the next reconnect attempt, which keeps the connection afterwards
+            self._harvester_service.add_peer(farmer_peer)
+            try:
+                farmer_peer_info = PeerInfo(await resolve(farmer_peer.host), farmer_peer.port)
+                await self._harvester_service._server.start_client(farmer_peer_info, None)
+            except Exception as e:
+                self._logger.warning(f"Connecting the harvester to {farmer_peer.host} failed, retrying later: {e}")
+
+    async def _wait_until_farmer_is_listening(self) -> None:
+        while (
+            self._farmer_service is not None
+            and self._farmer_service._server.webserver is None
+            and not self._farmer_run_task.done()
+        ):
+            await sleep(0.05)
+
+    async def _start_service(self, service: str) -> None:
+        if service == "chia_farmer" and self._farmer_service is None:
+            self._farmer_service = self._service_factory.make_farmer()
+            self.farmer_api_hooks = FarmerApiHooks()
+            self.farmer_api_hooks.install(self._farmer_service._api)
+            self._farmer_run_task = create_component_task(self._farmer_service.run(), component="farmer")
+            # Harvesters started afterwards connect right away instead of waiting for their next reconnect attempt
+            await self._wait_until_farmer_is_listening()
+        elif service == "chia_harvester" and self._harvester_service is None and self._harvester_shards is None:
+            shard_plot_directories = self._get_shard_plot_directories()
+            if len(shard_plot_directories) > 1:
+                self._harvester_shards = HarvesterShards(
+                    self.root_path,
+                    self.config,
+                    self._farmer_config,
+                    shard_plot_directories,
+                    harvester_lookup_stats=self._harvester_lookup_stats,
+                )
+                self._harvester_shards.start()
+            else:
+                self._harvester_service = self._service_factory.make_harvester()
+                self._harvester_hooks = HarvesterHooks(
+                    self.root_path,
+                    self._harvester_service._node,
+                    self._farmer_config,
+                    self._harvester_lookup_stats,
+                )
+                self._harvester_hooks.install()
+                self._harvester_run_task = create_component_task(self._harvester_service.run(), component="harvester")
+        elif service == "chia_harvester" and self._is_harvester_warmed_up:
+            await self._connect_warmed_up_harvester()
+        elif service == "chia_wallet" and self._wallet_service is None:
+            self._wallet_service = self._service_factory.make_wallet()
+            self._wallet_run_task = create_component_task(self._wallet_service.run(), component="wallet")
+
+    async def _stop_service(self, service: str) -> None:
+        if service == "chia_farmer" and self._farmer_service is not None:
+            self._farmer_service.stop_requested.set()
+            self._farmer_service = None
+            await await_done(self._farmer_run_task)
+            self._farmer_run_task = None
+        elif service == "chia_harvester" and self._harvester_service is not None:
+            self._harvester_service.stop_requested.set()
+            self._harvester_service = None
+            self._is_harvester_warmed_up = False
+            await await_done(self._harvester_run_task)
+            self._harvester_run_task = None
+            if self._harvester_hooks is not None:
+                self._harvester_hooks.uninstall()
+                self._harvester_hooks = None
+        elif service == "chia_harvester" and self._harvester_shards is not None:
+            await self._harvester_shards.stop()
+            self._harvester_shards = None
+        elif service == "chia_wallet" and self._wallet_service is not None:
+            self._wallet_service.stop_requested.set()
+            self._wallet_service = None
+            await await_done(self._wallet_run_task)
+            self._wallet_run_task = None
+
+    def get_supervised_components(self, service_names: List[str]) -> List[SupervisedComponent]:
+        # The farmer and harvester run in this process, only harvester shards run in processes of their own
+        if self._harvester_shards is None:
+            return []
+
+        return self._harvester_shards.get_supervised_components()
+
+    def _get_shard_plot_directories(self) -> List[List[str]]:
+        from chia.util.cpu import available_logical_cores
+
+        if self._farmer_config is None or self._farmer_config.get("harvester_shards", 1) in (0, 1):
+            return []
+
+        return get_shard_plot_directories(
+            plot_directories=self.config["harvester"].get("plot_directories") or [],
+            mount_roots=self._farmer_config.get("plot_mount_roots", []),
+            shards=self._farmer_config["harvester_shards"],
+            logical_cores=available_logical_cores(),
+        )
 
     async def _run_daemon_and_await_shutdown(self):
         daemon_ws_server = self._service_factory.make_daemon()
         try:
             async with daemon_ws_server.run():
+                self._daemon_listening_event.set()
                 await self._shut_down_daemon_event.wait()
         finally:
             self._shut_down_daemon_event.clear()
@@ -0,0 +1,47 @@
+from os import getpid
+from pathlib import Path
+from shutil import copyfile, rmtree
+from typing import Any, Dict
+
+from foxy_farmer.environment.service.harvester_shards import make_standalone_harvester_config, save_harvester_root_config
+
+plot_cache_file_name = "plot_manager_v2.dat"
+
+
+def get_handover_harvester_root_path(root_path: Path, pid: int) -> Path:
+    return root_path / "handover" / f"harvester-{pid}"
+
+
+def prepare_handover_harvester(root_path: Path, config: Dict[str, Any]) -> Path:
+    """ Writes the config of a harvester which loads the plots while the previous version is still farming. """
+    from chia.util.path import path_from_root
+
+    remove_stale_handover_harvesters(root_path)
+    harvester_root_path = get_handover_harvester_root_path(root_path, getpid())
+    harvester_root_config = make_standalone_harvester_config(root_path, config)
+    harvester_config = harvester_root_config["harvester"]
+    # The certificate of the main root keeps the node id, so the farmer sees the same harvester after the update
+    harvester_config["ssl"] = {
+        key: str(path_from_root(root_path, harvester_config["ssl"][key]).resolve())
+        for key in ["private_crt", "private_key"]
+    }
+    save_harvester_root_config(harvester_root_path, harvester_root_config)
+    plot_cache_path = root_path / "cache" / plot_cache_file_name
+    if plot_cache_path.exists():
+        # Plots found in the cache load without reading their headers from disk again
+        (harvester_root_path / "cache").mkdir(parents=True, exist_ok=True)
+        copyfile(plot_cache_path, harvester_root_path / "cache" / plot_cache_file_name)
+
+    return harvester_root_path
+
+
+def remove_stale_handover_harvesters(root_path: Path) -> None:
+    from psutil import pid_exists
+
+    handover_path = root_path / "handover"
+    if not handover_path.exists():
+        return
+    for harvester_root_path in handover_path.glob("harvester-*"):
+        pid = harvester_root_path.name.removeprefix("harvester-")
+        if pid.isdigit() and int(pid) != getpid() and not pid_exists(int(pid)):
+            rmtree(harvester_root_path, ignore_errors=True)
@@ -0,0 +1,73 @@
+from logging import Handler
+from pathlib import Path
+from typing import Any, Optional
+
+from foxy_farmer.config.foxy_config import FoxyConfig
+from foxy_farmer.monitoring.harvester_lookup_stats import HarvesterLookupStats, install_harvester_lookup_hooks, \
+    uninstall_harvester_lookup_hooks
+from foxy_farmer.plots.indexed_plot_discovery import IndexedPlotDiscovery, install_plot_inventory_hooks, \
+    uninstall_plot_inventory_hooks
+from foxy_farmer.plots.plot_directory_watcher import PlotDirectoryWatcher
+from foxy_farmer.plots.refresh_batch_controller import RefreshBatchController
+
+
+class HarvesterHooks:
+    """ Installs the lookup timing, plot inventory, plot directory watcher and adaptive plot refresh into a harvester. """
+    _root_path: Path
+    _harvester: Any
+    _farmer_config: Optional[FoxyConfig]
+    _harvester_lookup_stats: Optional[HarvesterLookupStats]
+    _harvester_lookup_log_handler: Optional[Handler] = None
+    _plot_discovery: Optional[IndexedPlotDiscovery] = None
+    _plot_directory_watcher: Optional[PlotDirectoryWatcher] = None
+    _refresh_batch_controller: Optional[RefreshBatchController] = None
+
+    def __init__(
+        self,
+        root_path: Path,
+        harvester: Any,
+        farmer_config: Optional[FoxyConfig],
+        harvester_lookup_stats: Optional[HarvesterLookupStats],
+    ):
+        self._root_path = root_path
+        self._harvester = harvester
+        self._farmer_config = farmer_config
+        self._harvester_lookup_stats = harvester_lookup_stats
+
+    def install(self) -> None:
+        if self._harvester_lookup_stats is not None:
+            self._harvester_lookup_log_handler = install_harvester_lookup_hooks(self._harvester, self._harvester_lookup_stats)
+        if self._farmer_config is None:
+            return
+        if self._farmer_config.get("enable_plot_inventory", True):
+            self._plot_discovery = install_plot_inventory_hooks(self._root_path, self._harvester, self._farmer_config)
+            if self._farmer_config.get("enable_plot_directory_watcher", False):
+                self._plot_directory_watcher = PlotDirectoryWatcher(
+                    self._plot_discovery,
+                    self._harvester,
+                    consistency_check_interval_seconds=self._farmer_config.get("plot_consistency_check_interval_seconds", 21600),
+                )
+                if not self._plot_directory_watcher.start():
+                    self._plot_directory_watcher = None
+        if self._harvester_lookup_stats is not None and self._farmer_config.get("enable_adaptive_plot_refresh", True):
+            self._refresh_batch_controller = RefreshBatchController(
+                self._harvester,
+                self._harvester_lookup_stats,
+                # Several eligible plots on the same disk are looked up one after another within the budget
+                lookup_latency_target_seconds=self._farmer_config.get("lookup_time_budget_seconds", 5) / 5,
+            )
+            self._refresh_batch_controller.install()
+
+    def uninstall(self) -> None:
+        if self._harvester_lookup_log_handler is not None:
+            uninstall_harvester_lookup_hooks(self._harvester_lookup_log_handler)
+            self._harvester_lookup_log_handler = None
+        if self._refresh_batch_controller is not None:
+            self._refresh_batch_controller.uninstall()
+            self._refresh_batch_controller = None
+        if self._plot_directory_watcher is not None:
+            self._plot_directory_watcher.stop()
+            self._plot_directory_watcher = None
+        if self._plot_discovery is not None:
+            uninstall_plot_inventory_hooks(self._plot_discovery)
+            self._plot_discovery = None
@@ -0,0 +1,255 @@
+from asyncio import run, sleep, to_thread, create_task, gather
+from copy import deepcopy
+from logging import Logger, getLogger, Handler, LogRecord
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing import get_context
+from pathlib import Path
+from signal import signal, SIGINT, SIG_IGN
+from typing import Any, Dict, List, Optional
+
+from foxy_farmer.config.foxy_config import FoxyConfig
+from foxy_farmer.environment.service.harvester_hooks import HarvesterHooks
+from foxy_farmer.monitoring.harvester_lookup_stats import HarvesterLookupStats, LookupLogHandler, add_harvester_lookup_log_handler
+from foxy_farmer.monitoring.process_supervisor import SupervisedComponent
+
+
+def get_harvester_shard_root_path(root_path: Path, shard_index: int) -> Path:
+    return root_path / "harvester_shards" / f"shard-{shard_index}"
+
+
+def make_standalone_harvester_config(root_path: Path, config: Dict[str, Any]) -> Dict[str, Any]:
+    """ Copies the config for a harvester running in its own root path, next to the harvester of the main root. """
+    from chia.server.ssl_context import private_ssl_ca_paths, chia_ssl_ca_paths
+
+    private_ca_crt_path, private_ca_key_path = private_ssl_ca_paths(root_path, config)
+    chia_ca_crt_path, chia_ca_key_path = chia_ssl_ca_paths(root_path, config)
+    harvester_root_config = deepcopy(config)
+    # The CAs stay in the main root, absolute paths take precedence over the root path of the harvester
+    private_ssl_ca = {"crt": str(private_ca_crt_path.resolve()), "key": str(private_ca_key_path.resolve())}
+    chia_ssl_ca = {"crt": str(chia_ca_crt_path.resolve()), "key": str(chia_ca_key_path.resolve())}
+    harvester_root_config["private_ssl_ca"] = private_ssl_ca
+    harvester_root_config["chia_ssl_ca"] = chia_ssl_ca
+    harvester_config = harvester_root_config["harvester"]
+    harvester_config["private_ssl_ca"] = private_ssl_ca
+    harvester_config["chia_ssl_ca"] = chia_ssl_ca
+    # Both harvesters would bind the same rpc port, the farmer serves the plots of all harvesters anyway
+    harvester_config["start_rpc_server"] = False
+
+    return harvester_root_config
+
+
+def save_harvester_root_config(harvester_root_path: Path, harvester_root_config: Dict[str, Any]) -> None:
+    from chia.util.config import lock_config, save_config
+
+    (harvester_root_path / "config").mkdir(parents=True, exist_ok=True)
+    with lock_config(harvester_root_path, "config.yaml"):
+        save_config(harvester_root_path, "config.yaml", harvester_root_config)
+
+
+def prepare_harvester_shard(
+    root_path: Path,
+    config: Dict[str, Any],
+    shard_index: int,
+    shard_count: int,
+    plot_directories: List[str],
+) -> Path:
+    """ Writes the config of a shard and creates its harvester certificate, which gives every shard its own node id. """
+    from chia.server.ssl_context import private_ssl_ca_paths
+    from chia.ssl.create_ssl import generate_ca_signed_cert
+    from chia.util.cpu import available_logical_cores
+
+    shard_root_path = get_harvester_shard_root_path(root_path, shard_index)
+    private_ca_crt_path, private_ca_key_path = private_ssl_ca_paths(root_path, config)
+    private_crt_path = Path("config") / "ssl" / "harvester" / "private_harvester.crt"
+    private_key_path = Path("config") / "ssl" / "harvester" / "private_harvester.key"
+    if not (shard_root_path / private_crt_path).exists() or not (shard_root_path / private_key_path).exists():
+        (shard_root_path / private_crt_path).parent.mkdir(parents=True, exist_ok=True)
+        generate_ca_signed_cert(
+            private_ca_crt_path.read_bytes(),
+            private_ca_key_path.read_bytes(),
+            shard_root_path / private_crt_path,
+            shard_root_path / private_key_path,
+        )
+
+    shard_config = make_standalone_harvester_config(root_path, config)
+    harvester_config = shard_config["harvester"]
+    harvester_config["ssl"] = {"private_crt": str(private_crt_path), "private_key": str(private_key_path)}
+    harvester_config["plot_directories"] = plot_directories
+    if not harvester_config.get("use_gpu_harvesting", False):
+        # The decompressor threads of all shards share the same cores, 0 means all cores
+        decompressor_thread_count = harvester_config.get("decompressor_thread_count", 0) or available_logical_cores()
+        harvester_config["decompressor_thread_count"] = max(1, decompressor_thread_count // shard_count)
+    save_harvester_root_config(shard_root_path, shard_config)
+
+    return shard_root_path
+
+
+def run_harvester_shard(shard_root_path: Path, farmer_config: FoxyConfig, log_level: str, log_queue: Any, stop_event: Any) -> None:
+    """ Entrypoint of a shard process, log records are sent to the main process. """
+    # The main process stops the shards through the stop event, do not react to the Ctrl+C sent to the whole process group
+    signal(SIGINT, SIG_IGN)
+    root_logger = getLogger()
+    root_logger.handlers.clear()
+    root_logger.addHandler(QueueHandler(log_queue))
+    root_logger.setLevel(log_level)
+    run(run_harvester_shard_service(shard_root_path, farmer_config, stop_event))
+
+
+async def run_harvester_shard_service(shard_root_path: Path, farmer_config: FoxyConfig, stop_event: Any) -> None:
+    from chia.consensus.default_constants import DEFAULT_CONSTANTS
+    from chia.server.outbound_message import NodeType
+    from chia.server.start_harvester import create_harvester_service
+    from chia.util.config import load_config, get_unresolved_peer_infos
+
+    config = load_config(shard_root_path, "config.yaml")
+    farmer_peers = get_unresolved_peer_infos(config["harvester"], NodeType.FARMER)
+    service = create_harvester_service(shard_root_path, config, DEFAULT_CONSTANTS, farmer_peers, connect_to_daemon=False)
+    # Lookup times are only needed locally for the adaptive plot refresh, the main process aggregates the logged lookups
+    hooks = HarvesterHooks(
+        shard_root_path,
+        service._node,
+        farmer_config,
+        HarvesterLookupStats(lookup_time_budget_seconds=farmer_config.get("lookup_time_budget_seconds", 5)),
+    )
+    hooks.install()
+
+    async def stop_when_requested() -> None:
+        # The service replaces its stop event once started, so keep setting it until the service stopped
+        while True:
+            if stop_event.is_set():
+                service.stop_requested.set()
+            await sleep(0.5)
+
+    stop_task = create_task(stop_when_requested())
+    try:
+        await service.run()
+    finally:
+        stop_task.cancel()
+        hooks.uninstall()
+
+
+class ForwardedLogRecordHandler(Handler):
+    """ Hands log records of the shard processes to the logger they were logged with in the shard. """
+    def emit(self, record: LogRecord) -> None:
+        getLogger(record.name).handle(record)
+
+
+class HarvesterShards:
+    """ Runs the embedded harvester as several processes which each farm a share of the plot directories. """
+    _stop_timeout_seconds: float = 30
+    _root_path: Path
+    _config: Dict[str, Any]
+    _farmer_config: FoxyConfig
+    _shard_plot_directories: List[List[str]]
+    _shard_root_paths: List[Path]
+    _harvester_lookup_stats: Optional[HarvesterLookupStats]
+    _harvester_lookup_log_handler: Optional[Handler] = None
+    _processes: List[Any]
+    _context: Optional[Any] = None
+    _stop_event: Optional[Any] = None
+    _log_queue: Optional[Any] = None
+    _log_listener: Optional[QueueListener] = None
+    _logger: Logger = getLogger("harvester_shards")
+
+    def __init__(
+        self,
+        root_path: Path,
+        config: Dict[str, Any],
+        farmer_config: FoxyConfig,
+        shard_plot_directories: List[List[str]],
+        harvester_lookup_stats: Optional[HarvesterLookupStats] = None,
+    ):
+        self._root_path = root_path
+        self._config = config
+        # Mount roots are resolved into the plot directories of the shards already
+        self._farmer_config = {**farmer_config, "plot_mount_roots": []}
+        self._shard_plot_directories = shard_plot_directories
+        self._shard_root_paths = []
+        self._harvester_lookup_stats = harvester_lookup_stats
+        self._processes = []
+
+    def start(self) -> None:
+        self._context = get_context("spawn")
+        self._stop_event = self._context.Event()
+        self._log_queue = self._context.Queue()
+        self._log_listener = QueueListener(self._log_queue, ForwardedLogRecordHandler())
+        self._log_listener.start()
+        if self._harvester_lookup_stats is not None:
+            # The signage point lookups logged by the shards arrive on the harvester logger of this process
+            self._harvester_lookup_log_handler = LookupLogHandler(self._harvester_lookup_stats)
+            add_harvester_lookup_log_handler(self._harvester_lookup_log_handler)
+        shard_count = len(self._shard_plot_directories)
+        for shard_index, plot_directories in enumerate(self._shard_plot_directories):
+            self._shard_root_paths.append(
+                prepare_harvester_shard(self._root_path, self._config, shard_index, shard_count, plot_directories),
+            )
+            self._processes.append(self._start_shard_process(shard_index))
+            self._logger.info(f"Started harvester shard {shard_index} with {len(plot_directories)} plot directories")
+
+    async def stop(self) -> None:
+        if self._stop_event is not None:
+            self._stop_event.set()
+        # The shards all stop at once, so wait for them concurrently
+        await gather(*[to_thread(process.join, self._stop_timeout_seconds) for process in self._processes])
+        for process in self._processes:
+            if process.is_alive():
+                self._logger.warning(f"{process.name} did not stop in time, terminating it")
+                process.terminate()
+        self._processes = []
+        self._shard_root_paths = []
+        if self._harvester_lookup_log_handler is not None:
+            getLogger("chia.harvester.harvester").removeHandler(self._harvester_lookup_log_handler)
+            self._harvester_lookup_log_handler = None
+        if self._log_listener is not None:
+            self._log_listener.stop()
+            self._log_listener = None
+
+    def get_supervised_components(self) -> List[SupervisedComponent]:
+        return [HarvesterShardComponent(self, shard_index) for shard_index in range(len(self._processes))]
+
+    def check_shard(self, shard_index: int) -> Optional[str]:
+        process = self._processes[shard_index]
+        if process.is_alive():
+            return None
+
+        return f"{process.name} exited with code {process.exitcode}"
+
+    async def restart_shard(self, shard_index: int) -> None:
+        process = self._processes[shard_index]
+        if process.is_alive():
+            process.terminate()
+        await to_thread(process.join, self._stop_timeout_seconds)
+        self._processes[shard_index] = self._start_shard_process(shard_index)
+
+    def _start_shard_process(self, shard_index: int) -> Any:
+        process = self._context.Process(
+            target=run_harvester_shard,
+            args=(
+                self._shard_root_paths[shard_index],
+                self._farmer_config,
+                self._config["logging"].get("log_level", "INFO"),
+                self._log_queue,
+                self._stop_event,
+            ),
+            name=f"harvester_shard_{shard_index}",
+            daemon=True,
+        )
+        process.start()
+
+        return process
+
+
+class HarvesterShardComponent(SupervisedComponent):
+    _harvester_shards: HarvesterShards
+    _shard_index: int
+
+    def __init__(self, harvester_shards: HarvesterShards, shard_index: int):
+        self.name = f"harvester_shard_{shard_index}"
+        self._harvester_shards = harvester_shards
+        self._shard_index = shard_index
+
+    async def check(self) -> Optional[str]:
+        return self._harvester_shards.check_shard(self._shard_index)
+
+    async def restart(self) -> None:
+        await self._harvester_shards.restart_shard(self._shard_index)
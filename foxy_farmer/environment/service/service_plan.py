@@ -0,0 +1,65 @@
+from asyncio import Task, create_task, wait
+from time import monotonic
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# Services connect to the services listed here on startup, starting those first avoids waiting for a reconnect
+service_start_dependencies: Dict[str, List[str]] = {
+    "chia_harvester": ["chia_farmer"],
+    "chia_farmer": ["chia_full_node"],
+    "chia_wallet": ["chia_full_node"],
+    "chia_timelord": ["chia_full_node"],
+}
+
+
+async def run_service_plan(
+    services: List[str],
+    operation: Callable[[str], Awaitable[None]],
+    dependencies: Optional[Dict[str, List[str]]] = None,
+) -> Dict[str, float]:
+    """ Runs the operation for all services concurrently, a service only waits for the planned services it depends on. """
+    dependencies = dependencies or {}
+    tasks: Dict[str, Task] = {}
+    timings: Dict[str, float] = {}
+
+    async def run_operation(service: str, dependency_tasks: List[Task]) -> None:
+        if len(dependency_tasks) > 0:
+            # Dependencies only order the operations, a failed dependency does not prevent the service operation
+            await wait(dependency_tasks)
+        started_at = monotonic()
+        try:
+            await operation(service)
+        finally:
+            timings[service] = monotonic() - started_at
+
+    planned_services = list(dict.fromkeys(services))
+
+    def plan(service: str, visiting: List[str]) -> Task:
+        if service in tasks:
+            return tasks[service]
+        dependency_tasks = [
+            plan(dependency, [*visiting, service])
+            for dependency in dependencies.get(service, [])
+            # Dependencies which are not part of the plan are already running or not needed, cycles are ignored
+            if dependency in planned_services and dependency not in visiting and dependency != service
+        ]
+        tasks[service] = create_task(run_operation(service, dependency_tasks), name=f"service_plan_{service}")
+
+        return tasks[service]
+
+    for planned_service in planned_services:
+        plan(planned_service, [])
+    if len(tasks) == 0:
+        return timings
+    try:
+        await wait(tasks.values())
+    finally:
+        for task in tasks.values():
+            task.cancel()
+    for task in tasks.values():
+        task.result()
+
+    return timings
+
+
+def format_service_timings(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{service}: {seconds:.2f}s" for service, seconds in timings.items())
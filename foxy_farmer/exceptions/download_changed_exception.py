@@ -0,0 +1,3 @@
+class DownloadChangedException(Exception):
+    ...
+    pass
@@ -1,19 +1,41 @@
 from pathlib import Path
+from typing import Optional
 
 from chia.util.config import load_config
 
 from foxy_farmer.config.foxy_config import FoxyConfig
 from foxy_farmer.environment.embedded_chia_environment import EmbeddedChiaEnvironment
 from foxy_farmer.farmer.chia_farmer import ChiaFarmer
+from foxy_farmer.monitoring.farmer_api_hooks import FarmerApiHooks
+from foxy_farmer.monitoring.harvester_lookup_stats import HarvesterLookupStats
 
 
 class BladebitFarmer(ChiaFarmer):
+    @property
+    def farmer_api_hooks(self) -> Optional[FarmerApiHooks]:
+        return self._environment.farmer_api_hooks
+
+    _environment: EmbeddedChiaEnvironment
+
     def __init__(self, root_path: Path, farmer_config: FoxyConfig):
+        super().__init__()
         self._farmer_config = farmer_config
         config = load_config(root_path, "config.yaml")
+        if farmer_config.get("enable_harvester") is True:
+            self._harvester_lookup_stats = HarvesterLookupStats(
+                lookup_time_budget_seconds=farmer_config.get("lookup_time_budget_seconds", 5),
+            )
         self._environment = EmbeddedChiaEnvironment(
             root_path=root_path,
             config=config,
             allow_connecting_to_existing_daemon=False,
+            harvester_lookup_stats=self._harvester_lookup_stats,
+            farmer_config=farmer_config,
         )
         self._root_path = root_path
+
+    async def warm_up(self, harvester_handshake: bytes) -> Optional[int]:
+        if self._farmer_config.get("enable_harvester") is not True:
+            return None
+
+        return await self._environment.warm_up_harvester(harvester_handshake)
@@ -5,7 +5,7 @@ from typing import List, Awaitable
 
 from foxy_farmer.environment.chia_environment import ChiaEnvironment
 from foxy_farmer.farmer.farmer import Farmer
-from foxy_farmer.monitoring.monitor_farmer import monitor_farmer
+from foxy_farmer.monitoring.farmer_connection_monitor import FarmerConnectionMonitor
 
 
 class ChiaFarmer(Farmer, ABC):
@@ -21,13 +21,28 @@ class ChiaFarmer(Farmer, ABC):
     _root_path: Path
 
     async def run(self) -> None:
-        await self._environment.init()
+        self._startup_timings.start()
+        with self._startup_timings.phase("init"):
+            await self._environment.init()
         try:
-            await self._environment.start_daemon()
-            await self._environment.start_services(self._services_to_run)
+            with self._startup_timings.phase("daemon"):
+                await self._environment.start_daemon()
+            with self._startup_timings.phase("services"):
+                await self._environment.start_services(self._services_to_run)
+            self._startup_timings.finish()
             futures: List[Awaitable] = [self._stop_event.wait()]
             if self._farmer_config.get("monitor_farmer_connections", True) is True:
-                futures.append(monitor_farmer(root_path=self._root_path, until=self._stop_event))
+                self._connection_monitor = FarmerConnectionMonitor(
+                    root_path=self._root_path,
+                    farmer_config=self._farmer_config,
+                    farmer_api_hooks=self.farmer_api_hooks,
+                )
+                futures.append(self._connection_monitor.run(until=self._stop_event))
+            if self._harvester_lookup_stats is not None:
+                futures.append(self._harvester_lookup_stats.run(until=self._stop_event))
+            self._process_supervisor = self._make_process_supervisor(self._environment.get_supervised_components(self._services_to_run))
+            if self._process_supervisor is not None:
+                futures.append(self._process_supervisor.run(until=self._stop_event))
             await gather(*futures)
         finally:
             await self._environment.stop_services(self._services_to_run)
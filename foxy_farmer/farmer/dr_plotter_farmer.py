@@ -1,4 +1,4 @@
-from asyncio import Task, create_task
+from asyncio import Task
 from pathlib import Path
 from typing import Optional
 from platform import system, machine
@@ -10,6 +10,9 @@ from foxy_farmer.environment.dr_plotter_chia_environment import DrPlotterChiaEnv
 from foxy_farmer.environment.embedded_chia_environment import EmbeddedChiaEnvironment
 from foxy_farmer.farmer.split_chia_farmer import SplitChiaFarmer
 from foxy_farmer.ff_logging.syslog_server import SyslogServer
+from foxy_farmer.monitoring.component_task import create_component_task
+from foxy_farmer.monitoring.harvester_lookup_stats import HarvesterLookupStats
+from foxy_farmer.monitoring.farmer_api_hooks import FarmerApiHooks
 
 
 class DrPlotterFarmer(SplitChiaFarmer):
@@ -21,10 +24,19 @@ class DrPlotterFarmer(SplitChiaFarmer):
 
         return False
 
+    @property
+    def farmer_api_hooks(self) -> Optional[FarmerApiHooks]:
+        return self._embedded_environment.farmer_api_hooks
+
+    @property
+    def syslog_server(self) -> Optional[SyslogServer]:
+        return self._syslog_server
+
     _syslog_server: SyslogServer
     _syslog_run_task: Optional[Task[None]] = None
 
     def __init__(self, root_path: Path, farmer_config: FoxyConfig):
+        super().__init__()
         self._farmer_config = farmer_config
         config = load_config(root_path, "config.yaml")
         self._environment = DrPlotterChiaEnvironment(
@@ -39,11 +51,15 @@ class DrPlotterFarmer(SplitChiaFarmer):
             allow_connecting_to_existing_daemon=True,
         )
         self._root_path = root_path
-        self._syslog_server = SyslogServer(logging_config=config["logging"])
+        if farmer_config.get("enable_harvester") is True:
+            self._harvester_lookup_stats = HarvesterLookupStats(
+                lookup_time_budget_seconds=farmer_config.get("lookup_time_budget_seconds", 5),
+            )
+        self._syslog_server = SyslogServer(logging_config=config["logging"], harvester_lookup_stats=self._harvester_lookup_stats)
 
     async def run(self) -> None:
         if self._syslog_run_task is None:
-            self._syslog_run_task = create_task(self._syslog_server.run())
+            self._syslog_run_task = create_component_task(self._syslog_server.run(), component="syslog_server")
         await super().run()
 
     async def stop(self) -> None:
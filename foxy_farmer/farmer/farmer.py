@@ -1,7 +1,14 @@
 from abc import ABC
 from asyncio import Event, sleep
+from typing import Optional, List
 
 from foxy_farmer.config.foxy_config import FoxyConfig
+from foxy_farmer.ff_logging.syslog_server import SyslogServer
+from foxy_farmer.monitoring.farmer_connection_monitor import FarmerConnectionMonitor
+from foxy_farmer.monitoring.farmer_api_hooks import FarmerApiHooks
+from foxy_farmer.monitoring.harvester_lookup_stats import HarvesterLookupStats
+from foxy_farmer.monitoring.process_supervisor import ProcessSupervisor, SupervisedComponent
+from foxy_farmer.monitoring.startup_timings import StartupTimings
 
 
 class Farmer(ABC):
@@ -9,12 +16,47 @@ class Farmer(ABC):
     def supports_system(self) -> bool:
         return True
 
+    @property
+    def farmer_api_hooks(self) -> Optional[FarmerApiHooks]:
+        return None
+
+    @property
+    def syslog_server(self) -> Optional[SyslogServer]:
+        return None
+
+    @property
+    def connection_monitor(self) -> Optional[FarmerConnectionMonitor]:
+        return self._connection_monitor
+
+    @property
+    def harvester_lookup_stats(self) -> Optional[HarvesterLookupStats]:
+        return self._harvester_lookup_stats
+
+    @property
+    def process_supervisor(self) -> Optional[ProcessSupervisor]:
+        return self._process_supervisor
+
+    @property
+    def startup_timings(self) -> StartupTimings:
+        return self._startup_timings
+
     _farmer_config: FoxyConfig
     _stop_event: Event = Event()
+    _connection_monitor: Optional[FarmerConnectionMonitor] = None
+    _harvester_lookup_stats: Optional[HarvesterLookupStats] = None
+    _process_supervisor: Optional[ProcessSupervisor] = None
+    _startup_timings: StartupTimings
+
+    def __init__(self):
+        self._startup_timings = StartupTimings()
 
     async def run(self) -> None:
         ...
 
+    async def warm_up(self, harvester_handshake: bytes) -> Optional[int]:
+        """ Loads the plots before running, returns the plot count or None if the farmer can not warm up. """
+        return None
+
     async def stop(self) -> None:
         self._stop_event.set()
         while self._stop_event.is_set():
@@ -22,3 +64,12 @@ class Farmer(ABC):
 
     async def kill(self) -> None:
         await self.stop()
+
+    def _make_process_supervisor(self, components: List[SupervisedComponent]) -> Optional[ProcessSupervisor]:
+        if len(components) == 0 or self._farmer_config.get("enable_process_supervisor", True) is not True:
+            return None
+        process_supervisor = ProcessSupervisor()
+        for component in components:
+            process_supervisor.add(component)
+
+        return process_supervisor
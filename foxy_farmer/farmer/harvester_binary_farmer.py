@@ -6,7 +6,7 @@ from typing import List, Awaitable
 from foxy_farmer.environment.binary_environment import BinaryEnvironment
 from foxy_farmer.environment.embedded_chia_environment import EmbeddedChiaEnvironment
 from foxy_farmer.farmer.farmer import Farmer
-from foxy_farmer.monitoring.monitor_farmer import monitor_farmer
+from foxy_farmer.monitoring.farmer_connection_monitor import FarmerConnectionMonitor
 
 
 class HarvesterBinaryFarmer(Farmer, ABC):
@@ -20,21 +20,38 @@ class HarvesterBinaryFarmer(Farmer, ABC):
 
     async def run(self) -> None:
         run_harvester = self._farmer_config.get("enable_harvester") is True
+        self._startup_timings.start()
         if run_harvester:
-            await self._binary_environment.init()
+            with self._startup_timings.phase("init"):
+                await self._binary_environment.init()
         try:
-            await self._embedded_environment.start_daemon()
-            await self._embedded_environment.start_services(self._services_to_run_on_embedded_env)
-            if run_harvester:
-                await self._binary_environment.start()
+            with self._startup_timings.phase("daemon"):
+                await self._embedded_environment.start_daemon()
+            with self._startup_timings.phase("services"):
+                # The binary harvester connects right away once the embedded farmer is listening
+                await self._embedded_environment.start_services(self._services_to_run_on_embedded_env)
+                if run_harvester:
+                    await self._binary_environment.start()
+            self._startup_timings.finish()
             futures: List[Awaitable] = [self._stop_event.wait()]
             if self._farmer_config.get("monitor_farmer_connections", True) is True:
-                futures.append(monitor_farmer(root_path=self._root_path, until=self._stop_event))
+                self._connection_monitor = FarmerConnectionMonitor(
+                    root_path=self._root_path,
+                    farmer_config=self._farmer_config,
+                    farmer_api_hooks=self.farmer_api_hooks,
+                )
+                futures.append(self._connection_monitor.run(until=self._stop_event))
+            if self._harvester_lookup_stats is not None:
+                futures.append(self._harvester_lookup_stats.run(until=self._stop_event))
+            self._process_supervisor = self._make_process_supervisor(self._binary_environment.get_supervised_components() if run_harvester else [])
+            if self._process_supervisor is not None:
+                futures.append(self._process_supervisor.run(until=self._stop_event))
             await gather(*futures)
         finally:
+            stops: List[Awaitable] = [self._embedded_environment.stop_services(self._services_to_run_on_embedded_env)]
             if run_harvester:
-                await self._binary_environment.stop()
-            await self._embedded_environment.stop_services(self._services_to_run_on_embedded_env)
+                stops.append(self._binary_environment.stop())
+            await gather(*stops)
             await self._embedded_environment.stop_daemon()
             self._stop_event.clear()
 
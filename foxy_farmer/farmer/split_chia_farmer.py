@@ -6,7 +6,7 @@ from typing import List, Awaitable
 from foxy_farmer.environment.chia_environment import ChiaEnvironment
 from foxy_farmer.environment.embedded_chia_environment import EmbeddedChiaEnvironment
 from foxy_farmer.farmer.farmer import Farmer
-from foxy_farmer.monitoring.monitor_farmer import monitor_farmer
+from foxy_farmer.monitoring.farmer_connection_monitor import FarmerConnectionMonitor
 
 
 class SplitChiaFarmer(Farmer, ABC):
@@ -29,18 +29,36 @@ class SplitChiaFarmer(Farmer, ABC):
     async def run(self) -> None:
         daemon_environment = self._daemon_environment
 
-        await daemon_environment.init()
+        self._startup_timings.start()
+        with self._startup_timings.phase("init"):
+            await daemon_environment.init()
         try:
-            await daemon_environment.start_daemon()
-            await self._embedded_environment.start_services(self._services_to_run_on_embedded_env)
-            await daemon_environment.start_services(self._services_to_run_on_env)
+            with self._startup_timings.phase("daemon"):
+                await daemon_environment.start_daemon()
+            with self._startup_timings.phase("services"):
+                # The harvester of the daemon connects right away once the embedded farmer is listening
+                await self._embedded_environment.start_services(self._services_to_run_on_embedded_env)
+                await daemon_environment.start_services(self._services_to_run_on_env)
+            self._startup_timings.finish()
             futures: List[Awaitable] = [self._stop_event.wait()]
             if self._farmer_config.get("monitor_farmer_connections", True) is True:
-                futures.append(monitor_farmer(root_path=self._root_path, until=self._stop_event))
+                self._connection_monitor = FarmerConnectionMonitor(
+                    root_path=self._root_path,
+                    farmer_config=self._farmer_config,
+                    farmer_api_hooks=self.farmer_api_hooks,
+                )
+                futures.append(self._connection_monitor.run(until=self._stop_event))
+            if self._harvester_lookup_stats is not None:
+                futures.append(self._harvester_lookup_stats.run(until=self._stop_event))
+            self._process_supervisor = self._make_process_supervisor(daemon_environment.get_supervised_components(self._services_to_run_on_env))
+            if self._process_supervisor is not None:
+                futures.append(self._process_supervisor.run(until=self._stop_event))
             await gather(*futures)
         finally:
-            await daemon_environment.stop_services(self._services_to_run_on_env)
-            await self._embedded_environment.stop_services(self._services_to_run_on_embedded_env)
+            await gather(
+                daemon_environment.stop_services(self._services_to_run_on_env),
+                self._embedded_environment.stop_services(self._services_to_run_on_embedded_env),
+            )
             await daemon_environment.stop_daemon()
             self._stop_event.clear()
 
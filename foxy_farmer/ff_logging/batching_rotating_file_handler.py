@@ -0,0 +1,185 @@
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+from logging import Handler, LogRecord, makeLogRecord
+from os import replace, remove, getpid
+from pathlib import Path
+from shutil import copyfileobj
+from threading import Thread, Event
+from typing import List, BinaryIO
+
+
+class BatchingRotatingFileHandler(Handler):
+    """ Buffers formatted records and writes them in batches, rotating and compressing old files in the background. """
+    _file_path: Path
+    _max_bytes: int
+    _backup_count: int
+    _use_gzip: bool
+    _flush_interval_seconds: float
+    _flush_size_bytes: int
+    _stream: BinaryIO
+    _bytes_written: int
+    _buffer: List[str]
+    _buffer_size: int
+    _rollover_count: int = 0
+    _is_failing: bool = False
+    _rotation_executor: ThreadPoolExecutor
+    _flush_thread: Thread
+    _closed_event: Event
+
+    def __init__(
+        self,
+        file_path: Path,
+        max_bytes: int,
+        backup_count: int,
+        use_gzip: bool = False,
+        flush_interval_seconds: float = 1,
+        flush_size_bytes: int = 64 * 1024,
+    ):
+        super().__init__()
+        self._file_path = file_path
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+        self._use_gzip = use_gzip
+        self._flush_interval_seconds = flush_interval_seconds
+        # Keep batches small compared to the rotation size so files do not grow much beyond `max_bytes`
+        self._flush_size_bytes = flush_size_bytes if max_bytes <= 0 else max(1, min(flush_size_bytes, max_bytes // 4))
+        self._file_path.parent.mkdir(parents=True, exist_ok=True)
+        self._stream = open(self._file_path, "ab")
+        self._bytes_written = self._stream.tell()
+        self._buffer = []
+        self._buffer_size = 0
+        self._rotation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log_rotation")
+        self._closed_event = Event()
+        self._flush_thread = Thread(target=self._flush_periodically, name="log_flush", daemon=True)
+        self._flush_thread.start()
+
+    @property
+    def file_path(self) -> Path:
+        return self._file_path
+
+    def change_file_path(self, file_path: Path) -> None:
+        """ Continues logging into another file, the records written so far are moved over to it. """
+        self.acquire()
+        try:
+            self._write_buffer()
+            previous_file_path = self._file_path
+            self._stream.close()
+            self._file_path = file_path
+            self._stream = open(self._file_path, "ab")
+            try:
+                with open(previous_file_path, "rb") as previous_file:
+                    copyfileobj(previous_file, self._stream)
+                self._stream.flush()
+                remove(previous_file_path)
+            except OSError:
+                pass
+            self._bytes_written = self._stream.tell()
+        finally:
+            self.release()
+
+    def emit(self, record: LogRecord) -> None:
+        try:
+            line = f"{self.format(record)}\n"
+        except Exception:
+            self.handleError(record)
+
+            return
+        self._buffer.append(line)
+        self._buffer_size += len(line)
+        if self._buffer_size >= self._flush_size_bytes:
+            self._write_buffer()
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            self._write_buffer()
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        self._closed_event.set()
+        self.acquire()
+        try:
+            self._write_buffer()
+            self._stream.close()
+        finally:
+            self.release()
+        self._rotation_executor.shutdown(wait=True)
+        super().close()
+
+    def _flush_periodically(self) -> None:
+        while not self._closed_event.wait(self._flush_interval_seconds):
+            self.flush()
+
+    def _write_buffer(self) -> None:
+        if len(self._buffer) == 0 or (self._stream.closed and self._closed_event.is_set()):
+            return
+        data = "".join(self._buffer).encode("utf-8", errors="replace")
+        # Records which can not be written are dropped, otherwise the buffer would grow without bound
+        self._buffer.clear()
+        self._buffer_size = 0
+        try:
+            if self._stream.closed:
+                # A failed rollover left no usable stream, try to reopen the file with every batch
+                self._stream = open(self._file_path, "ab")
+                self._bytes_written = self._stream.tell()
+            if 0 < self._max_bytes < self._bytes_written + len(data) and self._bytes_written > 0:
+                self._rollover()
+            self._stream.write(data)
+            self._stream.flush()
+        except OSError:
+            self._handle_write_error()
+
+            return
+        self._is_failing = False
+        self._bytes_written += len(data)
+
+    def _handle_write_error(self) -> None:
+        # Report once until writing succeeds again, a full disk would otherwise flood stderr with every batch
+        if self._is_failing:
+            return
+        self._is_failing = True
+        self.handleError(makeLogRecord({"msg": f"Could not write to the log file {self._file_path}"}))
+
+    def _rollover(self) -> None:
+        # Only rename the current file here, shifting and compressing the backups happens on the rotation thread
+        self._stream.close()
+        self._rollover_count += 1
+        # Another process can rotate the same file while handing over, so the pending name must not collide with its
+        pending_path = self._file_path.with_name(f"{self._file_path.name}.rotating-{getpid()}-{self._rollover_count}")
+        try:
+            replace(self._file_path, pending_path)
+        except OSError:
+            pending_path = None
+        if pending_path is not None:
+            self._rotation_executor.submit(self._rotate_backups, pending_path)
+        self._stream = open(self._file_path, "ab")
+        # Without a successful rename keep writing the current file, retrying only once it grew by `max_bytes` again
+        self._bytes_written = self._stream.tell() if pending_path is not None else 0
+
+    def _backup_path(self, index: int) -> Path:
+        suffix = ".gz" if self._use_gzip else ""
+
+        return self._file_path.with_name(f"{self._file_path.name}.{index}{suffix}")
+
+    def _rotate_backups(self, pending_path: Path) -> None:
+        try:
+            if self._backup_count <= 0:
+                remove(pending_path)
+
+                return
+            oldest_backup_path = self._backup_path(self._backup_count)
+            if oldest_backup_path.exists():
+                remove(oldest_backup_path)
+            for index in range(self._backup_count - 1, 0, -1):
+                backup_path = self._backup_path(index)
+                if backup_path.exists():
+                    replace(backup_path, self._backup_path(index + 1))
+            if self._use_gzip:
+                with open(pending_path, "rb") as source, gzip.open(self._backup_path(1), "wb") as destination:
+                    copyfileobj(source, destination)
+                remove(pending_path)
+            else:
+                replace(pending_path, self._backup_path(1))
+        except OSError:
+            pass
@@ -1,14 +1,25 @@
 import logging
 from contextlib import contextmanager
-from logging import Logger, StreamHandler, getLogger
+from logging import Logger, StreamHandler, Formatter, Handler, getLogger
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Dict, Iterator
+from queue import SimpleQueue
+from typing import Dict, Iterator, Optional, List
 
+import chia
 from chia.util.chia_logging import initialize_logging, default_log_level
+from chia.util.path import path_from_root
 from colorlog import ColoredFormatter
 
+from foxy_farmer.ff_logging.batching_rotating_file_handler import BatchingRotatingFileHandler
 
-def add_stdout_handler(logger: Logger, logging_config: Dict):
+_queue_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+_file_handler: Optional[BatchingRotatingFileHandler] = None
+_log_path: Optional[Path] = None
+
+
+def make_stdout_handler(logging_config: Dict) -> Handler:
     service_name = "foxy_farmer"
     file_name_length = 33 - len(service_name)
     log_date_format = "%Y-%m-%dT%H:%M:%S"
@@ -22,20 +33,32 @@ def add_stdout_handler(logger: Logger, logging_config: Dict):
         )
     )
     stdout_handler.setLevel(logging_config.get("log_level", default_log_level))
-    logger.addHandler(stdout_handler)
+
+    return stdout_handler
+
+
+def add_stdout_handler(logger: Logger, logging_config: Dict):
+    logger.addHandler(make_stdout_handler(logging_config))
 
 
-def initialize_logging_with_stdout(logging_config: Dict, root_path: Path):
+def initialize_logging_with_stdout(
+    logging_config: Dict,
+    root_path: Path,
+    use_queued_logging: bool = True,
+    is_taking_over: bool = False,
+):
+    if use_queued_logging:
+        initialize_queued_logging(logging_config=logging_config, root_path=root_path, is_taking_over=is_taking_over)
+
+        return
+
     service_name = "foxy_farmer"
     initialize_logging(
         service_name=service_name,
         logging_config={
             "log_filename": logging_config["log_filename"],
             "log_level": logging_config["log_level"],
-            "log_maxbytesrotation": logging_config.get(
-                "log_maxbytesrotation",
-                logging_config.get("log_maxbytessrotation", 52428800)
-            ),
+            "log_maxbytesrotation": get_max_bytes_rotation(logging_config),
             "log_maxfilesrotation": logging_config.get("log_maxfilesrotation", 7),
             "log_stdout": False,
             "log_syslog": False,
@@ -49,6 +72,74 @@ def initialize_logging_with_stdout(logging_config: Dict, root_path: Path):
     add_stdout_handler(root_logger, logging_config=logging_config)
 
 
+def initialize_queued_logging(logging_config: Dict, root_path: Path, is_taking_over: bool = False):
+    global _queue_listener, _queue_handler, _file_handler, _log_path
+    service_name = "foxy_farmer"
+    file_name_length = 33 - len(service_name)
+    log_date_format = "%Y-%m-%dT%H:%M:%S"
+    log_level = logging_config.get("log_level", default_log_level)
+
+    _log_path = path_from_root(root_path, logging_config.get("log_filename", "log/debug.log"))
+    # The file handler only supports a single process, the previous version keeps writing the log until it stopped
+    file_handler = BatchingRotatingFileHandler(
+        file_path=_log_path.with_name(f"{_log_path.stem}.takeover{_log_path.suffix}") if is_taking_over else _log_path,
+        max_bytes=get_max_bytes_rotation(logging_config),
+        backup_count=logging_config.get("log_maxfilesrotation", 7),
+        use_gzip=logging_config.get("log_use_gzip", False),
+    )
+    file_handler.setFormatter(Formatter(
+        f"%(asctime)s.%(msecs)03d {chia.__version__} {service_name} %(name)-{file_name_length}s: "
+        f"%(levelname)-8s %(message)s",
+        datefmt=log_date_format,
+    ))
+    _file_handler = file_handler
+    handlers: List[Handler] = [file_handler, make_stdout_handler(logging_config)]
+    for handler in handlers:
+        try:
+            handler.setLevel(log_level)
+        except ValueError:
+            handler.setLevel(default_log_level)
+
+    # Records are only enqueued on the calling thread, formatting and I/O happen on the listener thread
+    queue: SimpleQueue = SimpleQueue()
+    _queue_listener = QueueListener(queue, *handlers, respect_handler_level=True)
+    _queue_listener.start()
+
+    _queue_handler = QueueHandler(queue)
+    root_logger = getLogger()
+    root_logger.addHandler(_queue_handler)
+    root_logger.setLevel(min(handler.level for handler in handlers))
+    if root_logger.level <= logging.DEBUG:
+        getLogger("aiosqlite").setLevel(logging.INFO)
+
+
+def finish_taking_over_logging():
+    """ Moves to the log file of the previous version once it stopped writing to it. """
+    if _file_handler is None or _file_handler.file_path == _log_path:
+        return
+    _file_handler.change_file_path(_log_path)
+
+
+def shutdown_logging():
+    global _queue_listener, _queue_handler, _file_handler
+    if _queue_listener is None:
+        return
+    getLogger().removeHandler(_queue_handler)
+    _queue_listener.stop()
+    for handler in _queue_listener.handlers:
+        handler.close()
+    _queue_listener = None
+    _queue_handler = None
+    _file_handler = None
+
+
+def get_max_bytes_rotation(logging_config: Dict) -> int:
+    return logging_config.get(
+        "log_maxbytesrotation",
+        logging_config.get("log_maxbytessrotation", 52428800)
+    )
+
+
 @contextmanager
 def disabled_logging() -> Iterator[None]:
     logging.disable(level=logging.CRITICAL)
@@ -56,4 +147,3 @@ def disabled_logging() -> Iterator[None]:
         yield
     finally:
         logging.disable(level=logging.NOTSET)
-
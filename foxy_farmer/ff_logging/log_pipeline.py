@@ -0,0 +1,69 @@
+from queue import Queue, Full, Empty
+from threading import Thread
+from typing import Callable, Optional, Tuple
+
+LogSink = Callable[[bytes], None]
+
+
+class LogPipeline:
+    """ Runs log parsing, formatting and writing on a worker thread fed by a bounded queue of raw bytes. """
+    _name: str
+    _batch_size: int = 500
+    _queue: "Queue[Optional[Tuple[LogSink, bytes]]]"
+    _thread: Optional[Thread] = None
+    processed_entries: int
+    dropped_entries: int
+    failed_entries: int
+
+    def __init__(self, name: str, max_queued_entries: int = 10_000):
+        self._name = name
+        self._queue = Queue(maxsize=max_queued_entries)
+        self.processed_entries = 0
+        self.dropped_entries = 0
+        self.failed_entries = 0
+
+    @property
+    def queued_entries(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = Thread(target=self._run, name=self._name, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        # The sentinel must not be dropped, so block until there is room for it
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, sink: LogSink, data: bytes) -> bool:
+        try:
+            self._queue.put_nowait((sink, data))
+        except Full:
+            self.dropped_entries += 1
+
+            return False
+
+        return True
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self._batch_size:
+                    batch.append(self._queue.get_nowait())
+            except Empty:
+                pass
+            for entry in batch:
+                if entry is None:
+                    return
+                sink, data = entry
+                try:
+                    sink(data)
+                except Exception:
+                    self.failed_entries += 1
+                self.processed_entries += 1
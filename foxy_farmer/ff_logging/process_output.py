@@ -0,0 +1,79 @@
+from asyncio import StreamReader, Task, gather
+from asyncio.subprocess import Process
+from codecs import getincrementaldecoder
+from collections import deque
+from typing import Deque, List, Optional, TextIO
+
+from foxy_farmer.ff_logging.log_pipeline import LogPipeline, LogSink
+from foxy_farmer.monitoring.component_task import create_component_task
+
+
+def make_text_sink(output_stream: TextIO) -> LogSink:
+    # Chunks can end within a multibyte character, the decoder keeps the remainder for the next chunk
+    decoder = getincrementaldecoder("utf-8")(errors="replace")
+
+    def write(data: bytes) -> None:
+        print(decoder.decode(data), end="", file=output_stream)
+
+    return write
+
+
+class ProcessOutput:
+    """ Continuously drains the stdout and stderr pipes of a spawned binary, so it never blocks on a full pipe. """
+    _read_size: int = 64 * 1024
+    _name: str
+    _max_tail_bytes: int
+    _log_pipeline: Optional[LogPipeline]
+    _tail: Deque[bytes]
+    _tail_bytes: int = 0
+    _tasks: List[Task]
+    bytes_read: int = 0
+    dropped_chunks: int = 0
+
+    def __init__(self, name: str, max_tail_bytes: int = 64 * 1024, log_pipeline: Optional[LogPipeline] = None):
+        self._name = name
+        self._max_tail_bytes = max_tail_bytes
+        self._log_pipeline = log_pipeline
+        self._tail = deque()
+        self._tasks = []
+
+    def attach(self, process: Process, stdout_sink: Optional[LogSink] = None, stderr_sink: Optional[LogSink] = None) -> None:
+        if process.stdout is not None:
+            self._tasks.append(create_component_task(self._drain(process.stdout, stdout_sink), component=self._name))
+        if process.stderr is not None:
+            self._tasks.append(create_component_task(self._drain(process.stderr, stderr_sink), component=self._name))
+
+    @property
+    def tail(self) -> str:
+        return b"".join(self._tail).decode("utf-8", errors="replace")
+
+    async def close(self) -> None:
+        # The pipes reach EOF once the process exited, cancel for processes which are still running
+        for task in self._tasks:
+            task.cancel()
+        await gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _drain(self, stream: StreamReader, sink: Optional[LogSink]) -> None:
+        while True:
+            chunk = await stream.read(self._read_size)
+            if not chunk:
+                break
+            self.bytes_read += len(chunk)
+            self._append_to_tail(chunk)
+            # Forwarding drops chunks when the pipeline is full instead of blocking the drain
+            if sink is not None and self._log_pipeline is not None and not self._log_pipeline.submit(sink, chunk):
+                self.dropped_chunks += 1
+
+    def _append_to_tail(self, chunk: bytes) -> None:
+        self._tail.append(chunk[-self._max_tail_bytes:])
+        self._tail_bytes += len(self._tail[-1])
+        while self._tail_bytes > self._max_tail_bytes:
+            overflow = self._tail_bytes - self._max_tail_bytes
+            oldest = self._tail[0]
+            if len(oldest) <= overflow:
+                self._tail.popleft()
+                self._tail_bytes -= len(oldest)
+            else:
+                self._tail[0] = oldest[overflow:]
+                self._tail_bytes -= overflow
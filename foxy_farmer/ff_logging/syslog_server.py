@@ -1,11 +1,27 @@
-import aioudp
-
-from asyncio import Event
-from logging import getLogger
-from typing import Dict, Any
-from pyparsing import Word, alphas, Suppress, nums, Regex
+from asyncio import Event, wait_for, to_thread, TimeoutError, gather
+from dataclasses import dataclass
+from logging import Logger, getLogger
+from multiprocessing import get_context, parent_process
+from queue import Empty, Full
+from re import compile, DOTALL
+from signal import signal, SIGINT, SIG_IGN
+from socket import socket, AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_RCVBUF, timeout as SocketTimeout
+from time import monotonic
+from typing import Dict, Any, Optional, Tuple, Sequence
 
 from foxy_farmer.ff_logging.configure_logging import add_stdout_handler
+from foxy_farmer.ff_logging.log_pipeline import LogPipeline
+from foxy_farmer.monitoring.harvester_lookup_stats import HarvesterLookupStats, parse_lookup_message, local_harvester
+
+# <priority>service message\x00
+syslog_message_pattern = compile(rb"<(\d{1,3})>([\w.\-]+)\s*(.*)", DOTALL)
+
+received_messages_index = 0
+processed_messages_index = 1
+dropped_messages_index = 2
+invalid_messages_index = 3
+queued_messages_index = 4
+counter_count = 5
 
 
 def map_priority_to_log_level(priority: int) -> int:
@@ -24,53 +40,203 @@ def map_priority_to_log_level(priority: int) -> int:
     return 0
 
 
-class Parser(object):
-    def __init__(self):
-        ints = Word(nums)
+def parse_syslog_message(message: bytes) -> Optional[Tuple[int, bytes, str]]:
+    match = syslog_message_pattern.match(message)
+    if match is None:
+        return None
+    priority, service, text = match.groups()
+
+    return map_priority_to_log_level(int(priority)), service, text.rstrip(b"\x00\r\n ").decode("utf-8", errors="replace")
 
-        # priority
-        priority = Suppress("<") + ints + Suppress(">")
 
-        # service
-        hostname = Word(alphas + nums + "_" + "-" + ".")
+@dataclass
+class SyslogServerStats:
+    received_messages: int = 0
+    processed_messages: int = 0
+    dropped_messages: int = 0
+    invalid_messages: int = 0
+    queued_messages: int = 0
+    messages_per_second: float = 0
 
-        # message
-        message = Regex("(.|\n)*\x00")
 
-        # pattern build
-        self.__pattern = priority + hostname + message
+class SyslogRelay:
+    _receive_buffer_size: int = 4 * 2 ** 20
+    _counter_publish_interval_seconds: float = 1
+    _logging_config: Dict[str, Any]
+    _counters: Any
+    _lookup_events: Optional[Any]
+    _log_pipeline: LogPipeline
+    _loggers: Dict[bytes, Logger]
+    _received_messages: int = 0
+    _invalid_messages: int = 0
+
+    def __init__(self, logging_config: Dict[str, Any], counters: Any, lookup_events: Optional[Any] = None):
+        self._logging_config = logging_config
+        self._counters = counters
+        self._lookup_events = lookup_events
+        self._log_pipeline = LogPipeline(name="syslog_pipeline")
+        self._loggers = {}
+
+    def run(self, stop_event: Any) -> None:
+        sock = socket(AF_INET, SOCK_DGRAM)
+        try:
+            sock.setsockopt(SOL_SOCKET, SO_RCVBUF, self._receive_buffer_size)
+        except OSError:
+            pass
+        sock.bind(("127.0.0.1", self._logging_config["log_syslog_port"]))
+        sock.settimeout(self._counter_publish_interval_seconds)
+        parent = parent_process()
+        self._log_pipeline.start()
+        last_publish = monotonic()
+        try:
+            while not stop_event.is_set() and (parent is None or parent.is_alive()):
+                try:
+                    message = sock.recv(65535)
+                    self._received_messages += 1
+                    # Only hand the raw bytes over, parsing and terminal I/O happen on the pipeline thread
+                    self._log_pipeline.submit(self._handle_message, message)
+                except SocketTimeout:
+                    pass
+                now = monotonic()
+                if now - last_publish >= self._counter_publish_interval_seconds:
+                    self._publish_counters()
+                    last_publish = now
+        finally:
+            sock.close()
+            self._log_pipeline.stop()
+            self._publish_counters()
+            if self._lookup_events is not None:
+                # Do not block the exit on lookup events the parent no longer reads
+                self._lookup_events.cancel_join_thread()
+
+    def _publish_counters(self) -> None:
+        self._counters[received_messages_index] = self._received_messages
+        self._counters[processed_messages_index] = self._log_pipeline.processed_entries
+        self._counters[dropped_messages_index] = self._log_pipeline.dropped_entries
+        self._counters[invalid_messages_index] = self._invalid_messages
+        self._counters[queued_messages_index] = self._log_pipeline.queued_entries
+
+    def _handle_message(self, message: bytes) -> None:
+        parsed = parse_syslog_message(message)
+        if parsed is None:
+            self._invalid_messages += 1
+
+            return
+        log_level, service, text = parsed
+        self._get_logger(service).log(log_level, text)
+        if self._lookup_events is not None:
+            lookup_event = parse_lookup_message(text)
+            if lookup_event is not None:
+                try:
+                    self._lookup_events.put_nowait(lookup_event)
+                except Full:
+                    pass
+
+    def _get_logger(self, service: bytes) -> Logger:
+        logger = self._loggers.get(service)
+        if logger is None:
+            logger = getLogger(service.decode("ascii"))
+            logger.propagate = False
+            if not logger.hasHandlers():
+                add_stdout_handler(logger, logging_config=self._logging_config)
+            self._loggers[service] = logger
+
+        return logger
 
-    def parse(self, line):
-        parsed = self.__pattern.parseString(line)
-        priority = int(parsed[0])
 
-        return {
-            "log_level": map_priority_to_log_level(priority),
-            "service": parsed[1],
-            "message": parsed[2].rstrip("\x00"),
-        }
+def run_syslog_relay(logging_config: Dict[str, Any], counters: Any, stop_event: Any, lookup_events: Optional[Any] = None) -> None:
+    # The parent process decides when to stop, do not react to the Ctrl+C sent to the whole process group
+    signal(SIGINT, SIG_IGN)
+    getLogger().setLevel(logging_config.get("log_level", "INFO"))
+    SyslogRelay(logging_config=logging_config, counters=counters, lookup_events=lookup_events).run(stop_event)
 
 
 class SyslogServer:
-    _parser: Parser = Parser()
+    """ Relays the syslog output of binary backends from a dedicated process so it never competes with the farmer. """
+    _stats_interval_seconds: float = 10
+    _lookup_events_interval_seconds: float = 1
+    _max_queued_lookup_events: int = 10_000
+    _relay_stop_timeout_seconds: float = 5
     _logging_config: Dict[str, Any]
+    _harvester_lookup_stats: Optional[HarvesterLookupStats]
     _stop_event: Event = Event()
-
-    def __init__(self, logging_config: Dict[str, Any]):
+    _counters: Optional[Sequence[int]] = None
+    _messages_per_second: float = 0
+    _logger: Logger = getLogger("syslog_server")
+
+    @property
+    def stats(self) -> SyslogServerStats:
+        if self._counters is None:
+            return SyslogServerStats()
+
+        return SyslogServerStats(
+            received_messages=self._counters[received_messages_index],
+            processed_messages=self._counters[processed_messages_index],
+            dropped_messages=self._counters[dropped_messages_index],
+            invalid_messages=self._counters[invalid_messages_index],
+            queued_messages=self._counters[queued_messages_index],
+            messages_per_second=self._messages_per_second,
+        )
+
+    def __init__(self, logging_config: Dict[str, Any], harvester_lookup_stats: Optional[HarvesterLookupStats] = None):
         self._logging_config = logging_config
-
-    async def _handle_connection(self, connection):
-        async for message in connection:
-            parsed = self._parser.parse(bytes.decode(message.strip()))
-            logger = getLogger(parsed["service"])
-            logger.propagate = False
-            if not logger.hasHandlers():
-                add_stdout_handler(logger, logging_config=self._logging_config)
-            logger.log(parsed["log_level"], parsed["message"])
+        self._harvester_lookup_stats = harvester_lookup_stats
 
     async def run(self):
-        async with aioudp.serve(host="127.0.0.1", port=self._logging_config["log_syslog_port"], handler=self._handle_connection):
-            await self._stop_event.wait()
+        context = get_context("spawn")
+        self._counters = context.RawArray("Q", counter_count)
+        relay_stop_event = context.Event()
+        # Only the parsed harvester lookup summaries are sent back, not the log lines
+        lookup_events = context.Queue(self._max_queued_lookup_events) if self._harvester_lookup_stats is not None else None
+        relay_process = context.Process(
+            target=run_syslog_relay,
+            args=(self._logging_config, self._counters, relay_stop_event, lookup_events),
+            name="syslog_relay",
+            daemon=True,
+        )
+        relay_process.start()
+        try:
+            if lookup_events is not None:
+                await gather(self._update_stats_until_stopped(), self._drain_lookup_events_until_stopped(lookup_events))
+            else:
+                await self._update_stats_until_stopped()
+        finally:
+            relay_stop_event.set()
+            await to_thread(relay_process.join, self._relay_stop_timeout_seconds)
+            if relay_process.is_alive():
+                relay_process.terminate()
 
     def stop(self):
         self._stop_event.set()
+
+    async def _update_stats_until_stopped(self) -> None:
+        window_start = monotonic()
+        window_stats = self.stats
+        while not self._stop_event.is_set():
+            try:
+                await wait_for(self._stop_event.wait(), timeout=self._stats_interval_seconds)
+            except TimeoutError:
+                pass
+            now = monotonic()
+            stats = self.stats
+            self._messages_per_second = (stats.processed_messages - window_stats.processed_messages) / (now - window_start)
+            if stats.dropped_messages > window_stats.dropped_messages:
+                self._logger.warning(
+                    f"Dropped {stats.dropped_messages - window_stats.dropped_messages} syslog messages "
+                    f"({self._messages_per_second:.0f} msg/s)"
+                )
+            window_start = now
+            window_stats = stats
+
+    async def _drain_lookup_events_until_stopped(self, lookup_events: Any) -> None:
+        while not self._stop_event.is_set():
+            try:
+                await wait_for(self._stop_event.wait(), timeout=self._lookup_events_interval_seconds)
+            except TimeoutError:
+                pass
+            while True:
+                try:
+                    lookup_event = lookup_events.get_nowait()
+                except Empty:
+                    break
+                self._harvester_lookup_stats.observe(local_harvester, lookup_event)
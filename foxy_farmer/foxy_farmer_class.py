@@ -1,10 +1,12 @@
-from asyncio import new_event_loop, AbstractEventLoop
+from asyncio import new_event_loop, AbstractEventLoop, to_thread, Task, create_task, sleep
 from logging import Logger, getLogger
 from pathlib import Path
 from signal import SIGINT, Signals
+from subprocess import Popen
 from sys import platform
+from time import monotonic
 from types import FrameType
-from typing import Optional, Union
+from typing import Optional, Union, Dict, Any
 
 import sentry_sdk
 from chia.server.signal_handlers import SignalHandlers
@@ -17,8 +19,15 @@ from foxy_farmer.farmer.gigahorse_farmer import GigahorseFarmer
 from foxy_farmer.config.backend import Backend
 from foxy_farmer.config.foxy_chia_config_manager import FoxyChiaConfigManager
 from foxy_farmer.config.foxy_config_manager import FoxyConfigManager
-from foxy_farmer.ff_logging.configure_logging import initialize_logging_with_stdout
+from foxy_farmer.config.foxy_farming_gateway import get_farming_gateway_peers
+from foxy_farmer.ff_logging.configure_logging import initialize_logging_with_stdout, finish_taking_over_logging
+from foxy_farmer.gateway.gateway_selector import make_probe_ssl_context
+from foxy_farmer.config.foxy_config import FoxyConfig
+from foxy_farmer.monitoring.loop_monitor import LoopMonitor
+from foxy_farmer.monitoring.metrics_exporter import MetricsExporter
+from foxy_farmer.monitoring.monitoring_server import MonitoringServer
 from foxy_farmer.self_update.self_update_manager import SelfUpdateManager
+from foxy_farmer.self_update.update_handover import UpdateHandover, get_missed_signage_points
 from foxy_farmer.util.node_id import calculate_harvester_node_id_slug
 
 
@@ -26,6 +35,12 @@ class FoxyFarmer:
     _foxy_root: Path
     _config_path: Path
     _farmer: Optional[Farmer] = None
+    _loop_monitor: Optional[LoopMonitor] = None
+    _monitoring_server: Optional[MonitoringServer] = None
+    _metrics_exporter: Optional[MetricsExporter] = None
+    _update_handover: Optional[UpdateHandover] = None
+    _update_downtime_task: Optional[Task[None]] = None
+    successor: Optional[Popen] = None
     _logger: Logger = getLogger("foxy_farmer")
 
     def __init__(self, foxy_root: Path, config_path: Path):
@@ -34,21 +49,27 @@ class FoxyFarmer:
 
     async def run(self) -> bool:
         foxy_chia_config_manager = FoxyChiaConfigManager(self._foxy_root)
+        # Gateways are ordered by the persisted timings, probing them again happens in the background once farming
         await foxy_chia_config_manager.ensure_foxy_config(self._config_path)
 
         from chia.util.config import load_config
         config = load_config(self._foxy_root, "config.yaml")
 
+        foxy_config_manager = FoxyConfigManager(self._config_path)
+        foxy_config = foxy_config_manager.load_config()
+
+        update_handover = UpdateHandover.from_environment()
         initialize_logging_with_stdout(
             logging_config=config["logging"],
             root_path=self._foxy_root,
+            use_queued_logging=foxy_config.get("queued_logging", True),
+            is_taking_over=update_handover is not None,
         )
 
-        foxy_config_manager = FoxyConfigManager(self._config_path)
-        foxy_config = foxy_config_manager.load_config()
-
-        self_update_manager = SelfUpdateManager()
-        if foxy_config.get("auto_update", False) and self_update_manager.is_supported:
+        backend: Union[str, Backend] = foxy_config.get("backend", Backend.BladeBit)
+        self_update_manager = SelfUpdateManager(backend=str(backend))
+        # The previous version just updated, checking again would only delay taking over
+        if update_handover is None and foxy_config.get("auto_update", False) and self_update_manager.is_supported:
             try:
                 await self_update_manager.update()
             except Exception as e:
@@ -56,7 +77,17 @@ class FoxyFarmer:
             if self_update_manager.did_update:
                 return True
 
-        backend: Union[str, Backend] = foxy_config.get("backend", Backend.BladeBit)
+        if self._should_auto_tune_decompressor(backend, foxy_config):
+            did_update_settings = False
+            try:
+                did_update_settings = await to_thread(self._auto_tune_decompressor, foxy_config_manager, foxy_config)
+            except Exception as e:
+                self._logger.error(f"Encountered an error while tuning the decompressor: {e}")
+            if did_update_settings:
+                await foxy_chia_config_manager.ensure_foxy_config(self._config_path)
+                config = load_config(self._foxy_root, "config.yaml")
+                foxy_config = foxy_config_manager.load_config()
+
         if backend == Backend.BladeBit:
             self._farmer = BladebitFarmer(root_path=self._foxy_root, farmer_config=foxy_config)
         elif backend == Backend.Gigahorse:
@@ -73,9 +104,12 @@ class FoxyFarmer:
 
             return False
 
+        if update_handover is not None:
+            await self._take_over(update_handover)
+
         if foxy_config.get("auto_update", False) and self_update_manager.is_supported:
             async def on_update_completed():
-                await self._farmer.stop()
+                await self._hand_over(foxy_config)
 
             self_update_manager.start_periodic_update_check(on_update_completed)
 
@@ -86,13 +120,181 @@ class FoxyFarmer:
         status_infos += f" config_path={self._config_path}"
         self._logger.info(status_infos)
 
-        with track_session(scope=sentry_sdk.get_current_scope(), session_mode="application"):
-            await self._farmer.run()
+        gateway_selector = foxy_chia_config_manager.gateway_selector
+        if foxy_config.get("enable_gateway_selection", True):
+            gateway_selector.start_periodic_probing(
+                get_farming_gateway_peers(backend),
+                lambda: make_probe_ssl_context(self._foxy_root, config),
+                active_peers=config["farmer"]["full_node_peers"],
+                max_peers=foxy_config.get("max_farming_gateways"),
+                get_signage_point_lags=self._get_signage_point_lags,
+            )
+
+        await self._start_monitoring(foxy_config, config)
+        try:
+            with track_session(scope=sentry_sdk.get_current_scope(), session_mode="application"):
+                await self._farmer.run()
+        finally:
+            if self._update_downtime_task is not None:
+                self._update_downtime_task.cancel()
+            await self._stop_monitoring()
+            await gateway_selector.shutdown()
+            gateway_selector.record_signage_point_lags(self._get_signage_point_lags())
 
         await self_update_manager.shutdown()
+        if self._update_handover is not None:
+            self._update_handover.mark_drained(self._get_last_signage_point_at())
+            if self.successor is None:
+                self._update_handover.set_up_restart()
 
         return self_update_manager.did_update
 
+    async def _hand_over(self, foxy_config: FoxyConfig) -> None:
+        """ Starts the updated version next to this one and stops farming once it is ready to take over. """
+        self._update_handover = UpdateHandover(self._foxy_root / "handover" / "update")
+        if not foxy_config.get("self_update_handover", False):
+            self._update_handover.prepare(harvester_handshake=None)
+            await self._farmer.stop()
+
+            return
+        farmer_api_hooks = self._farmer.farmer_api_hooks
+        self._update_handover.prepare(farmer_api_hooks.get_harvester_handshake() if farmer_api_hooks is not None else None)
+        self._logger.info("Starting the updated version, farming continues until it is ready ..")
+        successor = self._update_handover.start_successor()
+        is_ready = await self._update_handover.wait_until_successor_is_ready(
+            successor,
+            timeout_seconds=foxy_config.get("self_update_handover_timeout_seconds", 1800),
+        )
+        if is_ready:
+            self._update_handover.record_successor(successor)
+            self.successor = successor
+        else:
+            self._logger.warning(f"The updated version exited with code {successor.returncode} before it was ready, restarting instead ..")
+        await self._farmer.stop()
+
+    async def _take_over(self, update_handover: UpdateHandover) -> None:
+        """ Loads the plots while the previous version is still farming and waits for it to stop. """
+        harvester_handshake = update_handover.read_harvester_handshake()
+        plot_count: Optional[int] = None
+        if harvester_handshake is not None:
+            started_at = monotonic()
+            plot_count = await self._farmer.warm_up(harvester_handshake)
+            if plot_count is not None:
+                self._logger.info(f"Loaded {plot_count} plots in {monotonic() - started_at:.1f}s while the previous version is farming")
+        update_handover.mark_ready(plot_count or 0)
+        drained = await update_handover.wait_until_drained()
+        finish_taking_over_logging()
+        self._update_downtime_task = create_task(self._measure_update_downtime(drained.get("last_signage_point_at")))
+
+    async def _measure_update_downtime(self, last_signage_point_at: Optional[float]) -> None:
+        if last_signage_point_at is None:
+            return
+        while self._get_last_signage_point_at() is None:
+            await sleep(1)
+        downtime_seconds = self._get_last_signage_point_at() - last_signage_point_at
+        self._farmer.startup_timings.record_update_downtime(downtime_seconds, get_missed_signage_points(downtime_seconds))
+
+    @property
+    def update_handover(self) -> Optional[UpdateHandover]:
+        return self._update_handover
+
+    def _get_last_signage_point_at(self) -> Optional[float]:
+        farmer_api_hooks = self._farmer.farmer_api_hooks if self._farmer is not None else None
+        if farmer_api_hooks is None:
+            return None
+
+        return farmer_api_hooks.last_signage_point_at
+
+    def _should_auto_tune_decompressor(self, backend: Union[str, Backend], foxy_config: FoxyConfig) -> bool:
+        return (
+            backend == Backend.BladeBit
+            and foxy_config.get("enable_harvester") is True
+            and foxy_config.get("auto_tune_decompressor", False)
+            and not foxy_config.get("use_gpu_harvesting", False)
+        )
+
+    def _auto_tune_decompressor(self, foxy_config_manager: FoxyConfigManager, foxy_config: FoxyConfig) -> bool:
+        from foxy_farmer.plots.decompressor_tuner import DecompressorTuner
+        from foxy_farmer.plots.plot_files import get_configured_plot_paths
+
+        tuner = DecompressorTuner(self._foxy_root, foxy_config)
+        plot_paths = get_configured_plot_paths(foxy_config)
+        if not tuner.needs_tuning(tuner.get_fingerprint(plot_paths)):
+            return False
+        tuning_result = tuner.tune(plot_paths)
+        if tuning_result is None:
+            return False
+        tuner.apply(foxy_config_manager, tuning_result)
+
+        return True
+
+    async def _start_monitoring(self, foxy_config: FoxyConfig, config: Dict[str, Any]) -> None:
+        if foxy_config.get("enable_loop_monitor", True):
+            self._loop_monitor = LoopMonitor(
+                slow_callback_threshold_seconds=foxy_config.get("slow_callback_threshold_ms", 100) / 1000,
+            )
+            self._loop_monitor.start()
+        if foxy_config.get("enable_monitoring_server", True):
+            self._monitoring_server = MonitoringServer(
+                host="127.0.0.1",
+                port=foxy_config.get("monitoring_server_port", 18570),
+            )
+            if self._loop_monitor is not None:
+                self._monitoring_server.add_json_route("/loop", self._loop_monitor.snapshot)
+            self._monitoring_server.add_json_route("/signage_points", self._get_signage_point_arrivals)
+            self._monitoring_server.add_json_route("/supervisor", self._get_process_supervisor_snapshot)
+            self._monitoring_server.add_json_route("/startup", self._farmer.startup_timings.to_dict)
+            if self._farmer.harvester_lookup_stats is not None:
+                self._monitoring_server.add_json_route("/harvester_lookups", self._farmer.harvester_lookup_stats.snapshot)
+            if foxy_config.get("enable_metrics_exporter", False):
+                self._metrics_exporter = MetricsExporter(
+                    root_path=self._foxy_root,
+                    config=config,
+                    farmer=self._farmer,
+                    loop_monitor=self._loop_monitor,
+                )
+                self._metrics_exporter.start()
+                self._monitoring_server.add_text_route(
+                    "/metrics",
+                    lambda: self._metrics_exporter.metrics,
+                    content_type="text/plain; version=0.0.4; charset=utf-8",
+                )
+            await self._monitoring_server.start()
+
+    def _get_signage_point_arrivals(self) -> Dict[str, Any]:
+        # The hooks only exist once the embedded farmer started and not at all for external farmers
+        farmer_api_hooks = self._farmer.farmer_api_hooks if self._farmer is not None else None
+        if farmer_api_hooks is None:
+            return {}
+
+        return farmer_api_hooks.signage_point_arrivals.snapshot()
+
+    def _get_process_supervisor_snapshot(self) -> Dict[str, Any]:
+        # The supervisor is created once the farmer started its processes
+        process_supervisor = self._farmer.process_supervisor if self._farmer is not None else None
+        if process_supervisor is None:
+            return {}
+
+        return process_supervisor.snapshot()
+
+    def _get_signage_point_lags(self) -> Dict[str, float]:
+        farmer_api_hooks = self._farmer.farmer_api_hooks if self._farmer is not None else None
+        if farmer_api_hooks is None:
+            return {}
+
+        return farmer_api_hooks.signage_point_arrivals.get_median_lags()
+
+    async def _stop_monitoring(self) -> None:
+        if self._monitoring_server is not None:
+            await self._monitoring_server.stop()
+            self._monitoring_server = None
+        if self._metrics_exporter is not None:
+            await self._metrics_exporter.shutdown()
+            self._metrics_exporter = None
+        if self._loop_monitor is not None:
+            await self._loop_monitor.shutdown()
+            self._loop_monitor = None
+
     async def stop(self) -> None:
         if self._farmer is not None:
             await self._farmer.stop()
@@ -4,6 +4,8 @@ from os import execv, spawnv, P_WAIT, _exit
 import click
 from multiprocessing import freeze_support
 from pathlib import Path
+from subprocess import Popen
+from typing import Optional, Tuple
 
 from chia.cmds.keys import keys_cmd
 from chia.cmds.passphrase import passphrase_cmd
@@ -14,23 +16,29 @@ from foxy_farmer.cmds.init import init_cmd
 from foxy_farmer.cmds.join_pool import join_pool_cmd
 from foxy_farmer.cmds.farm_summary import summary_cmd
 from foxy_farmer.cmds.authenticate import authenticate_cmd
+from foxy_farmer.cmds.bench_disks import bench_disks_cmd
+from foxy_farmer.cmds.tune_decompressor import tune_decompressor_cmd
+from foxy_farmer.cmds.prefetch import prefetch_cmd
 from foxy_farmer.exceptions.already_running_exception import AlreadyRunningException
+from foxy_farmer.ff_logging.configure_logging import shutdown_logging
+from foxy_farmer.self_update.update_handover import UpdateHandover, wait_for_successor
 from foxy_farmer.util.root_path import get_root_path
 from foxy_farmer.version import version
 
 
-async def run_foxy_farmer(foxy_root: Path, config_path: Path) -> bool:
+async def run_foxy_farmer(foxy_root: Path, config_path: Path) -> Tuple[bool, Optional[Popen], Optional[UpdateHandover]]:
     from foxy_farmer.foxy_farmer_class import FoxyFarmer
     foxy_farmer = FoxyFarmer(foxy_root, config_path)
     await foxy_farmer.setup_process_global_state()
     try:
-        return await foxy_farmer.run()
+        return await foxy_farmer.run(), foxy_farmer.successor, foxy_farmer.update_handover
     except AlreadyRunningException:
         pass
     finally:
+        shutdown_logging()
         close_sentry()
 
-    return False
+    return False, None, None
 
 
 @click.group(
@@ -68,8 +76,14 @@ def cli(ctx, config, root_path):
 @click.pass_context
 def run_cmd(ctx, config=None, root_path=None):
     from chia.server.start_service import async_run
-    should_restart_app = async_run(run_foxy_farmer(ctx.obj["root_path"], ctx.obj["config_path"]))
-
+    should_restart_app, successor, update_handover = async_run(run_foxy_farmer(ctx.obj["root_path"], ctx.obj["config_path"]))
+
+    if successor is not None:
+        if update_handover.is_followed:
+            # The process this one was started from waits for the successor from now on
+            _exit(0)
+        # The updated version took over already, it only has to outlive the process it was started from
+        _exit(wait_for_successor(successor, update_handover))
     if should_restart_app:
         if sys.platform == "win32":
             # On Windows we can not replace the process, spawn subprocess and wait for its termination instead
@@ -79,6 +93,9 @@ def run_cmd(ctx, config=None, root_path=None):
 
 
 cli.add_command(summary_cmd)
+cli.add_command(bench_disks_cmd)
+cli.add_command(tune_decompressor_cmd)
+cli.add_command(prefetch_cmd)
 cli.add_command(join_pool_cmd)
 cli.add_command(authenticate_cmd)
 cli.add_command(keys_cmd)
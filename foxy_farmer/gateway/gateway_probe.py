@@ -0,0 +1,83 @@
+from asyncio import open_connection, wait_for, get_running_loop
+from dataclasses import dataclass, field
+from socket import SOCK_STREAM
+from ssl import SSLContext
+from statistics import median, pstdev
+from time import perf_counter
+from typing import List, Optional
+
+
+@dataclass
+class GatewayProbeResult:
+    host: str
+    port: int
+    address: Optional[str] = None
+    connect_times: List[float] = field(default_factory=list)
+    handshake_times: List[float] = field(default_factory=list)
+    failures: int = 0
+    error: Optional[str] = None
+
+    @property
+    def is_reachable(self) -> bool:
+        return len(self.handshake_times) > 0
+
+    @property
+    def success_rate(self) -> float:
+        attempts = len(self.handshake_times) + self.failures
+
+        return len(self.handshake_times) / attempts if attempts > 0 else 0
+
+    @property
+    def rtt_seconds(self) -> float:
+        return median(self.connect_times)
+
+    @property
+    def jitter_seconds(self) -> float:
+        return pstdev(self.connect_times) if len(self.connect_times) > 1 else 0
+
+    @property
+    def handshake_seconds(self) -> float:
+        return median(self.handshake_times)
+
+
+async def probe_gateway(
+    host: str,
+    port: int,
+    ssl_context: SSLContext,
+    samples: int = 3,
+    timeout_seconds: float = 5,
+) -> GatewayProbeResult:
+    """ Measures the TCP connect time (one round trip) and the TLS handshake time to a gateway. """
+    result = GatewayProbeResult(host=host, port=port)
+    try:
+        address_infos = await wait_for(get_running_loop().getaddrinfo(host, port, type=SOCK_STREAM), timeout_seconds)
+    except Exception as e:
+        result.failures = samples
+        result.error = f"Could not resolve {host}: {e}"
+
+        return result
+    address = address_infos[0][4][0]
+    result.address = address
+
+    for _ in range(samples):
+        writer = None
+        try:
+            started_at = perf_counter()
+            _, writer = await wait_for(open_connection(address, port), timeout_seconds)
+            connected_at = perf_counter()
+            await wait_for(writer.start_tls(ssl_context, server_hostname=host), timeout_seconds)
+            handshake_done_at = perf_counter()
+            result.connect_times.append(connected_at - started_at)
+            result.handshake_times.append(handshake_done_at - connected_at)
+        except Exception as e:
+            result.failures += 1
+            result.error = str(e) or type(e).__name__
+        finally:
+            if writer is not None:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except Exception:
+                    pass
+
+    return result
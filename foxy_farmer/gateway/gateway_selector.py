@@ -0,0 +1,210 @@
+import json
+from asyncio import Task, create_task, sleep, wait, gather, CancelledError
+from dataclasses import dataclass, asdict
+from logging import Logger, getLogger
+from pathlib import Path
+from ssl import SSLContext
+from time import time
+from typing import Dict, Any, List, Optional, Callable
+
+from chia.server.server import ssl_context_for_client
+from chia.util.path import path_from_root
+
+from foxy_farmer.gateway.gateway_probe import probe_gateway, GatewayProbeResult
+
+FullNodePeer = Dict[str, Any]
+
+
+@dataclass
+class GatewayTiming:
+    rtt_seconds: float
+    jitter_seconds: float
+    handshake_seconds: float
+    success_rate: float
+    probed_at: float
+    address: Optional[str] = None
+    signage_point_lag_seconds: float = 0
+
+
+def get_gateway_key(host: str, port: int) -> str:
+    return f"{host}:{port}"
+
+
+def make_probe_ssl_context(root_path: Path, config: Dict[str, Any]) -> SSLContext:
+    # Use the same certificates the farmer uses for its full node connections
+    return ssl_context_for_client(
+        path_from_root(root_path, config["chia_ssl_ca"]["crt"]),
+        path_from_root(root_path, config["chia_ssl_ca"]["key"]),
+        path_from_root(root_path, config["farmer"]["ssl"]["public_crt"]),
+        path_from_root(root_path, config["farmer"]["ssl"]["public_key"]),
+    )
+
+
+class GatewaySelector:
+    """ Orders the farming gateways by their measured round trip time, jitter and health. """
+    _probe_interval_seconds: float = 30 * 60
+    _max_timing_age_seconds: float = 7 * 24 * 60 * 60
+    _min_success_rate: float = 0.5
+    _min_selected_peers: int = 2
+    _success_rate_weight: float = 0.3
+    _timings_path: Path
+    _timings: Dict[str, GatewayTiming]
+    _periodic_probe_task: Optional[Task[None]] = None
+    _logger: Logger = getLogger("gateway_selector")
+
+    def __init__(self, timings_path: Path):
+        self._timings_path = timings_path
+        self._timings = self._load_timings()
+
+    @property
+    def timings(self) -> Dict[str, GatewayTiming]:
+        return self._timings
+
+    def get_score(self, timing: GatewayTiming) -> float:
+        return timing.rtt_seconds + timing.handshake_seconds + 2 * timing.jitter_seconds + timing.signage_point_lag_seconds
+
+    def record_signage_point_lags(self, lags: Dict[str, float]) -> None:
+        """ Stores the median signage point lag observed per connected gateway address (`ip:port`). """
+        did_update = False
+        for key, timing in self._timings.items():
+            if timing.address is None:
+                continue
+            lag = lags.get(get_gateway_key(timing.address, int(key.rsplit(":", 1)[1])))
+            if lag is not None:
+                timing.signage_point_lag_seconds = lag
+                did_update = True
+        if did_update:
+            self._save_timings()
+
+    def select(self, static_peers: List[FullNodePeer], max_peers: Optional[int] = None) -> List[FullNodePeer]:
+        """ Orders the peers by score and unhealthy ones last, falls back to the static list without usable timings. """
+        now = time()
+        scored_peers = []
+        unmeasured_peers = []
+        unhealthy_peers = []
+        for peer in static_peers:
+            timing = self._timings.get(get_gateway_key(peer["host"], peer["port"]))
+            if timing is None or now - timing.probed_at > self._max_timing_age_seconds:
+                unmeasured_peers.append(peer)
+            elif timing.success_rate >= self._min_success_rate:
+                scored_peers.append((self.get_score(timing), peer))
+            else:
+                unhealthy_peers.append(peer)
+        if len(scored_peers) == 0:
+            return list(static_peers)
+
+        scored_peers.sort(key=lambda scored_peer: scored_peer[0])
+        # Unhealthy gateways stay connected as a fallback, a transient probe failure must not cost redundancy
+        selected_peers = [peer for _, peer in scored_peers] + unmeasured_peers + unhealthy_peers
+        if max_peers is not None and max_peers > 0:
+            selected_peers = selected_peers[:max(max_peers, self._min_selected_peers)]
+
+        return selected_peers
+
+    async def probe(
+        self,
+        peers: List[FullNodePeer],
+        ssl_context: SSLContext,
+        timeout_seconds: float = 5,
+        samples: int = 3,
+    ) -> List[GatewayProbeResult]:
+        probe_tasks = [
+            create_task(probe_gateway(peer["host"], peer["port"], ssl_context, samples=samples, timeout_seconds=timeout_seconds / samples))
+            for peer in peers
+        ]
+        # Bound the total time, gateways which did not finish in time count as failed
+        await wait(probe_tasks, timeout=timeout_seconds + 1)
+        results: List[GatewayProbeResult] = []
+        for peer, probe_task in zip(peers, probe_tasks):
+            if probe_task.done() and probe_task.exception() is None:
+                results.append(probe_task.result())
+            else:
+                probe_task.cancel()
+                results.append(GatewayProbeResult(host=peer["host"], port=peer["port"], failures=samples, error="Timed out"))
+        await gather(*probe_tasks, return_exceptions=True)
+        for result in results:
+            self._update_timing(result)
+            if not result.is_reachable:
+                self._logger.debug(f"Could not probe gateway {result.host}:{result.port}: {result.error}")
+        self._save_timings()
+
+        return results
+
+    def start_periodic_probing(
+        self,
+        peers: List[FullNodePeer],
+        get_ssl_context: Callable[[], SSLContext],
+        active_peers: List[FullNodePeer],
+        max_peers: Optional[int] = None,
+        get_signage_point_lags: Optional[Callable[[], Dict[str, float]]] = None,
+    ) -> None:
+        async def probe_periodically():
+            # The first probe runs right away, so the next start uses fresh timings without waiting for them
+            while True:
+                if get_signage_point_lags is not None:
+                    self.record_signage_point_lags(get_signage_point_lags())
+                try:
+                    await self.probe(peers, get_ssl_context())
+                except Exception as e:
+                    self._logger.error(f"Encountered an error while probing the farming gateways: {e}")
+                else:
+                    selected_peers = self.select(peers, max_peers=max_peers)
+                    if selected_peers != active_peers:
+                        gateways = ", ".join(get_gateway_key(peer["host"], peer["port"]) for peer in selected_peers)
+                        self._logger.info(f"Farming gateway ranking changed to {gateways}, it will be used on the next start")
+                await sleep(self._probe_interval_seconds)
+
+        if self._periodic_probe_task is None:
+            self._periodic_probe_task = create_task(probe_periodically())
+
+    async def shutdown(self) -> None:
+        if self._periodic_probe_task is None:
+            return
+        self._periodic_probe_task.cancel()
+        try:
+            await self._periodic_probe_task
+        except CancelledError:
+            pass
+        self._periodic_probe_task = None
+
+    def _update_timing(self, result: GatewayProbeResult) -> None:
+        key = get_gateway_key(result.host, result.port)
+        previous_timing = self._timings.get(key)
+        success_rate = result.success_rate
+        if previous_timing is not None:
+            success_rate = (1 - self._success_rate_weight) * previous_timing.success_rate + self._success_rate_weight * success_rate
+        if result.is_reachable:
+            self._timings[key] = GatewayTiming(
+                rtt_seconds=result.rtt_seconds,
+                jitter_seconds=result.jitter_seconds,
+                handshake_seconds=result.handshake_seconds,
+                success_rate=success_rate,
+                probed_at=time(),
+                address=result.address,
+                signage_point_lag_seconds=previous_timing.signage_point_lag_seconds if previous_timing is not None else 0,
+            )
+        elif previous_timing is not None:
+            previous_timing.success_rate = success_rate
+            previous_timing.probed_at = time()
+        # A gateway which never answered stays unmeasured, a single failure at startup says little about its health
+
+    def _load_timings(self) -> Dict[str, GatewayTiming]:
+        try:
+            with open(self._timings_path, "r") as timings_file:
+                timings = json.load(timings_file)
+
+            return {key: GatewayTiming(**timing) for key, timing in timings.items()}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            self._logger.warning(f"Could not load the gateway timings from {self._timings_path}: {e}")
+
+            return {}
+
+    def _save_timings(self) -> None:
+        try:
+            self._timings_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self._timings_path, "w") as timings_file:
+                json.dump({key: asdict(timing) for key, timing in self._timings.items()}, timings_file, indent=2)
+        except OSError as e:
+            self._logger.warning(f"Could not save the gateway timings to {self._timings_path}: {e}")
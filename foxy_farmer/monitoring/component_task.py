@@ -0,0 +1,18 @@
+from asyncio import Task, create_task
+from contextvars import ContextVar, copy_context
+from typing import Coroutine, Any, TypeVar
+
+T = TypeVar("T")
+
+default_component = "foxy_farmer"
+current_component: ContextVar[str] = ContextVar("current_component", default=default_component)
+
+
+def create_component_task(coroutine: Coroutine[Any, Any, T], component: str) -> Task[T]:
+    """ Creates a task whose callbacks, including the ones of tasks it spawns, are attributed to the given component. """
+    def create() -> Task[T]:
+        current_component.set(component)
+
+        return create_task(coroutine, name=component)
+
+    return copy_context().run(create)
@@ -0,0 +1,125 @@
+from dataclasses import replace
+from logging import Logger, getLogger
+from time import monotonic, time
+from typing import Dict, Callable, Any, List, Optional
+
+from chia.farmer.farmer_api import FarmerAPI
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+from chia.server.api_protocol import ApiMetadata, ApiRequest
+from chia.server.ws_connection import WSChiaConnection
+from chia_rs.sized_bytes import bytes32
+
+from foxy_farmer.monitoring.signage_point_arrival_tracker import SignagePointArrivalTracker
+from foxy_farmer.util.histogram import Histogram
+
+MessageListener = Callable[[Any, WSChiaConnection], None]
+
+
+def get_peer_name(peer: WSChiaConnection) -> str:
+    return f"{peer.peer_info.host}:{peer.peer_info.port}"
+
+
+class FarmerApiHooks:
+    """ Observes the messages handled by an embedded farmer without changing how they are handled. """
+    _max_tracked_signage_points: int = 256
+    _listeners: Dict[ProtocolMessageTypes, List[MessageListener]]
+    _signage_point_arrival_times: Dict[bytes32, float]
+    signage_points_per_gateway: Dict[str, int]
+    proofs_found_per_harvester: Dict[str, int]
+    harvester_lookup_times: Dict[str, Histogram]
+    harvester_response_times: Dict[str, Histogram]
+    signage_point_arrivals: SignagePointArrivalTracker
+    farmer_api: Optional[FarmerAPI] = None
+    last_signage_point_at: Optional[float] = None
+    _logger: Logger = getLogger("farmer_api_hooks")
+
+    def __init__(self):
+        self._listeners = {}
+        self._signage_point_arrival_times = {}
+        self.signage_points_per_gateway = {}
+        self.proofs_found_per_harvester = {}
+        self.harvester_lookup_times = {}
+        self.harvester_response_times = {}
+        self.signage_point_arrivals = SignagePointArrivalTracker()
+        self.add_listener(ProtocolMessageTypes.new_signage_point, self._on_new_signage_point)
+        self.add_listener(ProtocolMessageTypes.farming_info, self._on_farming_info)
+        self.add_listener(ProtocolMessageTypes.new_proof_of_space, self._on_new_proof_of_space)
+
+    def add_listener(self, message_type: ProtocolMessageTypes, listener: MessageListener) -> None:
+        self._listeners.setdefault(message_type, []).append(listener)
+
+    def remove_listener(self, message_type: ProtocolMessageTypes, listener: MessageListener) -> None:
+        listeners = self._listeners.get(message_type, [])
+        if listener in listeners:
+            listeners.remove(listener)
+
+    def install(self, farmer_api: FarmerAPI) -> None:
+        # Connections look up handlers via `api.metadata`, so an instance level copy only affects this farmer
+        metadata = ApiMetadata.copy(farmer_api.metadata)
+        for message_type in self._listeners.keys():
+            request = metadata.message_type_to_request.get(message_type)
+            if request is not None:
+                metadata.message_type_to_request[message_type] = self._make_hooked_request(request)
+        farmer_api.metadata = metadata
+        self.farmer_api = farmer_api
+
+    def get_harvester_handshake(self) -> Optional[bytes]:
+        """ Returns the handshake the farmer sends to its harvesters, which lets another harvester load the same plots. """
+        from chia.protocols.harvester_protocol import HarvesterHandshake
+
+        # The farmer only sends the handshake once its keys are loaded as well
+        if self.farmer_api is None or not self.farmer_api.farmer.started:
+            return None
+        farmer = self.farmer_api.farmer
+
+        return bytes(HarvesterHandshake(farmer.get_public_keys(), farmer.pool_public_keys))
+
+    def _make_hooked_request(self, request: ApiRequest) -> ApiRequest:
+        listeners = self._listeners[request.request_type]
+        original_method = request.method
+        original_peer_required = request.peer_required
+
+        async def hooked_method(api: FarmerAPI, data: Any, peer: WSChiaConnection, **kwargs):
+            message = request.message_class.from_bytes(data) if isinstance(data, bytes) else data
+            for listener in listeners:
+                try:
+                    listener(message, peer)
+                except Exception as e:
+                    self._logger.debug(f"Listener for {request.request_type.name} failed: {e}")
+            if original_peer_required:
+                return await original_method(api, message, peer, **kwargs)
+
+            return await original_method(api, message, **kwargs)
+
+        return replace(request, method=hooked_method, peer_required=True)
+
+    def _on_new_signage_point(self, new_signage_point: Any, peer: WSChiaConnection) -> None:
+        gateway = get_peer_name(peer)
+        self.signage_points_per_gateway[gateway] = self.signage_points_per_gateway.get(gateway, 0) + 1
+        self.signage_point_arrivals.on_new_signage_point(new_signage_point.challenge_chain_sp, gateway)
+        if new_signage_point.challenge_chain_sp in self._signage_point_arrival_times:
+            return
+        self._signage_point_arrival_times[new_signage_point.challenge_chain_sp] = monotonic()
+        self.last_signage_point_at = time()
+        if len(self._signage_point_arrival_times) > self._max_tracked_signage_points:
+            del self._signage_point_arrival_times[next(iter(self._signage_point_arrival_times))]
+
+    def _on_farming_info(self, farming_info: Any, peer: WSChiaConnection) -> None:
+        harvester = get_peer_name(peer)
+        lookup_times = self.harvester_lookup_times.get(harvester)
+        if lookup_times is None:
+            lookup_times = Histogram()
+            self.harvester_lookup_times[harvester] = lookup_times
+        lookup_times.observe(farming_info.lookup_time / 1_000_000)
+        signage_point_arrival_time = self._signage_point_arrival_times.get(farming_info.sp_hash)
+        if signage_point_arrival_time is None:
+            return
+        response_times = self.harvester_response_times.get(harvester)
+        if response_times is None:
+            response_times = Histogram()
+            self.harvester_response_times[harvester] = response_times
+        response_times.observe(monotonic() - signage_point_arrival_time)
+
+    def _on_new_proof_of_space(self, _: Any, peer: WSChiaConnection) -> None:
+        harvester = get_peer_name(peer)
+        self.proofs_found_per_harvester[harvester] = self.proofs_found_per_harvester.get(harvester, 0) + 1
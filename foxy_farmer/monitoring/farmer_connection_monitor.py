@@ -0,0 +1,248 @@
+from asyncio import Event, Task, wait_for, TimeoutError, get_running_loop, TimerHandle, create_task, gather
+from dataclasses import dataclass, field
+from logging import Logger, getLogger
+from pathlib import Path
+from time import time, monotonic
+from typing import Any, List, Dict, Optional, Set
+
+from chia.cmds.cmds_util import get_any_service_client
+from chia.rpc.farmer_rpc_client import FarmerRpcClient
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+from chia.server.outbound_message import NodeType
+from chia.server.ws_connection import WSChiaConnection
+from chia_rs.sized_bytes import bytes32
+
+from foxy_farmer.config.foxy_config import FoxyConfig
+from foxy_farmer.monitoring.farmer_api_hooks import FarmerApiHooks, get_peer_name
+from foxy_farmer.util.histogram import Histogram
+
+# 64 signage points per 600 second sub slot
+nominal_signage_point_interval_seconds = 600 / 64
+
+
+@dataclass
+class GatewayStats:
+    reconnects: int = 0
+    missed_signage_points: int = 0
+    detection_latency: Histogram = field(default_factory=Histogram)
+
+
+@dataclass
+class PeerState:
+    connection: WSChiaConnection
+    last_signage_point_at: float
+    missed_signage_points: int = 0
+    first_missed_at: Optional[float] = None
+    stale_timer: Optional[TimerHandle] = None
+
+
+class FarmerConnectionMonitor:
+    """ Reconnects full node connections which stopped delivering signage points. """
+    _min_stale_threshold_seconds: float = 15
+    _max_stale_threshold_seconds: float = 90
+    _max_tracked_signage_points: int = 64
+    _min_grace_period_seconds: float = 2
+    _rpc_initial_sleep_seconds: float = 60
+    _rpc_check_interval_seconds: float = 2
+    _root_path: Path
+    _farmer_api_hooks: Optional[FarmerApiHooks]
+    _stale_threshold_multiplier: float
+    _missed_signage_points_threshold: int
+    _peers: Dict[bytes32, PeerState]
+    _signage_point_deliveries: Dict[bytes32, Set[bytes32]]
+    _last_signage_point_at: Optional[float] = None
+    signage_point_interval_seconds: float = nominal_signage_point_interval_seconds
+    gateway_stats: Dict[str, GatewayStats]
+    _close_tasks: Set[Task[None]]
+    _logger: Logger = getLogger("farmer_monitor")
+
+    def __init__(self, root_path: Path, farmer_config: FoxyConfig, farmer_api_hooks: Optional[FarmerApiHooks]):
+        self._root_path = root_path
+        self._farmer_api_hooks = farmer_api_hooks
+        self._stale_threshold_multiplier = farmer_config.get("stale_connection_threshold_multiplier", 3)
+        self._missed_signage_points_threshold = farmer_config.get("stale_connection_missed_signage_points", 2)
+        self._peers = {}
+        self._signage_point_deliveries = {}
+        self.gateway_stats = {}
+        self._close_tasks = set()
+
+    @property
+    def stale_threshold_seconds(self) -> float:
+        threshold = self._stale_threshold_multiplier * self.signage_point_interval_seconds
+
+        return min(max(threshold, self._min_stale_threshold_seconds), self._max_stale_threshold_seconds)
+
+    async def run(self, until: Event) -> None:
+        if self._farmer_api_hooks is not None and self._farmer_api_hooks.farmer_api is not None:
+            await self._run_in_process(until)
+        else:
+            await self._run_with_rpc(until)
+
+    async def _run_in_process(self, until: Event) -> None:
+        self._logger.info("Starting to monitor for stale connections")
+        self._farmer_api_hooks.add_listener(ProtocolMessageTypes.new_signage_point, self._on_new_signage_point)
+        try:
+            while not await self._wait(until, self.stale_threshold_seconds):
+                self._check_silent_connections()
+        finally:
+            self._farmer_api_hooks.remove_listener(ProtocolMessageTypes.new_signage_point, self._on_new_signage_point)
+            for peer_state in self._peers.values():
+                if peer_state.stale_timer is not None:
+                    peer_state.stale_timer.cancel()
+            self._peers.clear()
+            await gather(*self._close_tasks)
+
+    def _on_new_signage_point(self, new_signage_point: Any, peer: WSChiaConnection) -> None:
+        now = monotonic()
+        loop = get_running_loop()
+        peer_state = self._peers.get(peer.peer_node_id)
+        if peer_state is None or peer_state.connection is not peer:
+            if peer_state is not None and peer_state.stale_timer is not None:
+                peer_state.stale_timer.cancel()
+            peer_state = PeerState(connection=peer, last_signage_point_at=now)
+            self._peers[peer.peer_node_id] = peer_state
+        peer_state.last_signage_point_at = now
+        peer_state.missed_signage_points = 0
+        peer_state.first_missed_at = None
+        if peer_state.stale_timer is not None:
+            peer_state.stale_timer.cancel()
+        # Covers single gateway setups and all gateways going silent at once
+        peer_state.stale_timer = loop.call_later(self.stale_threshold_seconds, self._on_stale_timeout, peer)
+
+        signage_point_hash = new_signage_point.challenge_chain_sp
+        deliveries = self._signage_point_deliveries.get(signage_point_hash)
+        if deliveries is not None:
+            deliveries.add(peer.peer_node_id)
+
+            return
+        self._signage_point_deliveries[signage_point_hash] = {peer.peer_node_id}
+        if len(self._signage_point_deliveries) > self._max_tracked_signage_points:
+            del self._signage_point_deliveries[next(iter(self._signage_point_deliveries))]
+        self._update_signage_point_interval(now)
+        grace_period_seconds = max(self._min_grace_period_seconds, 0.3 * self.signage_point_interval_seconds)
+        loop.call_later(grace_period_seconds, self._check_signage_point_deliveries, signage_point_hash, now, time())
+
+    def _update_signage_point_interval(self, now: float) -> None:
+        if self._last_signage_point_at is not None:
+            interval = now - self._last_signage_point_at
+            # Ignore gaps from restarts or chain stalls, they do not represent the regular cadence
+            if 1 <= interval <= 4 * nominal_signage_point_interval_seconds:
+                self.signage_point_interval_seconds = 0.9 * self.signage_point_interval_seconds + 0.1 * interval
+        self._last_signage_point_at = now
+
+    def _check_signage_point_deliveries(self, signage_point_hash: bytes32, first_arrival_at: float, first_arrival_time: float) -> None:
+        deliveries = self._signage_point_deliveries.get(signage_point_hash)
+        if deliveries is None:
+            return
+        for connection in self._get_full_node_connections():
+            if connection.peer_node_id in deliveries or connection.creation_time > first_arrival_time:
+                continue
+            peer_state = self._peers.get(connection.peer_node_id)
+            if peer_state is None or peer_state.connection is not connection:
+                peer_state = PeerState(connection=connection, last_signage_point_at=first_arrival_at)
+                self._peers[connection.peer_node_id] = peer_state
+            peer_state.missed_signage_points += 1
+            self._get_gateway_stats(connection).missed_signage_points += 1
+            if peer_state.first_missed_at is None:
+                peer_state.first_missed_at = first_arrival_at
+            if peer_state.missed_signage_points >= self._missed_signage_points_threshold:
+                self._reconnect(
+                    connection,
+                    reason=f"missed {peer_state.missed_signage_points} signage points",
+                    stale_since=peer_state.first_missed_at,
+                )
+
+    def _check_silent_connections(self) -> None:
+        # Connections which never delivered a signage point have no stale timer yet
+        current_time = time()
+        for connection in self._get_full_node_connections():
+            if connection.peer_node_id in self._peers:
+                continue
+            silent_seconds = current_time - connection.creation_time
+            if silent_seconds >= self.stale_threshold_seconds:
+                self._reconnect(
+                    connection,
+                    reason=f"no signage point since connecting {silent_seconds:.0f}s ago",
+                    stale_since=monotonic() - silent_seconds + self.signage_point_interval_seconds,
+                )
+
+    def _on_stale_timeout(self, peer: WSChiaConnection) -> None:
+        peer_state = self._peers.get(peer.peer_node_id)
+        if peer_state is None or peer_state.connection is not peer:
+            return
+        self._reconnect(
+            peer,
+            reason=f"no signage point for {monotonic() - peer_state.last_signage_point_at:.0f}s",
+            stale_since=peer_state.last_signage_point_at + self.signage_point_interval_seconds,
+        )
+
+    def _reconnect(self, connection: WSChiaConnection, reason: str, stale_since: float) -> None:
+        peer_state = self._peers.pop(connection.peer_node_id, None)
+        if peer_state is not None and peer_state.stale_timer is not None:
+            peer_state.stale_timer.cancel()
+        gateway_stats = self._get_gateway_stats(connection)
+        gateway_stats.reconnects += 1
+        gateway_stats.detection_latency.observe(max(0.0, monotonic() - stale_since))
+        self._logger.warning(f"Detected stale connection to {get_peer_name(connection)} ({reason}), reconnecting ..")
+        # Will auto reconnect as the connections are in the default peers, we just need to close the connection
+        close_task = create_task(self._close(connection))
+        self._close_tasks.add(close_task)
+        close_task.add_done_callback(self._close_tasks.discard)
+
+    async def _close(self, connection: WSChiaConnection) -> None:
+        try:
+            await connection.close()
+        except Exception as e:
+            self._logger.warning(f"Closing the stale connection to {get_peer_name(connection)} failed: {e}")
+
+    def _get_full_node_connections(self) -> List[WSChiaConnection]:
+        server = self._farmer_api_hooks.farmer_api.farmer.server
+        if server is None:
+            return []
+
+        return server.get_connections(NodeType.FULL_NODE)
+
+    def _get_gateway_stats(self, connection: WSChiaConnection) -> GatewayStats:
+        return self._get_gateway_stats_by_name(get_peer_name(connection))
+
+    def _get_gateway_stats_by_name(self, gateway: str) -> GatewayStats:
+        gateway_stats = self.gateway_stats.get(gateway)
+        if gateway_stats is None:
+            gateway_stats = GatewayStats()
+            self.gateway_stats[gateway] = gateway_stats
+
+        return gateway_stats
+
+    async def _run_with_rpc(self, until: Event) -> None:
+        # Used when the farmer does not run in-process, `last_message_time` approximates the last signage point
+        if await self._wait(until, self._rpc_initial_sleep_seconds):
+            return
+        self._logger.info("Starting to monitor for stale connections")
+
+        async with get_any_service_client(FarmerRpcClient, root_path=self._root_path) as (farmer_client, _):
+            farmer_client: FarmerRpcClient
+
+            while not await self._wait(until, self._rpc_check_interval_seconds):
+                try:
+                    connections = await farmer_client.get_connections(node_type=NodeType.FULL_NODE)
+                    current_time = time()
+                    for connection in connections:
+                        silent_seconds = current_time - connection.get("last_message_time", 0)
+                        if silent_seconds < self.stale_threshold_seconds:
+                            continue
+                        gateway = f"{connection['peer_host']}:{connection['peer_port']}"
+                        gateway_stats = self._get_gateway_stats_by_name(gateway)
+                        gateway_stats.reconnects += 1
+                        gateway_stats.detection_latency.observe(max(0.0, silent_seconds - self.signage_point_interval_seconds))
+                        self._logger.warning(f"Detected stale connection to {gateway} (no message for {silent_seconds:.0f}s), reconnecting ..")
+                        await farmer_client.close_connection(connection["node_id"])
+                except Exception as e:
+                    self._logger.error(f"Encountered an error while checking for stale connections: {e}")
+
+    async def _wait(self, until: Event, timeout_seconds: float) -> bool:
+        try:
+            await wait_for(until.wait(), timeout=timeout_seconds)
+        except TimeoutError:
+            pass
+
+        return until.is_set()
@@ -0,0 +1,245 @@
+from asyncio import Event, wait_for, TimeoutError
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass, field
+from logging import Logger, getLogger, Handler, LogRecord, INFO
+from os.path import dirname
+from pathlib import Path
+from re import compile
+from threading import Lock
+from time import perf_counter
+from typing import Dict, Any, Optional, NamedTuple, Union, Callable, List
+
+from foxy_farmer.util.histogram import Histogram
+
+# Logged by chia based harvesters (including gigahorse) once per signage point
+signage_point_lookup_pattern = compile(
+    r"(\d+) plots were eligible for farming \w+\.\.\. Found (\d+) proofs\. Time: (\d+(?:\.\d+)?) s\. Total (\d+) plots"
+)
+# Logged by chia based harvesters for lookups exceeding a few seconds
+plot_lookup_pattern = compile(r"Looking up qualities on (.+?) took: (\d+(?:\.\d+)?)")
+
+local_harvester = "local"
+
+
+class SignagePointLookup(NamedTuple):
+    eligible_plots: int
+    proofs: int
+    lookup_seconds: float
+    total_plots: int
+
+
+class PlotLookup(NamedTuple):
+    filename: str
+    lookup_seconds: float
+
+
+LookupEvent = Union[SignagePointLookup, PlotLookup]
+
+
+def parse_lookup_message(text: str) -> Optional[LookupEvent]:
+    # Cheap substring checks first, this runs for every log line of a harvester
+    if "plots were eligible for farming" in text:
+        match = signage_point_lookup_pattern.search(text)
+        if match is None:
+            return None
+        eligible_plots, proofs, lookup_seconds, total_plots = match.groups()
+
+        return SignagePointLookup(int(eligible_plots), int(proofs), float(lookup_seconds), int(total_plots))
+    if "Looking up qualities on" in text:
+        match = plot_lookup_pattern.search(text)
+        if match is None:
+            return None
+        filename, lookup_seconds = match.groups()
+
+        return PlotLookup(filename, float(lookup_seconds))
+
+    return None
+
+
+@dataclass
+class HarvesterLookupSummary:
+    lookups: int = 0
+    eligible_plots: int = 0
+    proofs: int = 0
+    total_plots: int = 0
+    lookup_times: Histogram = field(default_factory=Histogram)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "lookups": self.lookups,
+            "eligible_plots": self.eligible_plots,
+            "proofs": self.proofs,
+            "total_plots": self.total_plots,
+            "lookup_seconds": self.lookup_times.to_dict(),
+        }
+
+
+class HarvesterLookupStats:
+    """ Aggregates proof lookup times per harvester and plot directory and warns when the p99 exceeds the budget. """
+    _check_interval_seconds: float = 5 * 60
+    lookup_time_budget_seconds: float
+    harvesters: Dict[str, HarvesterLookupSummary]
+    plot_directory_lookup_times: Dict[str, Histogram]
+    _window_harvester_lookup_times: Dict[str, Histogram]
+    _window_plot_directory_lookup_times: Dict[str, Histogram]
+    _plot_lookup_listeners: List[Callable[[str, float], None]]
+    _lock: Lock
+    _logger: Logger = getLogger("harvester_lookup_stats")
+
+    def __init__(self, lookup_time_budget_seconds: float = 5):
+        self.lookup_time_budget_seconds = lookup_time_budget_seconds
+        self.harvesters = {}
+        self.plot_directory_lookup_times = {}
+        self._window_harvester_lookup_times = {}
+        self._window_plot_directory_lookup_times = {}
+        self._plot_lookup_listeners = []
+        self._lock = Lock()
+
+    def add_plot_lookup_listener(self, listener: Callable[[str, float], None]) -> None:
+        self._plot_lookup_listeners.append(listener)
+
+    def remove_plot_lookup_listener(self, listener: Callable[[str, float], None]) -> None:
+        self._plot_lookup_listeners.remove(listener)
+
+    def observe(self, harvester: str, event: LookupEvent) -> None:
+        if isinstance(event, SignagePointLookup):
+            self.observe_signage_point_lookup(harvester, event)
+        else:
+            self.observe_plot_lookup(dirname(event.filename), event.lookup_seconds)
+
+    def observe_signage_point_lookup(self, harvester: str, lookup: SignagePointLookup) -> None:
+        with self._lock:
+            summary = self.harvesters.get(harvester)
+            if summary is None:
+                summary = HarvesterLookupSummary()
+                self.harvesters[harvester] = summary
+            summary.lookups += 1
+            summary.eligible_plots += lookup.eligible_plots
+            summary.proofs += lookup.proofs
+            summary.total_plots = lookup.total_plots
+            summary.lookup_times.observe(lookup.lookup_seconds)
+            get_histogram(self._window_harvester_lookup_times, harvester).observe(lookup.lookup_seconds)
+
+    def observe_plot_lookup(self, plot_directory: str, lookup_seconds: float) -> None:
+        # Called from the harvester threads for the embedded harvester
+        with self._lock:
+            get_histogram(self.plot_directory_lookup_times, plot_directory).observe(lookup_seconds)
+            get_histogram(self._window_plot_directory_lookup_times, plot_directory).observe(lookup_seconds)
+        for listener in self._plot_lookup_listeners:
+            listener(plot_directory, lookup_seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "lookup_time_budget_seconds": self.lookup_time_budget_seconds,
+                "harvesters": {harvester: summary.to_dict() for harvester, summary in self.harvesters.items()},
+                "plot_directories": {
+                    plot_directory: histogram.to_dict()
+                    for plot_directory, histogram in self.plot_directory_lookup_times.items()
+                },
+            }
+
+    async def run(self, until: Event) -> None:
+        while not until.is_set():
+            try:
+                await wait_for(until.wait(), timeout=self._check_interval_seconds)
+            except TimeoutError:
+                pass
+            self._check_lookup_time_budget()
+
+    def _check_lookup_time_budget(self) -> None:
+        with self._lock:
+            window_harvester_lookup_times = self._window_harvester_lookup_times
+            window_plot_directory_lookup_times = self._window_plot_directory_lookup_times
+            self._window_harvester_lookup_times = {}
+            self._window_plot_directory_lookup_times = {}
+        interval_minutes = self._check_interval_seconds / 60
+        for harvester, histogram in window_harvester_lookup_times.items():
+            p99 = histogram.percentile(99)
+            if p99 > self.lookup_time_budget_seconds:
+                self._logger.warning(
+                    f"Harvester {harvester} has a lookup time p99 of {p99:.2f}s over the last {interval_minutes:.0f} minutes "
+                    f"(budget {self.lookup_time_budget_seconds}s, {histogram.count} signage points)"
+                )
+        for plot_directory, histogram in window_plot_directory_lookup_times.items():
+            p99 = histogram.percentile(99)
+            if p99 > self.lookup_time_budget_seconds:
+                self._logger.warning(
+                    f"Plot directory {plot_directory} has a lookup time p99 of {p99:.2f}s over the last {interval_minutes:.0f} minutes "
+                    f"(budget {self.lookup_time_budget_seconds}s, {histogram.count} lookups), the disk might be failing or overloaded"
+                )
+
+
+def get_histogram(histograms: Dict[str, Histogram], key: str) -> Histogram:
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = Histogram()
+        histograms[key] = histogram
+
+    return histogram
+
+
+class LookupLogHandler(Handler):
+    """ Feeds the per signage point lookup summary logged by the embedded harvester into the stats. """
+    _harvester_lookup_stats: HarvesterLookupStats
+
+    def __init__(self, harvester_lookup_stats: HarvesterLookupStats):
+        super().__init__()
+        self._harvester_lookup_stats = harvester_lookup_stats
+
+    def emit(self, record: LogRecord) -> None:
+        try:
+            event = parse_lookup_message(record.getMessage())
+            # Plot lookups are timed directly by the executor, only use the per signage point summary
+            if isinstance(event, SignagePointLookup):
+                self._harvester_lookup_stats.observe_signage_point_lookup(local_harvester, event)
+        except Exception:
+            self.handleError(record)
+
+
+class LookupTimingExecutor(Executor):
+    """ Wraps the harvester executor to time every plot lookup, these are submitted with the plot path as first argument. """
+    _executor: Executor
+    _harvester_lookup_stats: HarvesterLookupStats
+
+    def __init__(self, executor: Executor, harvester_lookup_stats: HarvesterLookupStats):
+        self._executor = executor
+        self._harvester_lookup_stats = harvester_lookup_stats
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        if len(args) == 0 or not isinstance(args[0], Path):
+            return self._executor.submit(fn, *args, **kwargs)
+        plot_directory = str(args[0].parent)
+
+        def timed_fn(*fn_args, **fn_kwargs):
+            started_at = perf_counter()
+            try:
+                return fn(*fn_args, **fn_kwargs)
+            finally:
+                self._harvester_lookup_stats.observe_plot_lookup(plot_directory, perf_counter() - started_at)
+
+        return self._executor.submit(timed_fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def add_harvester_lookup_log_handler(handler: Handler) -> None:
+    harvester_logger = getLogger("chia.harvester.harvester")
+    # The lookups are logged at INFO level, with a higher log level they would never reach the handler. The other
+    # handlers still drop these records as their level is set to the configured log level.
+    if not harvester_logger.isEnabledFor(INFO):
+        harvester_logger.setLevel(INFO)
+    harvester_logger.addHandler(handler)
+
+
+def install_harvester_lookup_hooks(harvester: Any, harvester_lookup_stats: HarvesterLookupStats) -> Handler:
+    harvester.executor = LookupTimingExecutor(harvester.executor, harvester_lookup_stats)
+    handler = LookupLogHandler(harvester_lookup_stats)
+    add_harvester_lookup_log_handler(handler)
+
+    return handler
+
+
+def uninstall_harvester_lookup_hooks(handler: Handler) -> None:
+    getLogger("chia.harvester.harvester").removeHandler(handler)
@@ -0,0 +1,241 @@
+import asyncio
+from asyncio import Handle, Task, get_running_loop, sleep, create_task, all_tasks, CancelledError
+from collections import deque
+from dataclasses import dataclass, asdict
+from logging import Logger, getLogger
+from os.path import dirname
+from time import perf_counter, thread_time, time
+from typing import Optional, Dict, Any, Deque, Callable
+
+from foxy_farmer.monitoring.component_task import current_component, default_component
+from foxy_farmer.util.histogram import Histogram
+
+asyncio_path = dirname(asyncio.__file__)
+
+
+@dataclass
+class SlowCallback:
+    timestamp: float
+    component: str
+    callback: str
+    duration_seconds: float
+    cpu_seconds: float
+
+
+@dataclass
+class ComponentUsage:
+    callbacks: int = 0
+    wall_seconds: float = 0
+    cpu_seconds: float = 0
+    max_callback_seconds: float = 0
+
+
+def describe_callback(handle: Handle) -> str:
+    callback = handle._callback
+    owner = getattr(callback, "__self__", None)
+    if not isinstance(owner, Task):
+        return getattr(callback, "__qualname__", repr(callback))
+
+    coroutine = owner.get_coro()
+    description = f"{owner.get_name()} {getattr(coroutine, '__qualname__', type(coroutine).__name__)}"
+    # The outermost coroutine is usually something generic like `Service.run`, the innermost one outside of asyncio
+    # is suspended right after the code which just blocked the loop
+    blocking_coroutine = None
+    inner_coroutine = getattr(coroutine, "cr_await", None)
+    while getattr(inner_coroutine, "cr_frame", None) is not None:
+        if not inner_coroutine.cr_frame.f_code.co_filename.startswith(asyncio_path):
+            blocking_coroutine = inner_coroutine
+        inner_coroutine = inner_coroutine.cr_await
+    if blocking_coroutine is not None:
+        frame = blocking_coroutine.cr_frame
+        description += f" -> {blocking_coroutine.__qualname__} ({frame.f_code.co_filename}:{frame.f_lineno})"
+
+    return description
+
+
+class LoopMonitor:
+    """ Samples the event loop scheduling delay and attributes callback run time to the components owning them. """
+    _sample_interval_seconds: float = 0.25
+    _log_interval_seconds: float = 60
+    _max_slow_callbacks: int = 100
+    _slow_callback_threshold_seconds: float
+    _lag: Histogram
+    _window_lag: Histogram
+    _callback_duration: Histogram
+    _slow_callbacks: Deque[SlowCallback]
+    _slow_callback_count: int = 0
+    _window_slow_callback_count: int = 0
+    _window_worst_slow_callback: Optional[SlowCallback] = None
+    _component_usage: Dict[str, ComponentUsage]
+    _window_cpu_seconds: Dict[str, float]
+    _started_at: float = 0
+    _original_handle_run: Optional[Callable[[Handle], None]] = None
+    _sample_task: Optional[Task[None]] = None
+    _logger: Logger = getLogger("loop_monitor")
+
+    def __init__(self, slow_callback_threshold_seconds: float = 0.1):
+        self._slow_callback_threshold_seconds = slow_callback_threshold_seconds
+        self._lag = Histogram()
+        self._window_lag = Histogram()
+        self._callback_duration = Histogram()
+        self._slow_callbacks = deque(maxlen=self._max_slow_callbacks)
+        self._component_usage = {}
+        self._window_cpu_seconds = {}
+
+    @property
+    def lag(self) -> Histogram:
+        return self._lag
+
+    @property
+    def callback_duration(self) -> Histogram:
+        return self._callback_duration
+
+    @property
+    def slow_callback_count(self) -> int:
+        return self._slow_callback_count
+
+    @property
+    def component_usage(self) -> Dict[str, ComponentUsage]:
+        return self._component_usage
+
+    def start(self) -> None:
+        if self._sample_task is not None:
+            return
+        self._started_at = perf_counter()
+        self._install_callback_instrumentation()
+        self._sample_task = create_task(self._sample_lag(), name="loop_monitor")
+
+    async def shutdown(self) -> None:
+        self._uninstall_callback_instrumentation()
+        if self._sample_task is None:
+            return
+        self._sample_task.cancel()
+        try:
+            await self._sample_task
+        except CancelledError:
+            pass
+        self._sample_task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        uptime_seconds = perf_counter() - self._started_at
+
+        return {
+            "uptime_seconds": uptime_seconds,
+            "task_count": len(all_tasks()),
+            "lag_seconds": self._lag.to_dict(),
+            "recent_lag_seconds": self._window_lag.to_dict(),
+            "callback_duration_seconds": self._callback_duration.to_dict(),
+            "slow_callback_threshold_seconds": self._slow_callback_threshold_seconds,
+            "slow_callback_count": self._slow_callback_count,
+            "slow_callbacks": [asdict(slow_callback) for slow_callback in self._slow_callbacks],
+            "components": {
+                component: {
+                    **asdict(usage),
+                    "cpu_percent": usage.cpu_seconds / uptime_seconds * 100 if uptime_seconds > 0 else 0,
+                }
+                for component, usage in self._component_usage.items()
+            },
+        }
+
+    def _install_callback_instrumentation(self) -> None:
+        if self._original_handle_run is not None:
+            return
+        original_handle_run = Handle._run
+        record_callback = self._record_callback
+        logger = self._logger
+        did_log_error = False
+
+        def instrumented_run(handle: Handle) -> None:
+            nonlocal did_log_error
+            started_at = perf_counter()
+            cpu_started_at = thread_time()
+            original_handle_run(handle)
+            # An error escaping here would stop the event loop, so instrumentation errors are only logged once
+            try:
+                record_callback(handle, perf_counter() - started_at, thread_time() - cpu_started_at)
+            except Exception as e:
+                if not did_log_error:
+                    did_log_error = True
+                    logger.error(f"Encountered an error while recording an event loop callback: {e}")
+
+        self._original_handle_run = original_handle_run
+        # Timer handles inherit `_run`, so this covers `call_soon`, `call_later` and all task steps
+        Handle._run = instrumented_run
+
+    def _uninstall_callback_instrumentation(self) -> None:
+        if self._original_handle_run is None:
+            return
+        Handle._run = self._original_handle_run
+        self._original_handle_run = None
+
+    def _record_callback(self, handle: Handle, duration_seconds: float, cpu_seconds: float) -> None:
+        component = handle._context.get(current_component, default_component)
+        usage = self._component_usage.get(component)
+        if usage is None:
+            usage = ComponentUsage()
+            self._component_usage[component] = usage
+        usage.callbacks += 1
+        usage.wall_seconds += duration_seconds
+        usage.cpu_seconds += cpu_seconds
+        if duration_seconds > usage.max_callback_seconds:
+            usage.max_callback_seconds = duration_seconds
+        self._callback_duration.observe(duration_seconds)
+        if duration_seconds < self._slow_callback_threshold_seconds:
+            return
+
+        slow_callback = SlowCallback(
+            timestamp=time(),
+            component=component,
+            callback=describe_callback(handle),
+            duration_seconds=duration_seconds,
+            cpu_seconds=cpu_seconds,
+        )
+        self._slow_callbacks.append(slow_callback)
+        self._slow_callback_count += 1
+        self._window_slow_callback_count += 1
+        if self._window_worst_slow_callback is None or duration_seconds > self._window_worst_slow_callback.duration_seconds:
+            self._window_worst_slow_callback = slow_callback
+        self._logger.debug(
+            f"Slow callback in {component} blocked the event loop for {duration_seconds:.3f}s "
+            f"({cpu_seconds:.3f}s CPU): {slow_callback.callback}"
+        )
+
+    async def _sample_lag(self) -> None:
+        loop = get_running_loop()
+        next_log_at = loop.time() + self._log_interval_seconds
+        while True:
+            expected_at = loop.time() + self._sample_interval_seconds
+            await sleep(self._sample_interval_seconds)
+            now = loop.time()
+            lag_seconds = max(0.0, now - expected_at)
+            self._lag.observe(lag_seconds)
+            self._window_lag.observe(lag_seconds)
+            if now >= next_log_at:
+                self._log_summary()
+                next_log_at = now + self._log_interval_seconds
+
+    def _log_summary(self) -> None:
+        cpu_usages = []
+        for component, usage in self._component_usage.items():
+            cpu_seconds = usage.cpu_seconds - self._window_cpu_seconds.get(component, 0)
+            self._window_cpu_seconds[component] = usage.cpu_seconds
+            cpu_usages.append((component, cpu_seconds / self._log_interval_seconds * 100))
+        cpu_usages.sort(key=lambda cpu_usage: cpu_usage[1], reverse=True)
+        cpu_summary = " ".join(f"{component}={cpu_percent:.1f}%" for component, cpu_percent in cpu_usages)
+
+        summary = (
+            f"Event loop lag p50={self._window_lag.percentile(50):.3f}s p99={self._window_lag.percentile(99):.3f}s "
+            f"max={self._window_lag.max:.3f}s, CPU {cpu_summary}"
+        )
+        if self._window_slow_callback_count > 0:
+            worst = self._window_worst_slow_callback
+            self._logger.warning(
+                f"{summary}, {self._window_slow_callback_count} slow callbacks, worst took {worst.duration_seconds:.3f}s "
+                f"in {worst.component}: {worst.callback}"
+            )
+        else:
+            self._logger.info(summary)
+
+        self._window_lag.reset()
+        self._window_slow_callback_count = 0
+        self._window_worst_slow_callback = None
@@ -0,0 +1,329 @@
+from asyncio import Task, create_task, sleep, gather, CancelledError
+from logging import Logger, getLogger
+from pathlib import Path
+from time import time
+from typing import Optional, Dict, Any, List
+
+from chia.rpc.farmer_rpc_client import FarmerRpcClient
+from chia.server.outbound_message import NodeType
+from chia_rs.sized_ints import uint16
+
+from foxy_farmer.farmer.farmer import Farmer
+from foxy_farmer.monitoring.loop_monitor import LoopMonitor
+from foxy_farmer.monitoring.prometheus_text import PrometheusText
+
+partial_results = ["valid", "invalid", "stale", "insufficient", "missing"]
+
+
+class MetricsExporter:
+    """ Periodically collects farmer metrics into a cached Prometheus text exposition, scrapes only read the cache. """
+    _collect_interval_seconds: float = 15
+    _root_path: Path
+    _config: Dict[str, Any]
+    _farmer: Farmer
+    _loop_monitor: Optional[LoopMonitor]
+    _farmer_client: Optional[FarmerRpcClient] = None
+    _metrics: str = ""
+    _collect_task: Optional[Task[None]] = None
+    _logger: Logger = getLogger("metrics_exporter")
+
+    def __init__(self, root_path: Path, config: Dict[str, Any], farmer: Farmer, loop_monitor: Optional[LoopMonitor]):
+        self._root_path = root_path
+        self._config = config
+        self._farmer = farmer
+        self._loop_monitor = loop_monitor
+
+    @property
+    def metrics(self) -> str:
+        return self._metrics
+
+    def start(self) -> None:
+        if self._collect_task is not None:
+            return
+        self._collect_task = create_task(self._collect_periodically(), name="metrics_exporter")
+
+    async def shutdown(self) -> None:
+        if self._collect_task is not None:
+            self._collect_task.cancel()
+            try:
+                await self._collect_task
+            except CancelledError:
+                pass
+            self._collect_task = None
+        if self._farmer_client is not None:
+            self._farmer_client.close()
+            await self._farmer_client.await_closed()
+            self._farmer_client = None
+
+    async def _collect_periodically(self) -> None:
+        while True:
+            try:
+                self._metrics = await self._collect()
+            except Exception as e:
+                self._logger.error(f"Encountered an error while collecting metrics: {e}")
+            await sleep(self._collect_interval_seconds)
+
+    async def _collect(self) -> str:
+        text = PrometheusText()
+        await self._add_farmer_rpc_metrics(text)
+        self._add_farmer_api_metrics(text)
+        self._add_connection_monitor_metrics(text)
+        self._add_harvester_lookup_metrics(text)
+        self._add_syslog_metrics(text)
+        self._add_process_supervisor_metrics(text)
+        self._add_startup_metrics(text)
+        self._add_loop_metrics(text)
+        text.add("foxy_farmer_metrics_collected_timestamp_seconds", "gauge", "Time the metrics were collected at", time())
+
+        return text.render()
+
+    async def _get_farmer_client(self) -> FarmerRpcClient:
+        if self._farmer_client is None:
+            self._farmer_client = await FarmerRpcClient.create(
+                self._config["self_hostname"],
+                uint16(self._config["farmer"]["rpc_port"]),
+                self._root_path,
+                self._config,
+            )
+
+        return self._farmer_client
+
+    async def _add_farmer_rpc_metrics(self, text: PrometheusText) -> None:
+        try:
+            farmer_client = await self._get_farmer_client()
+            connections, pool_state, harvesters_summary = await gather(
+                farmer_client.get_connections(node_type=NodeType.FULL_NODE),
+                farmer_client.get_pool_state(),
+                farmer_client.get_harvesters_summary(),
+            )
+        except Exception as e:
+            self._logger.debug(f"Could not query the farmer rpc: {e}")
+            text.add("foxy_farmer_farmer_rpc_up", "gauge", "Whether the farmer rpc could be queried", 0)
+
+            return
+        text.add("foxy_farmer_farmer_rpc_up", "gauge", "Whether the farmer rpc could be queried", 1)
+        self._add_connection_metrics(text, connections)
+        self._add_pool_metrics(text, pool_state["pool_state"])
+        self._add_harvester_metrics(text, harvesters_summary["harvesters"])
+
+    def _add_connection_metrics(self, text: PrometheusText, connections: List[Dict[str, Any]]) -> None:
+        text.add("foxy_farmer_full_node_peers", "gauge", "Connected full node peers", len(connections))
+        current_time = time()
+        for connection in connections:
+            text.add(
+                "foxy_farmer_full_node_peer_last_message_age_seconds",
+                "gauge",
+                "Seconds since the last message was received from the full node peer",
+                current_time - connection.get("last_message_time", 0),
+                labels={"gateway": f"{connection['peer_host']}:{connection['peer_port']}"},
+            )
+
+    def _add_pool_metrics(self, text: PrometheusText, pool_states: List[Dict[str, Any]]) -> None:
+        for pool_state in pool_states:
+            pool_config = pool_state["pool_config"]
+            labels = {"launcher_id": pool_config["launcher_id"], "pool_url": pool_config["pool_url"]}
+            text.add("foxy_farmer_pool_plots", "gauge", "Plots assigned to the PlotNFT", pool_state["plot_count"], labels=labels)
+            if pool_state["current_difficulty"] is not None:
+                text.add("foxy_farmer_pool_difficulty", "gauge", "Current pool difficulty", pool_state["current_difficulty"], labels=labels)
+            text.add("foxy_farmer_pool_points_found_total", "counter", "Points found since start", pool_state["points_found_since_start"], labels=labels)
+            text.add(
+                "foxy_farmer_pool_points_acknowledged_total",
+                "counter",
+                "Points acknowledged by the pool since start",
+                pool_state["points_acknowledged_since_start"],
+                labels=labels,
+            )
+            for result in partial_results:
+                text.add(
+                    "foxy_farmer_pool_partials_total",
+                    "counter",
+                    "Partials by result since start",
+                    pool_state.get(f"{result}_partials_since_start", 0),
+                    labels={**labels, "result": result},
+                )
+            text.add("foxy_farmer_pool_partials_submitted_24h", "gauge", "Partials submitted to the pool in the last 24h", len(pool_state["points_found_24h"]), labels=labels)
+            text.add("foxy_farmer_pool_partials_accepted_24h", "gauge", "Partials accepted by the pool in the last 24h", len(pool_state["points_acknowledged_24h"]), labels=labels)
+            text.add("foxy_farmer_pool_partials_rejected_24h", "gauge", "Partials rejected by the pool in the last 24h", len(pool_state["pool_errors_24h"]), labels=labels)
+
+    def _add_harvester_metrics(self, text: PrometheusText, harvesters: List[Dict[str, Any]]) -> None:
+        for harvester in harvesters:
+            connection = harvester["connection"]
+            labels = {"harvester": f"{connection['host']}:{connection['port']}", "node_id": connection["node_id"]}
+            text.add("foxy_farmer_harvester_plots", "gauge", "Plots loaded by the harvester", harvester["plots"], labels=labels)
+            text.add("foxy_farmer_harvester_plot_size_bytes", "gauge", "Raw size of the plots loaded by the harvester", harvester["total_plot_size"], labels=labels)
+            text.add(
+                "foxy_farmer_harvester_effective_plot_size_bytes",
+                "gauge",
+                "Effective size of the plots loaded by the harvester",
+                harvester["total_effective_plot_size"],
+                labels=labels,
+            )
+            text.add("foxy_farmer_harvester_failed_plots", "gauge", "Plots the harvester failed to open", harvester["failed_to_open_filenames"], labels=labels)
+            text.add("foxy_farmer_harvester_no_key_plots", "gauge", "Plots with missing keys", harvester["no_key_filenames"], labels=labels)
+            text.add("foxy_farmer_harvester_duplicate_plots", "gauge", "Duplicate plots", harvester["duplicates"], labels=labels)
+            text.add("foxy_farmer_harvester_syncing", "gauge", "Whether the harvester is syncing its plots", 0 if harvester["syncing"] is None else 1, labels=labels)
+
+    def _add_farmer_api_metrics(self, text: PrometheusText) -> None:
+        farmer_api_hooks = self._farmer.farmer_api_hooks
+        if farmer_api_hooks is None:
+            return
+        for gateway, signage_points in farmer_api_hooks.signage_points_per_gateway.items():
+            text.add("foxy_farmer_signage_points_total", "counter", "Signage points received per gateway", signage_points, labels={"gateway": gateway})
+        for harvester, proofs in farmer_api_hooks.proofs_found_per_harvester.items():
+            text.add("foxy_farmer_proofs_found_total", "counter", "Proofs found per harvester", proofs, labels={"harvester": harvester})
+        for harvester, histogram in farmer_api_hooks.harvester_lookup_times.items():
+            text.add_histogram(
+                "foxy_farmer_harvester_lookup_seconds",
+                "Lookup time reported by the harvester per signage point",
+                histogram,
+                labels={"harvester": harvester},
+            )
+        for harvester, histogram in farmer_api_hooks.harvester_response_times.items():
+            text.add_histogram(
+                "foxy_farmer_harvester_response_seconds",
+                "Time from receiving a signage point until the harvester responded",
+                histogram,
+                labels={"harvester": harvester},
+            )
+        for gateway, gateway_stats in farmer_api_hooks.signage_point_arrivals.gateway_stats.items():
+            text.add(
+                "foxy_farmer_signage_point_first_arrivals_total",
+                "counter",
+                "Signage points a gateway delivered before all other gateways",
+                gateway_stats.first_arrivals,
+                labels={"gateway": gateway},
+            )
+            for quantile in (50, 90, 99):
+                lag = gateway_stats.lag_percentile(quantile)
+                if lag is None:
+                    continue
+                text.add(
+                    "foxy_farmer_signage_point_lag_seconds",
+                    "gauge",
+                    "Delay of signage points from a gateway relative to the first arrival, over the recent signage points",
+                    lag,
+                    labels={"gateway": gateway, "quantile": str(quantile / 100)},
+                )
+
+    def _add_connection_monitor_metrics(self, text: PrometheusText) -> None:
+        connection_monitor = self._farmer.connection_monitor
+        if connection_monitor is None:
+            return
+        text.add(
+            "foxy_farmer_signage_point_interval_seconds",
+            "gauge",
+            "Observed average interval between signage points",
+            connection_monitor.signage_point_interval_seconds,
+        )
+        text.add(
+            "foxy_farmer_stale_connection_threshold_seconds",
+            "gauge",
+            "Silence after which a full node connection is considered stale",
+            connection_monitor.stale_threshold_seconds,
+        )
+        for gateway, gateway_stats in connection_monitor.gateway_stats.items():
+            labels = {"gateway": gateway}
+            text.add("foxy_farmer_gateway_reconnects_total", "counter", "Reconnects of stale full node connections", gateway_stats.reconnects, labels=labels)
+            text.add(
+                "foxy_farmer_gateway_missed_signage_points_total",
+                "counter",
+                "Signage points delivered by other gateways but not by this one",
+                gateway_stats.missed_signage_points,
+                labels=labels,
+            )
+            text.add_histogram(
+                "foxy_farmer_gateway_stale_detection_seconds",
+                "Time from a connection becoming stale until it was reconnected",
+                gateway_stats.detection_latency,
+                labels=labels,
+            )
+
+    def _add_harvester_lookup_metrics(self, text: PrometheusText) -> None:
+        harvester_lookup_stats = self._farmer.harvester_lookup_stats
+        if harvester_lookup_stats is None:
+            return
+        text.add(
+            "foxy_farmer_lookup_time_budget_seconds",
+            "gauge",
+            "Lookup time above which slow harvesters and plot directories are reported",
+            harvester_lookup_stats.lookup_time_budget_seconds,
+        )
+        for harvester, summary in list(harvester_lookup_stats.harvesters.items()):
+            labels = {"harvester": harvester}
+            text.add("foxy_farmer_harvester_signage_points_total", "counter", "Signage points looked up by the harvester", summary.lookups, labels=labels)
+            text.add("foxy_farmer_harvester_eligible_plots_total", "counter", "Plots which passed the plot filter", summary.eligible_plots, labels=labels)
+            text.add("foxy_farmer_harvester_proofs_total", "counter", "Proofs found by the harvester", summary.proofs, labels=labels)
+            text.add_histogram(
+                "foxy_farmer_harvester_signage_point_lookup_seconds",
+                "Time the harvester took to look up all eligible plots of a signage point",
+                summary.lookup_times,
+                labels=labels,
+            )
+        # Plot lookups are recorded from the harvester threads, copy before iterating
+        for plot_directory, histogram in list(harvester_lookup_stats.plot_directory_lookup_times.items()):
+            text.add_histogram(
+                "foxy_farmer_plot_directory_lookup_seconds",
+                "Time to look up the qualities (and proofs) of a single plot per plot directory",
+                histogram,
+                labels={"directory": plot_directory},
+            )
+
+    def _add_syslog_metrics(self, text: PrometheusText) -> None:
+        syslog_server = self._farmer.syslog_server
+        if syslog_server is None:
+            return
+        stats = syslog_server.stats
+        text.add("foxy_farmer_syslog_messages_received_total", "counter", "Syslog messages received", stats.received_messages)
+        text.add("foxy_farmer_syslog_messages_processed_total", "counter", "Syslog messages processed", stats.processed_messages)
+        text.add("foxy_farmer_syslog_messages_dropped_total", "counter", "Syslog messages dropped", stats.dropped_messages)
+        text.add("foxy_farmer_syslog_messages_invalid_total", "counter", "Syslog messages which could not be parsed", stats.invalid_messages)
+        text.add("foxy_farmer_syslog_messages_queued", "gauge", "Syslog messages waiting to be processed", stats.queued_messages)
+        text.add("foxy_farmer_syslog_messages_per_second", "gauge", "Syslog messages processed per second", stats.messages_per_second)
+
+    def _add_process_supervisor_metrics(self, text: PrometheusText) -> None:
+        process_supervisor = self._farmer.process_supervisor
+        if process_supervisor is None:
+            return
+        for component, stats in process_supervisor.component_stats.items():
+            labels = {"component": component}
+            text.add("foxy_farmer_component_up", "gauge", "Whether the supervised component is healthy", 1 if stats.down_since is None else 0, labels=labels)
+            text.add("foxy_farmer_component_failures_total", "counter", "Failures detected per supervised component", stats.failures, labels=labels)
+            text.add("foxy_farmer_component_restarts_total", "counter", "Restarts per supervised component", stats.restarts, labels=labels)
+            text.add(
+                "foxy_farmer_component_failed_restarts_total",
+                "counter",
+                "Restarts which raised an error per supervised component",
+                stats.failed_restarts,
+                labels=labels,
+            )
+            text.add_histogram(
+                "foxy_farmer_component_recovery_seconds",
+                "Time from detecting a failure until the component was healthy again",
+                stats.recovery_times,
+                labels=labels,
+            )
+
+    def _add_startup_metrics(self, text: PrometheusText) -> None:
+        startup_timings = self._farmer.startup_timings
+        if startup_timings.update_downtime_seconds is not None:
+            text.add("foxy_farmer_update_downtime_seconds", "gauge", "Time without signage points during the last update", startup_timings.update_downtime_seconds)
+            text.add("foxy_farmer_update_missed_signage_points", "gauge", "Signage points missed during the last update", startup_timings.update_missed_signage_points)
+        if startup_timings.total_seconds is None:
+            return
+        text.add("foxy_farmer_startup_seconds", "gauge", "Time it took to start the farmer", startup_timings.total_seconds)
+        for phase, seconds in startup_timings.phases.items():
+            text.add("foxy_farmer_startup_phase_seconds", "gauge", "Time it took to complete a startup phase", seconds, labels={"phase": phase})
+
+    def _add_loop_metrics(self, text: PrometheusText) -> None:
+        if self._loop_monitor is None:
+            return
+        text.add_histogram("foxy_farmer_event_loop_lag_seconds", "Event loop scheduling delay", self._loop_monitor.lag)
+        text.add("foxy_farmer_event_loop_slow_callbacks_total", "counter", "Callbacks blocking the event loop", self._loop_monitor.slow_callback_count)
+        for component, usage in self._loop_monitor.component_usage.items():
+            text.add(
+                "foxy_farmer_event_loop_cpu_seconds_total",
+                "counter",
+                "CPU time spent in event loop callbacks per component",
+                usage.cpu_seconds,
+                labels={"component": component},
+            )
@@ -0,0 +1,59 @@
+from logging import Logger, getLogger
+from typing import Callable, Dict, Any, Optional, List
+
+from aiohttp import web
+
+
+class MonitoringServer:
+    """ Serves monitoring data of the running farmer on a local http endpoint. """
+    _host: str
+    _port: int
+    _app: web.Application
+    _runner: Optional[web.AppRunner] = None
+    _paths: List[str]
+    _logger: Logger = getLogger("monitoring_server")
+
+    def __init__(self, host: str, port: int):
+        self._host = host
+        self._port = port
+        self._app = web.Application()
+        self._paths = []
+        self._app.router.add_get("/", self._handle_index)
+
+    def add_json_route(self, path: str, get_data: Callable[[], Dict[str, Any]]) -> None:
+        async def handle(_: web.Request) -> web.Response:
+            return web.json_response(get_data())
+
+        self._app.router.add_get(path, handle)
+        self._paths.append(path)
+
+    def add_text_route(self, path: str, get_text: Callable[[], str], content_type: str = "text/plain; charset=utf-8") -> None:
+        async def handle(_: web.Request) -> web.Response:
+            return web.Response(body=get_text().encode("utf-8"), headers={"Content-Type": content_type})
+
+        self._app.router.add_get(path, handle)
+        self._paths.append(path)
+
+    async def start(self) -> None:
+        if self._runner is not None:
+            return
+        runner = web.AppRunner(self._app, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, host=self._host, port=self._port).start()
+        except OSError as e:
+            await runner.cleanup()
+            self._logger.warning(f"Could not start the monitoring server on {self._host}:{self._port}: {e}")
+
+            return
+        self._runner = runner
+        self._logger.info(f"Monitoring server listening on http://{self._host}:{self._port}")
+
+    async def stop(self) -> None:
+        if self._runner is None:
+            return
+        await self._runner.cleanup()
+        self._runner = None
+
+    async def _handle_index(self, _: web.Request) -> web.Response:
+        return web.json_response({"paths": self._paths})
@@ -0,0 +1,147 @@
+from abc import ABC, abstractmethod
+from asyncio import Event, wait_for, TimeoutError
+from dataclasses import dataclass, field
+from logging import Logger, getLogger
+from time import monotonic
+from typing import Dict, List, Optional, Any
+
+from foxy_farmer.util.histogram import Histogram
+
+recovery_buckets_seconds = (1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+class SupervisedComponent(ABC):
+    """ A process (or a service of a process) which can be checked and restarted on its own. """
+    name: str
+    # Components are not checked while the component they depend on is down, eg. services of a daemon
+    depends_on: Optional[str] = None
+
+    @abstractmethod
+    async def check(self) -> Optional[str]:
+        """ Returns the reason the component is unhealthy or None if it is healthy. """
+        ...
+
+    @abstractmethod
+    async def restart(self) -> None:
+        ...
+
+
+@dataclass
+class ComponentStats:
+    failures: int = 0
+    restarts: int = 0
+    failed_restarts: int = 0
+    last_failure_reason: Optional[str] = None
+    down_since: Optional[float] = None
+    healthy_since: Optional[float] = None
+    next_restart_at: float = 0
+    backoff_seconds: float = 0
+    recovery_times: Histogram = field(default_factory=lambda: Histogram(buckets=recovery_buckets_seconds))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "up": self.down_since is None,
+            "failures": self.failures,
+            "restarts": self.restarts,
+            "failed_restarts": self.failed_restarts,
+            "last_failure_reason": self.last_failure_reason,
+            "down_for_seconds": monotonic() - self.down_since if self.down_since is not None else None,
+            "recovery_seconds": self.recovery_times.to_dict(),
+        }
+
+
+class ProcessSupervisor:
+    """ Restarts failed components one by one with exponential backoff, components which are healthy are left alone. """
+    _check_interval_seconds: float
+    _check_timeout_seconds: float
+    _initial_backoff_seconds: float
+    _max_backoff_seconds: float
+    _stable_seconds: float
+    _components: List[SupervisedComponent]
+    component_stats: Dict[str, ComponentStats]
+    _logger: Logger = getLogger("process_supervisor")
+
+    def __init__(
+        self,
+        check_interval_seconds: float = 10,
+        check_timeout_seconds: float = 15,
+        initial_backoff_seconds: float = 5,
+        max_backoff_seconds: float = 300,
+        stable_seconds: float = 600,
+    ):
+        self._check_interval_seconds = check_interval_seconds
+        self._check_timeout_seconds = check_timeout_seconds
+        self._initial_backoff_seconds = initial_backoff_seconds
+        self._max_backoff_seconds = max_backoff_seconds
+        self._stable_seconds = stable_seconds
+        self._components = []
+        self.component_stats = {}
+
+    def add(self, component: SupervisedComponent) -> None:
+        self._components.append(component)
+        self.component_stats[component.name] = ComponentStats(healthy_since=monotonic())
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "components": {name: stats.to_dict() for name, stats in self.component_stats.items()},
+        }
+
+    async def run(self, until: Event) -> None:
+        while not until.is_set():
+            try:
+                await wait_for(until.wait(), timeout=self._check_interval_seconds)
+            except TimeoutError:
+                pass
+            if until.is_set():
+                break
+            await self.check_components()
+
+    async def check_components(self) -> None:
+        for component in self._components:
+            if component.depends_on is not None and self.component_stats[component.depends_on].down_since is not None:
+                continue
+            await self._check_component(component)
+
+    async def _check_component(self, component: SupervisedComponent) -> None:
+        stats = self.component_stats[component.name]
+        now = monotonic()
+        try:
+            failure_reason = await wait_for(component.check(), timeout=self._check_timeout_seconds)
+        except TimeoutError:
+            failure_reason = f"no heartbeat within {self._check_timeout_seconds:.0f}s"
+        except Exception as e:
+            failure_reason = f"health check failed: {e}"
+        if failure_reason is None:
+            self._on_healthy(component, stats, now)
+
+            return
+        if stats.down_since is None:
+            stats.failures += 1
+            stats.down_since = now
+            stats.last_failure_reason = failure_reason
+            # Components failing again shortly after recovering keep their backoff, so crash loops slow down
+            if stats.healthy_since is None or now - stats.healthy_since >= self._stable_seconds:
+                stats.backoff_seconds = 0
+            stats.next_restart_at = now + stats.backoff_seconds
+            stats.healthy_since = None
+            self._logger.warning(f"{component.name} failed: {failure_reason}")
+        if now < stats.next_restart_at:
+            return
+        stats.backoff_seconds = min(self._max_backoff_seconds, max(self._initial_backoff_seconds, stats.backoff_seconds * 2))
+        stats.next_restart_at = now + stats.backoff_seconds
+        stats.restarts += 1
+        self._logger.info(f"Restarting {component.name} (attempt {stats.restarts}) ..")
+        try:
+            await component.restart()
+        except Exception as e:
+            stats.failed_restarts += 1
+            self._logger.error(f"Restarting {component.name} failed, retrying in {stats.backoff_seconds:.0f}s: {e}")
+
+    def _on_healthy(self, component: SupervisedComponent, stats: ComponentStats, now: float) -> None:
+        if stats.down_since is None:
+            return
+        recovery_seconds = now - stats.down_since
+        stats.recovery_times.observe(recovery_seconds)
+        stats.down_since = None
+        stats.healthy_since = now
+        self._logger.info(f"{component.name} recovered after {recovery_seconds:.1f}s")
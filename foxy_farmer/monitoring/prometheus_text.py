@@ -0,0 +1,53 @@
+from typing import Dict, List, Union, Optional
+
+from foxy_farmer.util.histogram import Histogram
+
+Labels = Dict[str, str]
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+
+def format_labels(labels: Labels) -> str:
+    if len(labels) == 0:
+        return ""
+
+    return "{" + ",".join(f"{name}=\"{escape_label_value(str(value))}\"" for name, value in labels.items()) + "}"
+
+
+def format_value(value: Union[int, float]) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class PrometheusText:
+    """ Builds a Prometheus text exposition, grouping samples of the same metric below a single HELP and TYPE. """
+    _metric_lines: Dict[str, List[str]]
+
+    def __init__(self):
+        self._metric_lines = {}
+
+    def add(self, name: str, metric_type: str, description: str, value: Union[int, float], labels: Optional[Labels] = None) -> None:
+        self._get_lines(name, metric_type, description).append(f"{name}{format_labels(labels or {})} {format_value(value)}")
+
+    def add_histogram(self, name: str, description: str, histogram: Histogram, labels: Optional[Labels] = None) -> None:
+        lines = self._get_lines(name, "histogram", description)
+        labels = labels or {}
+        for upper_bound, count in histogram.cumulative_counts():
+            lines.append(f"{name}_bucket{format_labels({**labels, 'le': format_value(float(upper_bound))})} {count}")
+        lines.append(f"{name}_sum{format_labels(labels)} {format_value(float(histogram.sum))}")
+        lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+
+    def render(self) -> str:
+        return "".join(f"{line}\n" for lines in self._metric_lines.values() for line in lines)
+
+    def _get_lines(self, name: str, metric_type: str, description: str) -> List[str]:
+        lines = self._metric_lines.get(name)
+        if lines is None:
+            lines = [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+            self._metric_lines[name] = lines
+
+        return lines
@@ -0,0 +1,107 @@
+from collections import deque
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Deque, Dict, Any, Optional, List
+
+from chia_rs.sized_bytes import bytes32
+
+from foxy_farmer.util.histogram import percentile_of_sorted
+
+
+@dataclass
+class SignagePointArrival:
+    first_arrival_at: float
+    first_gateway: str
+    gateways: List[str] = field(default_factory=list)
+
+
+@dataclass
+class GatewayArrivalStats:
+    arrivals: int = 0
+    first_arrivals: int = 0
+    # Rolling windows of the most recent signage points
+    lags: Deque[float] = field(default_factory=lambda: deque(maxlen=512))
+    leads: Deque[float] = field(default_factory=lambda: deque(maxlen=512))
+
+    def lag_percentile(self, percentile: float) -> Optional[float]:
+        if len(self.lags) == 0:
+            return None
+
+        return percentile_of_sorted(sorted(self.lags), percentile)
+
+    def lead_percentile(self, percentile: float) -> Optional[float]:
+        if len(self.leads) == 0:
+            return None
+
+        return percentile_of_sorted(sorted(self.leads), percentile)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "arrivals": self.arrivals,
+            "first_arrivals": self.first_arrivals,
+            "first_arrival_share": self.first_arrivals / self.arrivals if self.arrivals > 0 else 0,
+            "lag_seconds": {
+                "p50": self.lag_percentile(50),
+                "p90": self.lag_percentile(90),
+                "p99": self.lag_percentile(99),
+                "max": max(self.lags) if len(self.lags) > 0 else None,
+            },
+            "lead_seconds": {
+                "p50": self.lead_percentile(50),
+                "p90": self.lead_percentile(90),
+            },
+        }
+
+
+class SignagePointArrivalTracker:
+    """ Tracks how much earlier or later each full node connection delivers signage points than the fastest one. """
+    _max_tracked_signage_points: int = 64
+    _signage_points: Dict[bytes32, SignagePointArrival]
+    gateway_stats: Dict[str, GatewayArrivalStats]
+
+    def __init__(self):
+        self._signage_points = {}
+        self.gateway_stats = {}
+
+    def on_new_signage_point(self, signage_point_hash: bytes32, gateway: str) -> None:
+        now = monotonic()
+        gateway_stats = self._get_gateway_stats(gateway)
+        signage_point = self._signage_points.get(signage_point_hash)
+        if signage_point is None:
+            self._signage_points[signage_point_hash] = SignagePointArrival(first_arrival_at=now, first_gateway=gateway, gateways=[gateway])
+            if len(self._signage_points) > self._max_tracked_signage_points:
+                del self._signage_points[next(iter(self._signage_points))]
+            gateway_stats.arrivals += 1
+            gateway_stats.first_arrivals += 1
+            gateway_stats.lags.append(0.0)
+
+            return
+        if gateway in signage_point.gateways:
+            return
+        lag = now - signage_point.first_arrival_at
+        # The lead of the fastest gateway is its distance to the runner-up
+        if len(signage_point.gateways) == 1:
+            self._get_gateway_stats(signage_point.first_gateway).leads.append(lag)
+        signage_point.gateways.append(gateway)
+        gateway_stats.arrivals += 1
+        gateway_stats.lags.append(lag)
+
+    def get_median_lags(self) -> Dict[str, float]:
+        median_lags: Dict[str, float] = {}
+        for gateway, gateway_stats in self.gateway_stats.items():
+            median_lag = gateway_stats.lag_percentile(50)
+            if median_lag is not None:
+                median_lags[gateway] = median_lag
+
+        return median_lags
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {gateway: gateway_stats.to_dict() for gateway, gateway_stats in self.gateway_stats.items()}
+
+    def _get_gateway_stats(self, gateway: str) -> GatewayArrivalStats:
+        gateway_stats = self.gateway_stats.get(gateway)
+        if gateway_stats is None:
+            gateway_stats = GatewayArrivalStats()
+            self.gateway_stats[gateway] = gateway_stats
+
+        return gateway_stats
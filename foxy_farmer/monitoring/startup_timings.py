@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+from logging import Logger, getLogger
+from time import monotonic
+from typing import Dict, Any, Optional, Iterator
+
+
+class StartupTimings:
+    """ Times the phases of starting the farmer, so cold starts and restarts after an update can be compared. """
+    _started_at: Optional[float] = None
+    phases: Dict[str, float]
+    total_seconds: Optional[float] = None
+    update_downtime_seconds: Optional[float] = None
+    update_missed_signage_points: Optional[int] = None
+    _logger: Logger = getLogger("startup_timings")
+
+    def __init__(self):
+        self.phases = {}
+
+    def start(self) -> None:
+        self._started_at = monotonic()
+        self.phases = {}
+        self.total_seconds = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started_at = monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = monotonic() - started_at
+
+    def finish(self) -> None:
+        if self._started_at is None:
+            return
+        self.total_seconds = monotonic() - self._started_at
+        phases = ", ".join(f"{name}: {seconds:.2f}s" for name, seconds in self.phases.items())
+        self._logger.info(f"Started in {self.total_seconds:.2f}s ({phases})")
+
+    def record_update_downtime(self, downtime_seconds: float, missed_signage_points: int) -> None:
+        self.update_downtime_seconds = downtime_seconds
+        self.update_missed_signage_points = missed_signage_points
+        self._logger.info(f"Received no signage points for {downtime_seconds:.1f}s during the update, missed {missed_signage_points} signage points")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_seconds": self.total_seconds,
+            "phases": dict(self.phases),
+            "update_downtime_seconds": self.update_downtime_seconds,
+            "update_missed_signage_points": self.update_missed_signage_points,
+        }
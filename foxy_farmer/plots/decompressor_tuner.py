@@ -0,0 +1,306 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass
+from json import dump, load
+from logging import Logger, getLogger
+from multiprocessing import get_context
+from os import urandom
+from pathlib import Path
+from random import Random
+from time import perf_counter, time
+from typing import Dict, List, Any, Optional, Tuple
+
+from foxy_farmer.config.foxy_config import FoxyConfig
+from foxy_farmer.config.foxy_config_manager import FoxyConfigManager
+from foxy_farmer.plots.disk_benchmark import get_poisson_quantile
+from foxy_farmer.plots.plot_files import group_plots_by_compression_level
+from foxy_farmer.util.histogram import percentile_of_sorted
+
+max_supported_compression_level = 7
+
+
+@dataclass(frozen=True)
+class DecompressorSettings:
+    parallel_decompressor_count: int
+    decompressor_thread_count: int
+
+    @property
+    def total_threads(self) -> int:
+        return self.parallel_decompressor_count * self.decompressor_thread_count
+
+
+def get_candidate_settings(logical_cores: int) -> List[DecompressorSettings]:
+    thread_counts = sorted({max(1, logical_cores), max(1, logical_cores // 2), max(1, logical_cores // 4)}, reverse=True)
+
+    return [
+        DecompressorSettings(parallel_decompressor_count=context_count, decompressor_thread_count=thread_count)
+        for context_count in (1, 2, 4)
+        for thread_count in thread_counts
+        if context_count * thread_count <= max(1, logical_cores)
+    ]
+
+
+def run_decompressor_benchmark(
+    settings: DecompressorSettings,
+    plot_paths_by_level: Dict[int, List[str]],
+    burst_size: int,
+    rounds: int,
+    harvester_num_threads: int,
+    disable_cpu_affinity: bool,
+    decompressor_timeout: int,
+) -> Dict[str, Any]:
+    """ Runs in a dedicated process, the decompressor context queue of chiapos can only be initialized once per process. """
+    from chiapos import DiskProver, decompressor_context_queue
+
+    decompressor_context_queue.init(
+        settings.parallel_decompressor_count,
+        settings.decompressor_thread_count,
+        disable_cpu_affinity,
+        max_supported_compression_level,
+        False,
+        0,
+        False,
+        decompressor_timeout,
+    )
+    provers = []
+    for plot_paths in plot_paths_by_level.values():
+        for plot_path in plot_paths:
+            try:
+                prover = DiskProver(plot_path)
+            except Exception:
+                continue
+            provers.append((prover.get_compression_level(), prover))
+    random = Random()
+    lookup_seconds: Dict[int, List[float]] = {}
+    full_proof_seconds: Dict[int, List[float]] = {}
+    burst_seconds: List[float] = []
+
+    def get_qualities(level: int, prover: Any, challenge: bytes) -> List[bytes]:
+        started_at = perf_counter()
+        qualities = prover.get_qualities_for_challenge(challenge)
+        lookup_seconds.setdefault(level, []).append(perf_counter() - started_at)
+
+        return qualities
+
+    with ThreadPoolExecutor(max_workers=harvester_num_threads) as executor:
+        for _ in range(rounds if len(provers) > 0 else 0):
+            # Eligible plots of a signage point are looked up concurrently like the harvester does
+            burst = random.sample(provers, burst_size) if len(provers) >= burst_size else random.choices(provers, k=burst_size)
+            challenge = urandom(32)
+            started_at = perf_counter()
+            qualities_of_burst = list(executor.map(lambda plot: get_qualities(plot[0], plot[1], challenge), burst))
+            # Assume one quality per signage point passes the difficulty and requires the full proof
+            for (level, prover), qualities in zip(burst, qualities_of_burst):
+                if len(qualities) == 0:
+                    continue
+                full_proof_started_at = perf_counter()
+                prover.get_full_proof(challenge, 0, True)
+                full_proof_seconds.setdefault(level, []).append(perf_counter() - full_proof_started_at)
+                break
+            burst_seconds.append(perf_counter() - started_at)
+
+    return {
+        "lookup_seconds": {level: sorted(values) for level, values in lookup_seconds.items()},
+        "full_proof_seconds": {level: sorted(values) for level, values in full_proof_seconds.items()},
+        "burst_seconds": sorted(burst_seconds),
+    }
+
+
+def summarize(values: List[float]) -> Optional[Dict[str, float]]:
+    if len(values) == 0:
+        return None
+
+    return {
+        "p50": percentile_of_sorted(values, 50),
+        "p99": percentile_of_sorted(values, 99),
+        "max": values[-1],
+    }
+
+
+class DecompressorTuner:
+    """ Benchmarks decompressor settings on the compressed plots of this farm and picks the fastest one. """
+    _root_path: Path
+    _foxy_config: FoxyConfig
+    _rounds: int
+    _sample_plots_per_level: int
+    _plot_filter: int
+    _results_path: Path
+    _logger: Logger = getLogger("decompressor_tuner")
+
+    def __init__(
+        self,
+        root_path: Path,
+        foxy_config: FoxyConfig,
+        rounds: int = 10,
+        sample_plots_per_level: int = 8,
+        plot_filter: int = 512,
+    ):
+        self._root_path = root_path
+        self._foxy_config = foxy_config
+        self._rounds = rounds
+        self._sample_plots_per_level = sample_plots_per_level
+        self._plot_filter = plot_filter
+        self._results_path = root_path / "db" / "decompressor_tuning.json"
+
+    def get_fingerprint(self, plot_paths: List[Path]) -> Dict[str, Any]:
+        from chia.util.cpu import available_logical_cores
+
+        plots_by_compression_level = group_plots_by_compression_level(plot_paths)
+
+        return {
+            "cpu_count": available_logical_cores(),
+            "plot_mix": {str(level): len(paths) for level, paths in sorted(plots_by_compression_level.items()) if level > 0},
+        }
+
+    def needs_tuning(self, fingerprint: Dict[str, Any]) -> bool:
+        previous_result = self._load_previous_result()
+        if previous_result is None:
+            return True
+        previous_fingerprint = previous_result["fingerprint"]
+        if previous_fingerprint["cpu_count"] != fingerprint["cpu_count"]:
+            return True
+        previous_plot_mix: Dict[str, int] = previous_fingerprint["plot_mix"]
+        plot_mix: Dict[str, int] = fingerprint["plot_mix"]
+        if previous_plot_mix.keys() != plot_mix.keys():
+            return True
+
+        # Re-tune once the plot count of a compression level changed by more than 20%
+        return any(abs(plot_mix[level] - previous_count) > 0.2 * previous_count for level, previous_count in previous_plot_mix.items())
+
+    def tune(self, plot_paths: List[Path]) -> Optional[Dict[str, Any]]:
+        fingerprint = self.get_fingerprint(plot_paths)
+        plots_by_compression_level = {
+            level: paths
+            for level, paths in group_plots_by_compression_level(plot_paths).items()
+            if 0 < level <= max_supported_compression_level
+        }
+        if len(plots_by_compression_level) == 0:
+            self._logger.info("No compressed plots found, skipping the decompressor tuning")
+            self._save_result({"fingerprint": fingerprint, "tuned_at": time(), "settings": None, "candidates": []})
+
+            return None
+
+        random = Random()
+        sample_plot_paths_by_level = {
+            level: [str(path) for path in random.sample(paths, min(len(paths), self._sample_plots_per_level))]
+            for level, paths in plots_by_compression_level.items()
+        }
+        compressed_plot_count = sum(len(paths) for paths in plots_by_compression_level.values())
+        # Lookups needed for the signage point with the most eligible compressed plots in 99.9% of cases
+        burst_size = max(1, get_poisson_quantile(compressed_plot_count / self._plot_filter, 0.999))
+        lookup_time_budget_seconds = self._foxy_config.get("lookup_time_budget_seconds", 5)
+        candidates = get_candidate_settings(fingerprint["cpu_count"])
+        self._logger.info(
+            f"Tuning the decompressor on {compressed_plot_count} compressed plots, benchmarking {len(candidates)} settings "
+            f"with {burst_size} concurrent lookups per signage point .."
+        )
+
+        candidate_results: List[Tuple[DecompressorSettings, Dict[str, Any]]] = []
+        for settings in candidates:
+            try:
+                result = self._benchmark(settings, sample_plot_paths_by_level, burst_size)
+            except Exception as e:
+                self._logger.error(f"Benchmarking {settings} failed: {e}")
+                continue
+            if len(result["burst_seconds"]) == 0:
+                continue
+            worst_burst_seconds = result["burst_seconds"][-1]
+            self._logger.info(
+                f"{settings.parallel_decompressor_count} decompressors with {settings.decompressor_thread_count} threads: "
+                f"worst signage point lookup {worst_burst_seconds:.2f}s"
+            )
+            candidate_results.append((settings, result))
+        if len(candidate_results) == 0:
+            self._logger.error("Could not benchmark any decompressor settings, keeping the current settings")
+            # Otherwise every start would run the whole benchmark again, until the CPUs or plots change
+            self._save_result({"fingerprint": fingerprint, "tuned_at": time(), "settings": None, "candidates": []})
+
+            return None
+
+        best_worst_burst_seconds = min(result["burst_seconds"][-1] for _, result in candidate_results)
+        # Prefer fewer threads when they are about as fast, leaving cpu time for everything else
+        best_settings, best_result = min(
+            (
+                (settings, result)
+                for settings, result in candidate_results
+                if result["burst_seconds"][-1] <= best_worst_burst_seconds * 1.05
+            ),
+            key=lambda candidate: candidate[0].total_threads,
+        )
+        meets_lookup_time_budget = best_result["burst_seconds"][-1] <= lookup_time_budget_seconds
+        tuning_result = {
+            "fingerprint": fingerprint,
+            "tuned_at": time(),
+            "burst_size": burst_size,
+            "lookup_time_budget_seconds": lookup_time_budget_seconds,
+            "meets_lookup_time_budget": meets_lookup_time_budget,
+            "settings": {
+                "parallel_decompressor_count": best_settings.parallel_decompressor_count,
+                "decompressor_thread_count": best_settings.decompressor_thread_count,
+                "max_compression_level_allowed": max(plots_by_compression_level.keys()),
+            },
+            "candidates": [
+                {
+                    "parallel_decompressor_count": settings.parallel_decompressor_count,
+                    "decompressor_thread_count": settings.decompressor_thread_count,
+                    "burst_seconds": summarize(result["burst_seconds"]),
+                    "lookup_seconds": {str(level): summarize(values) for level, values in result["lookup_seconds"].items()},
+                    "full_proof_seconds": {str(level): summarize(values) for level, values in result["full_proof_seconds"].items()},
+                }
+                for settings, result in candidate_results
+            ],
+        }
+        self._save_result(tuning_result)
+        if not meets_lookup_time_budget:
+            self._logger.warning(
+                f"The fastest decompressor settings need {best_result['burst_seconds'][-1]:.2f}s for the worst case signage point, "
+                f"exceeding the lookup time budget of {lookup_time_budget_seconds}s. Consider GPU harvesting or less compressed plots."
+            )
+
+        return tuning_result
+
+    def apply(self, foxy_config_manager: FoxyConfigManager, tuning_result: Dict[str, Any]) -> None:
+        settings = tuning_result["settings"]
+        foxy_config = foxy_config_manager.load_config()
+        foxy_config["parallel_decompressor_count"] = settings["parallel_decompressor_count"]
+        foxy_config["decompressor_thread_count"] = settings["decompressor_thread_count"]
+        # Never lower the allowed level, plots with a higher level added later would fail to load until the next tuning
+        foxy_config["max_compression_level_allowed"] = max(
+            settings["max_compression_level_allowed"],
+            foxy_config.get("max_compression_level_allowed", settings["max_compression_level_allowed"]),
+        )
+        foxy_config_manager.save_config(foxy_config)
+        self._logger.info(
+            f"Using {settings['parallel_decompressor_count']} decompressors with {settings['decompressor_thread_count']} threads each"
+        )
+
+    def _benchmark(
+        self,
+        settings: DecompressorSettings,
+        sample_plot_paths_by_level: Dict[int, List[str]],
+        burst_size: int,
+    ) -> Dict[str, Any]:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            return executor.submit(
+                run_decompressor_benchmark,
+                settings,
+                sample_plot_paths_by_level,
+                burst_size,
+                self._rounds,
+                self._foxy_config.get("harvester_num_threads", 30),
+                self._foxy_config.get("disable_cpu_affinity", False),
+                self._foxy_config.get("decompressor_timeout", 20),
+            ).result()
+
+    def _load_previous_result(self) -> Optional[Dict[str, Any]]:
+        if not self._results_path.exists():
+            return None
+        try:
+            with open(self._results_path, "r") as results_file:
+                return load(results_file)
+        except (OSError, ValueError):
+            return None
+
+    def _save_result(self, tuning_result: Dict[str, Any]) -> None:
+        self._results_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._results_path, "w") as results_file:
+            dump(tuning_result, results_file, indent=2)
@@ -0,0 +1,176 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from math import exp, sqrt
+from os import stat, fstat
+from pathlib import Path
+from random import Random
+from time import perf_counter
+from typing import Dict, List, Any, Tuple
+
+from foxy_farmer.plots.mount_points import get_device_names
+from foxy_farmer.util.histogram import percentile_of_sorted
+
+try:
+    from os import posix_fadvise, POSIX_FADV_DONTNEED
+except ImportError:
+    # Not available on windows
+    posix_fadvise = None
+
+page_size = 4096
+
+
+@dataclass
+class DevicePlots:
+    device: str
+    plot_paths: List[Path] = field(default_factory=list)
+    directories: List[str] = field(default_factory=list)
+
+
+def group_plots_by_device(plot_paths: List[Path]) -> List[DevicePlots]:
+    device_names = get_device_names()
+    devices: Dict[str, DevicePlots] = {}
+    directory_devices: Dict[Path, str] = {}
+    for plot_path in plot_paths:
+        # Stat the directory only once, plots of a directory live on the same device
+        device = directory_devices.get(plot_path.parent)
+        if device is None:
+            try:
+                device_id = stat(plot_path.parent).st_dev
+            except OSError:
+                continue
+            device = device_names.get(device_id, str(device_id))
+            directory_devices[plot_path.parent] = device
+            device_plots = devices.get(device)
+            if device_plots is None:
+                device_plots = DevicePlots(device=device)
+                devices[device] = device_plots
+            device_plots.directories.append(str(plot_path.parent))
+        devices[device].plot_paths.append(plot_path)
+
+    return sorted(devices.values(), key=lambda device_plots: device_plots.device)
+
+
+def get_poisson_quantile(mean: float, quantile: float) -> int:
+    if mean <= 0:
+        return 0
+    if mean > 500:
+        # Normal approximation, the pmf underflows for large means
+        return int(mean + 3.09 * sqrt(mean) + 0.5)
+    probability = exp(-mean)
+    cumulative_probability = probability
+    k = 0
+    while cumulative_probability < quantile:
+        k += 1
+        probability *= mean / k
+        cumulative_probability += probability
+
+    return k
+
+
+@dataclass
+class DeviceBenchmarkResult:
+    device: str
+    plots: int
+    directories: List[str]
+    latencies: List[float]
+    errors: int
+
+    def to_dict(self, plot_filter: int, reads_per_lookup: int) -> Dict[str, Any]:
+        expected_eligible_plots = self.plots / plot_filter
+        # 99.9% of signage points have at most this many eligible plots on this device
+        worst_case_eligible_plots = get_poisson_quantile(expected_eligible_plots, 0.999)
+        latency_ms = None
+        expected_lookup_seconds = None
+        worst_case_lookup_seconds = None
+        if len(self.latencies) > 0:
+            latency_ms = {
+                "mean": sum(self.latencies) / len(self.latencies) * 1000,
+                "p50": percentile_of_sorted(self.latencies, 50) * 1000,
+                "p90": percentile_of_sorted(self.latencies, 90) * 1000,
+                "p99": percentile_of_sorted(self.latencies, 99) * 1000,
+                "max": self.latencies[-1] * 1000,
+            }
+            # Lookups of eligible plots on the same disk are served one after another
+            expected_lookup_seconds = expected_eligible_plots * reads_per_lookup * latency_ms["mean"] / 1000
+            worst_case_lookup_seconds = worst_case_eligible_plots * reads_per_lookup * latency_ms["p99"] / 1000
+
+        return {
+            "device": self.device,
+            "plots": self.plots,
+            "directories": self.directories,
+            "samples": len(self.latencies),
+            "errors": self.errors,
+            "latency_ms": latency_ms,
+            "expected_eligible_plots": expected_eligible_plots,
+            "worst_case_eligible_plots": worst_case_eligible_plots,
+            "expected_lookup_seconds": expected_lookup_seconds,
+            "worst_case_lookup_seconds": worst_case_lookup_seconds,
+        }
+
+
+class DiskBenchmark:
+    """ Measures the latency of random reads into the plot files of every device, devices are sampled in parallel. """
+    _read_size: int
+    _samples_per_device: int
+    _threads_per_device: int
+    _max_threads: int
+
+    def __init__(self, read_size: int, samples_per_device: int, threads_per_device: int, max_threads: int):
+        self._read_size = read_size
+        self._samples_per_device = samples_per_device
+        self._threads_per_device = threads_per_device
+        self._max_threads = max_threads
+
+    def run(self, devices: List[DevicePlots]) -> List[DeviceBenchmarkResult]:
+        if len(devices) == 0:
+            return []
+        jobs: List[Tuple[DevicePlots, int]] = []
+        for device_plots in devices:
+            for thread_index in range(self._threads_per_device):
+                samples = self._samples_per_device // self._threads_per_device
+                if thread_index < self._samples_per_device % self._threads_per_device:
+                    samples += 1
+                jobs.append((device_plots, samples))
+        with ThreadPoolExecutor(max_workers=min(len(jobs), self._max_threads), thread_name_prefix="bench_disks") as executor:
+            job_results = list(executor.map(lambda job: self._sample(*job), jobs))
+
+        results: Dict[str, DeviceBenchmarkResult] = {}
+        for (device_plots, _), (latencies, errors) in zip(jobs, job_results):
+            result = results.get(device_plots.device)
+            if result is None:
+                result = DeviceBenchmarkResult(
+                    device=device_plots.device,
+                    plots=len(device_plots.plot_paths),
+                    directories=device_plots.directories,
+                    latencies=[],
+                    errors=0,
+                )
+                results[device_plots.device] = result
+            result.latencies.extend(latencies)
+            result.errors += errors
+        for result in results.values():
+            result.latencies.sort()
+
+        return list(results.values())
+
+    def _sample(self, device_plots: DevicePlots, samples: int) -> Tuple[List[float], int]:
+        random = Random()
+        latencies: List[float] = []
+        errors = 0
+        for _ in range(samples):
+            plot_path = random.choice(device_plots.plot_paths)
+            try:
+                with open(plot_path, "rb", buffering=0) as plot_file:
+                    file_size = fstat(plot_file.fileno()).st_size
+                    offset = random.randrange(0, max(1, file_size - self._read_size)) // page_size * page_size
+                    if posix_fadvise is not None:
+                        # Drop cached pages so repeated runs measure the disk and not the page cache
+                        posix_fadvise(plot_file.fileno(), offset, self._read_size, POSIX_FADV_DONTNEED)
+                    started_at = perf_counter()
+                    plot_file.seek(offset)
+                    plot_file.read(self._read_size)
+                    latencies.append(perf_counter() - started_at)
+            except OSError:
+                errors += 1
+
+        return latencies, errors
@@ -0,0 +1,221 @@
+from concurrent.futures import ThreadPoolExecutor
+from logging import Logger, getLogger
+from os import stat
+from pathlib import Path
+from threading import Thread, Lock
+from time import perf_counter, monotonic
+from typing import Dict, List, Any, Optional, Set, Tuple
+
+from foxy_farmer.config.foxy_config import FoxyConfig
+from foxy_farmer.plots.mount_points import get_mount_points_below
+from foxy_farmer.plots.plot_inventory import PlotInventory
+from foxy_farmer.plots.plot_scanner import PlotScanner, ScanResult
+
+
+class IndexedPlotDiscovery:
+    """ Replaces the plot discovery of the harvester, seeded from the plot inventory and reconciled in the background. """
+    _root_path: Path
+    _inventory: PlotInventory
+    _scanner: PlotScanner
+    _harvester: Any
+    _executor: ThreadPoolExecutor
+    _mount_roots: List[str]
+    _reconcile_thread: Optional[Thread] = None
+    _plot_directories: List[Path]
+    _recursive: bool = False
+    _use_inventory_for_periodic_refresh: bool = True
+    _incremental_refresh_requested: bool = False
+    _full_listing_interval_seconds: float
+    _last_full_listing_at: Optional[float] = None
+    _lock: Lock
+    _logger: Logger = getLogger("indexed_plot_discovery")
+
+    def __init__(
+        self,
+        root_path: Path,
+        inventory: PlotInventory,
+        harvester: Any,
+        exclude_globs: Optional[List[str]] = None,
+        mount_roots: Optional[List[str]] = None,
+        max_scan_threads: int = 32,
+        full_listing_interval_seconds: float = 21600,
+    ):
+        self._root_path = root_path
+        self._inventory = inventory
+        self._scanner = PlotScanner(inventory, exclude_globs=exclude_globs)
+        self._harvester = harvester
+        self._mount_roots = mount_roots or []
+        self._full_listing_interval_seconds = full_listing_interval_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_scan_threads, thread_name_prefix="plot_scan")
+        self._lock = Lock()
+        self._plot_directories = []
+
+    @property
+    def inventory(self) -> PlotInventory:
+        return self._inventory
+
+    @property
+    def plot_directories(self) -> List[Path]:
+        return self._plot_directories
+
+    @property
+    def recursive(self) -> bool:
+        return self._recursive
+
+    def request_refresh(self) -> None:
+        """ Refreshes the plots using the inventory, only directories with a changed mtime are listed. """
+        self._incremental_refresh_requested = True
+        self._harvester.plot_manager.trigger_refresh()
+
+    def enable_consistency_checks(self) -> None:
+        """ Lists all directories on periodic refreshes, used when changes are picked up by watching the directories. """
+        self._use_inventory_for_periodic_refresh = False
+
+    def get_plot_filenames(self, root_path: Path) -> Dict[Path, List[Path]]:
+        # Signature of `chia.plotting.util.get_plot_filenames`, called from the plot manager refresh thread
+        with self._lock:
+            is_initial = self._reconcile_thread is None
+            use_inventory = is_initial or self._incremental_refresh_requested or (
+                self._use_inventory_for_periodic_refresh and not self._is_full_listing_due()
+            )
+            self._incremental_refresh_requested = False
+            plot_filenames = self._discover(root_path, use_inventory=use_inventory, log_result=is_initial or not use_inventory)
+            if is_initial:
+                self._reconcile_thread = Thread(target=self._reconcile, args=(plot_filenames,), daemon=True)
+                self._reconcile_thread.start()
+
+        return plot_filenames
+
+    def _is_full_listing_due(self) -> bool:
+        # Directory mtimes are not reliable on every filesystem (eg. some network shares), so list everything regularly
+        return self._last_full_listing_at is None or monotonic() - self._last_full_listing_at >= self._full_listing_interval_seconds
+
+    def _reconcile(self, indexed_plot_filenames: Dict[Path, List[Path]]) -> None:
+        # List everything once after startup, the inventory might be outdated on filesystems with unreliable mtimes
+        try:
+            plot_filenames = self._discover(self._root_path, use_inventory=False, log_result=False)
+        except Exception as e:
+            self._logger.error(f"Reconciling the plot inventory failed: {e}")
+
+            return
+        # Drop directories which are no longer configured or are excluded now
+        self._inventory.retain_directories([str(directory) for directory in self._plot_directories])
+        indexed_plot_paths = get_plot_paths(indexed_plot_filenames)
+        plot_paths = get_plot_paths(plot_filenames)
+        if plot_paths == indexed_plot_paths:
+            self._logger.info(f"Plot inventory is up to date ({len(plot_paths)} plots)")
+
+            return
+        self._logger.info(
+            f"Plot inventory was outdated ({len(plot_paths - indexed_plot_paths)} added, "
+            f"{len(indexed_plot_paths - plot_paths)} removed plots), refreshing plots"
+        )
+        self.request_refresh()
+
+    def _discover(self, root_path: Path, use_inventory: bool, log_result: bool) -> Dict[Path, List[Path]]:
+        from chia.plotting.util import get_plot_directories
+        from chia.util.config import load_config
+
+        started_at = perf_counter()
+        config = load_config(root_path, "config.yaml")
+        recursive_scan: bool = config["harvester"].get("recursive_plot_scan", False)
+        recursive_follow_links: bool = config["harvester"].get("recursive_follow_links", False)
+        plot_filenames: Dict[Path, List[Path]] = {}
+        listed_directories = 0
+        skipped_directories = 0
+        directories: List[Path] = []
+        for directory_name in [*get_plot_directories(root_path, config), *get_mount_points_below(self._mount_roots)]:
+            try:
+                directory = Path(directory_name).resolve()
+            except (OSError, RuntimeError) as e:
+                self._logger.warning(f"Failed to resolve {directory_name}: {e}")
+                continue
+            if self._scanner.is_excluded(str(directory)) or directory in directories:
+                continue
+            directories.append(directory)
+        self._plot_directories = directories
+        self._recursive = recursive_scan
+        # Every mount point is walked by its own thread, directories on the same disk are walked one after another
+        scan_results = self._executor.map(
+            lambda mount_directories: self._scan_mount_point(mount_directories, recursive_scan, recursive_follow_links, use_inventory),
+            group_by_mount_point(directories),
+        )
+        mount_points = 0
+        for mount_scan_results in scan_results:
+            mount_points += 1
+            for directory, result in mount_scan_results:
+                plot_filenames[directory] = result.plot_paths
+                listed_directories += result.listed_directories
+                skipped_directories += result.skipped_directories
+        if not use_inventory:
+            self._last_full_listing_at = monotonic()
+        if log_result:
+            self._logger.info(
+                f"Found {len(get_plot_paths(plot_filenames))} plots on {mount_points} mount points in {perf_counter() - started_at:.2f}s "
+                f"({listed_directories} directories listed, {skipped_directories} unchanged directories taken from the plot inventory)"
+            )
+
+        return plot_filenames
+
+    def _scan_mount_point(
+        self,
+        directories: List[Path],
+        recursive: bool,
+        follow_links: bool,
+        use_inventory: bool,
+    ) -> List[Tuple[Path, ScanResult]]:
+        return [
+            (directory, self._scanner.scan(directory, recursive, follow_links, use_inventory=use_inventory))
+            for directory in directories
+        ]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._inventory.close()
+
+
+def group_by_mount_point(directories: List[Path]) -> List[List[Path]]:
+    directories_by_device: Dict[int, List[Path]] = {}
+    for directory in directories:
+        try:
+            device = stat(directory).st_dev
+        except OSError:
+            # Let the scanner report the missing directory
+            device = -1
+        directories_by_device.setdefault(device, []).append(directory)
+
+    return list(directories_by_device.values())
+
+
+def get_plot_paths(plot_filenames: Dict[Path, List[Path]]) -> Set[Path]:
+    plot_paths: Set[Path] = set()
+    for paths in plot_filenames.values():
+        plot_paths.update(paths)
+
+    return plot_paths
+
+
+def install_plot_inventory_hooks(root_path: Path, harvester: Any, farmer_config: FoxyConfig) -> IndexedPlotDiscovery:
+    import chia.plotting.manager
+
+    inventory = PlotInventory(root_path / "db" / "plot_inventory.sqlite")
+    discovery = IndexedPlotDiscovery(
+        root_path,
+        inventory,
+        harvester,
+        exclude_globs=farmer_config.get("plot_scan_exclude_globs"),
+        mount_roots=farmer_config.get("plot_mount_roots"),
+        full_listing_interval_seconds=farmer_config.get("plot_consistency_check_interval_seconds", 21600),
+    )
+    # The plot manager looks up the module global on every refresh
+    chia.plotting.manager.get_plot_filenames = discovery.get_plot_filenames
+
+    return discovery
+
+
+def uninstall_plot_inventory_hooks(discovery: IndexedPlotDiscovery) -> None:
+    import chia.plotting.manager
+    from chia.plotting.util import get_plot_filenames
+
+    chia.plotting.manager.get_plot_filenames = get_plot_filenames
+    discovery.close()
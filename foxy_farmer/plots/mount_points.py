@@ -0,0 +1,60 @@
+from os import sep
+from pathlib import Path
+from re import compile
+from typing import List, Dict
+
+escaped_character_pattern = compile(r"\\([0-7]{3})")
+
+
+def get_mount_points() -> List[str]:
+    """ Returns the current mount points on Linux, reading them causes no disk I/O. """
+    try:
+        with open("/proc/self/mounts", "r") as mounts_file:
+            lines = mounts_file.readlines()
+    except OSError:
+        return []
+    mount_points: List[str] = []
+    for line in lines:
+        fields = line.split(" ")
+        if len(fields) < 2:
+            continue
+        mount_points.append(unescape(fields[1]))
+
+    return mount_points
+
+
+def get_mount_points_below(mount_roots: List[str]) -> List[str]:
+    if len(mount_roots) == 0:
+        return []
+    prefixes = tuple(f"{str(Path(mount_root).resolve()).rstrip(sep)}{sep}" for mount_root in mount_roots)
+
+    return sorted({mount_point for mount_point in get_mount_points() if mount_point.startswith(prefixes)})
+
+
+def get_device_names() -> Dict[int, str]:
+    """ Maps device ids (`st_dev`) to the mounted device, eg. `/dev/sdb1`, on Linux. """
+    from os import makedev
+
+    try:
+        with open("/proc/self/mountinfo", "r") as mountinfo_file:
+            lines = mountinfo_file.readlines()
+    except OSError:
+        return {}
+    device_names: Dict[int, str] = {}
+    for line in lines:
+        # Format: id parent major:minor root mount_point options [optional fields] - fs_type source super_options
+        fields = line.split(" ")
+        try:
+            separator_index = fields.index("-")
+            major, minor = fields[2].split(":")
+            source = unescape(fields[separator_index + 2])
+        except (ValueError, IndexError):
+            continue
+        device_names.setdefault(makedev(int(major), int(minor)), source)
+
+    return device_names
+
+
+def unescape(value: str) -> str:
+    # Whitespace in mount points is escaped as octal, eg. `\040` for a space
+    return escaped_character_pattern.sub(lambda match: chr(int(match.group(1), 8)), value)
@@ -0,0 +1,151 @@
+from dataclasses import replace
+from logging import Logger, getLogger
+from pathlib import Path
+from threading import Thread, Event
+from time import monotonic
+from typing import Any, Dict, List, Optional
+
+from foxy_farmer.plots.indexed_plot_discovery import IndexedPlotDiscovery
+from foxy_farmer.plots.mount_points import get_mount_points
+
+
+class PlotDirectoryWatcher:
+    """ Refreshes the plots of the embedded harvester as soon as plots are added or removed, using inotify on Linux. """
+    _discovery: IndexedPlotDiscovery
+    _harvester: Any
+    _consistency_check_interval_seconds: int
+    _debounce_seconds: float
+    _sync_interval_seconds: float = 10
+    _observer: Optional[Any] = None
+    _watches: Dict[Path, Any]
+    _watches_recursive: bool = False
+    _mount_points: List[str]
+    _last_change_at: Optional[float] = None
+    _stop_event: Event
+    _thread: Optional[Thread] = None
+    _logger: Logger = getLogger("plot_directory_watcher")
+
+    def __init__(
+        self,
+        discovery: IndexedPlotDiscovery,
+        harvester: Any,
+        consistency_check_interval_seconds: int,
+        debounce_seconds: float = 2,
+    ):
+        self._discovery = discovery
+        self._harvester = harvester
+        self._consistency_check_interval_seconds = consistency_check_interval_seconds
+        self._debounce_seconds = debounce_seconds
+        self._watches = {}
+        self._mount_points = []
+        self._stop_event = Event()
+
+    def start(self) -> bool:
+        from chia_rs.sized_ints import uint32
+
+        try:
+            from watchdog.observers.inotify import InotifyObserver
+        except Exception as e:
+            self._logger.warning(f"Watching plot directories is not supported on this platform, falling back to periodic plot refreshes: {e}")
+
+            return False
+        self._observer = InotifyObserver()
+        self._observer.start()
+        self._mount_points = get_mount_points()
+        # Changes are picked up by the watcher, the periodic refresh only serves as a consistency check now
+        plot_manager = self._harvester.plot_manager
+        plot_manager.refresh_parameter = replace(
+            plot_manager.refresh_parameter,
+            interval_seconds=uint32(self._consistency_check_interval_seconds),
+        )
+        self._discovery.enable_consistency_checks()
+        self._thread = Thread(target=self._run, name="plot_directory_watcher", daemon=True)
+        self._thread.start()
+
+        return True
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def dispatch(self, event: Any) -> None:
+        # Called from the observer thread for every event, see `watchdog.events.FileSystemEventHandler`
+        if event.is_directory or is_plot_path(event.src_path) or is_plot_path(getattr(event, "dest_path", "")):
+            self._last_change_at = monotonic()
+
+    def _run(self) -> None:
+        last_sync_at: Optional[float] = None
+        while not self._stop_event.wait(timeout=0.5):
+            try:
+                now = monotonic()
+                if last_sync_at is None or now - last_sync_at >= self._sync_interval_seconds:
+                    last_sync_at = now
+                    self._sync()
+                # Wait until changes settle, copying or moving many plots causes bursts of events
+                last_change_at = self._last_change_at
+                if last_change_at is not None and now - last_change_at >= self._debounce_seconds:
+                    self._last_change_at = None
+                    self._logger.debug("Plot directories changed, refreshing plots")
+                    self._discovery.request_refresh()
+            except Exception as e:
+                self._logger.error(f"Watching the plot directories failed: {e}")
+
+    def _sync(self) -> None:
+        mount_points = get_mount_points()
+        if mount_points != self._mount_points:
+            self._mount_points = mount_points
+            self._logger.info("Mount points changed, refreshing plots")
+            self._discovery.request_refresh()
+
+        plot_directories = set(self._discovery.plot_directories)
+        recursive = self._discovery.recursive
+        if recursive != self._watches_recursive:
+            plot_directories_to_unwatch = list(self._watches.keys())
+            self._watches_recursive = recursive
+        else:
+            plot_directories_to_unwatch = [directory for directory in self._watches.keys() if directory not in plot_directories]
+        for directory in plot_directories_to_unwatch:
+            try:
+                self._observer.unschedule(self._watches.pop(directory))
+            except Exception:
+                # The watch is gone already when the directory was removed or unmounted
+                pass
+        for directory in plot_directories:
+            if directory in self._watches or not directory.is_dir():
+                continue
+            self._watches[directory] = self._schedule(directory, recursive)
+
+    def _schedule(self, directory: Path, recursive: bool) -> Optional[Any]:
+        from watchdog.events import DirCreatedEvent, DirDeletedEvent, DirMovedEvent, FileClosedEvent, \
+            FileDeletedEvent, FileMovedEvent
+
+        try:
+            # Only subscribe to events which can add or remove plots, opening plots for lookups must not cause events.
+            # Created files are picked up once closed after writing to not load partially copied plots.
+            return self._observer.schedule(
+                self,
+                str(directory),
+                recursive=recursive,
+                event_filter=[
+                    FileClosedEvent,
+                    FileDeletedEvent,
+                    FileMovedEvent,
+                    DirCreatedEvent,
+                    DirDeletedEvent,
+                    DirMovedEvent,
+                ],
+            )
+        except OSError as e:
+            self._logger.warning(f"Could not watch {directory}, changes are picked up by the consistency check: {e}")
+
+            return None
+
+
+def is_plot_path(path: str) -> bool:
+    return path.endswith(".plot")
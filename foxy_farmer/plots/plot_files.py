@@ -0,0 +1,32 @@
+from pathlib import Path
+from re import compile
+from typing import List, Dict
+
+from foxy_farmer.config.foxy_config import FoxyConfig
+
+# BladeBit names compressed plots `plot-k32-c05-...`
+compression_level_pattern = compile(r"^plot-k\d+-c(\d+)-")
+
+
+def get_configured_plot_paths(foxy_config: FoxyConfig) -> List[Path]:
+    from chia.plotting.util import get_filenames
+
+    plot_paths: List[Path] = []
+    for plot_directory in foxy_config.get("plot_directories", []):
+        plot_paths.extend(get_filenames(Path(plot_directory).resolve(), foxy_config.get("recursive_plot_scan", False), False))
+
+    return plot_paths
+
+
+def get_compression_level_from_filename(plot_path: Path) -> int:
+    match = compression_level_pattern.match(plot_path.name)
+
+    return int(match.group(1)) if match is not None else 0
+
+
+def group_plots_by_compression_level(plot_paths: List[Path]) -> Dict[int, List[Path]]:
+    plots_by_compression_level: Dict[int, List[Path]] = {}
+    for plot_path in plot_paths:
+        plots_by_compression_level.setdefault(get_compression_level_from_filename(plot_path), []).append(plot_path)
+
+    return plots_by_compression_level
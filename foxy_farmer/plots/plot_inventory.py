@@ -0,0 +1,107 @@
+import json
+import sqlite3
+from dataclasses import dataclass
+from os import sep
+from pathlib import Path
+from threading import Lock
+from typing import List, Optional, Iterable
+
+
+@dataclass
+class IndexedPlot:
+    path: str
+    size: int
+    mtime: int
+    plot_id: Optional[str]
+
+
+@dataclass
+class IndexedDirectory:
+    path: str
+    mtime_ns: int
+    subdirectories: List[str]
+    plot_paths: List[str]
+
+
+class PlotInventory:
+    """ Persists the plot files found per directory, so directories which did not change need not be listed again. """
+    _db_path: Path
+    _connection: sqlite3.Connection
+    _lock: Lock
+
+    def __init__(self, db_path: Path):
+        self._db_path = db_path
+        self._lock = Lock()
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Used from the plot refresh thread and the reconcile thread, access is serialized by the lock
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, subdirectories TEXT NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS plots ("
+                "path TEXT PRIMARY KEY, directory TEXT NOT NULL, size INTEGER NOT NULL, mtime INTEGER NOT NULL, plot_id TEXT"
+                ")"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS plots_directory ON plots (directory)")
+
+    def get_directory(self, path: str) -> Optional[IndexedDirectory]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT mtime_ns, subdirectories FROM directories WHERE path = ?",
+                (path,),
+            ).fetchone()
+            if row is None:
+                return None
+            plot_paths = [plot_row[0] for plot_row in self._connection.execute("SELECT path FROM plots WHERE directory = ?", (path,))]
+
+        return IndexedDirectory(path=path, mtime_ns=row[0], subdirectories=json.loads(row[1]), plot_paths=plot_paths)
+
+    def update_directory(self, path: str, mtime_ns: int, subdirectories: List[str], plots: List[IndexedPlot]) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO directories (path, mtime_ns, subdirectories) VALUES (?, ?, ?)",
+                (path, mtime_ns, json.dumps(subdirectories)),
+            )
+            self._connection.execute("DELETE FROM plots WHERE directory = ?", (path,))
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO plots (path, directory, size, mtime, plot_id) VALUES (?, ?, ?, ?, ?)",
+                [(plot.path, path, plot.size, plot.mtime, plot.plot_id) for plot in plots],
+            )
+
+    def remove_directories(self, paths: Iterable[str]) -> None:
+        """ Removes the directories including all their subdirectories. """
+        with self._lock, self._connection:
+            for path in paths:
+                prefix = f"{path}{sep}"
+                self._connection.execute(
+                    "DELETE FROM directories WHERE path = ? OR substr(path, 1, ?) = ?",
+                    (path, len(prefix), prefix),
+                )
+                self._connection.execute(
+                    "DELETE FROM plots WHERE directory = ? OR substr(directory, 1, ?) = ?",
+                    (path, len(prefix), prefix),
+                )
+
+    def retain_directories(self, paths: List[str]) -> None:
+        """ Removes all directories which are not one of or below the given directories. """
+        prefixes = tuple(f"{path}{sep}" for path in paths)
+        with self._lock, self._connection:
+            indexed_paths = [row[0] for row in self._connection.execute("SELECT path FROM directories")]
+            # Only remove the stale rows themselves, a stale parent directory may contain retained directories
+            for path in indexed_paths:
+                if path in paths or path.startswith(prefixes):
+                    continue
+                self._connection.execute("DELETE FROM directories WHERE path = ?", (path,))
+                self._connection.execute("DELETE FROM plots WHERE directory = ?", (path,))
+
+    def get_plot_count(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM plots").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
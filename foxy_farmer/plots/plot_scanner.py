@@ -0,0 +1,115 @@
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from logging import Logger, getLogger
+from os import scandir, stat
+from pathlib import Path
+from re import compile
+from typing import List, Optional, Set, Iterable
+
+from foxy_farmer.plots.plot_inventory import PlotInventory, IndexedPlot
+
+plot_id_pattern = compile(r"([0-9a-fA-F]{64})\.plot$")
+
+
+def get_plot_id_from_filename(filename: str) -> Optional[str]:
+    match = plot_id_pattern.search(filename)
+
+    return match.group(1).lower() if match is not None else None
+
+
+@dataclass
+class ScanResult:
+    plot_paths: List[Path] = field(default_factory=list)
+    listed_directories: int = 0
+    skipped_directories: int = 0
+
+
+class PlotScanner:
+    """ Finds the plot files of a plot directory, directories with an unchanged mtime are taken from the inventory. """
+    _inventory: PlotInventory
+    _exclude_globs: List[str]
+    _logger: Logger = getLogger("plot_scanner")
+
+    def __init__(self, inventory: PlotInventory, exclude_globs: Optional[List[str]] = None):
+        self._inventory = inventory
+        self._exclude_globs = exclude_globs or []
+
+    def is_excluded(self, path: str) -> bool:
+        name = Path(path).name
+
+        return any(fnmatch(path, exclude_glob) or fnmatch(name, exclude_glob) for exclude_glob in self._exclude_globs)
+
+    def _filter_excluded(self, paths: Iterable[str]) -> List[str]:
+        if len(self._exclude_globs) == 0:
+            return list(paths)
+
+        return [path for path in paths if not self.is_excluded(path)]
+
+    def scan(self, directory: Path, recursive: bool, follow_links: bool, use_inventory: bool = True) -> ScanResult:
+        result = ScanResult()
+        pending_directories = [str(directory)]
+        visited_directories: Set[str] = set()
+        while len(pending_directories) > 0:
+            current_directory = pending_directories.pop()
+            try:
+                directory_stat = stat(current_directory)
+            except OSError as e:
+                if current_directory == str(directory):
+                    self._logger.warning(f"Directory: {current_directory} does not exist or is not accessible: {e}")
+                self._inventory.remove_directories([current_directory])
+                continue
+            # Guards against symlink loops when following links
+            directory_key = f"{directory_stat.st_dev}:{directory_stat.st_ino}"
+            if directory_key in visited_directories:
+                continue
+            visited_directories.add(directory_key)
+
+            indexed_directory = self._inventory.get_directory(current_directory)
+            # Adding, removing or renaming entries updates the mtime of the containing directory
+            if use_inventory and indexed_directory is not None and indexed_directory.mtime_ns == directory_stat.st_mtime_ns:
+                plot_paths = indexed_directory.plot_paths
+                subdirectories = indexed_directory.subdirectories
+                result.skipped_directories += 1
+            else:
+                subdirectories, plots = self._list_directory(current_directory, recursive, follow_links)
+                self._inventory.update_directory(current_directory, directory_stat.st_mtime_ns, subdirectories, plots)
+                if indexed_directory is not None:
+                    removed_subdirectories = set(indexed_directory.subdirectories) - set(subdirectories)
+                    if len(removed_subdirectories) > 0:
+                        self._inventory.remove_directories(removed_subdirectories)
+                plot_paths = [plot.path for plot in plots]
+                result.listed_directories += 1
+            # Excludes are applied after the inventory lookup, so changing them does not require a rescan
+            result.plot_paths.extend(Path(plot_path) for plot_path in self._filter_excluded(plot_paths))
+            if recursive:
+                pending_directories.extend(self._filter_excluded(subdirectories))
+
+        return result
+
+    def _list_directory(self, directory: str, recursive: bool, follow_links: bool) -> (List[str], List[IndexedPlot]):
+        subdirectories: List[str] = []
+        plots: List[IndexedPlot] = []
+        try:
+            with scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.name.endswith(".plot"):
+                            if entry.name.startswith("._") or not entry.is_file():
+                                continue
+                            entry_stat = entry.stat()
+                            # Like `get_filenames` of chia, which only resolves links when scanning recursively
+                            plot_path = str(Path(entry.path).resolve()) if recursive and follow_links else entry.path
+                            plots.append(IndexedPlot(
+                                path=plot_path,
+                                size=entry_stat.st_size,
+                                mtime=int(entry_stat.st_mtime),
+                                plot_id=get_plot_id_from_filename(entry.name),
+                            ))
+                        elif recursive and entry.is_dir(follow_symlinks=follow_links):
+                            subdirectories.append(entry.path)
+                    except OSError as e:
+                        self._logger.warning(f"Error reading {entry.path}: {e}")
+        except OSError as e:
+            self._logger.warning(f"Error reading directory {directory}: {e}")
+
+        return subdirectories, plots
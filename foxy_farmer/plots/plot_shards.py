@@ -0,0 +1,50 @@
+from os import stat
+from typing import Dict, List, Union
+
+from foxy_farmer.plots.mount_points import get_mount_points_below
+
+
+def group_directories_by_device(directories: List[str]) -> List[List[str]]:
+    directories_by_device: Dict[str, List[str]] = {}
+    for directory in directories:
+        try:
+            device = str(stat(directory).st_dev)
+        except OSError:
+            # Unavailable directories can not be grouped, keep them on their own
+            device = directory
+        directories_by_device.setdefault(device, []).append(directory)
+
+    return list(directories_by_device.values())
+
+
+def assign_directories_to_shards(directories: List[str], shard_count: int) -> List[List[str]]:
+    """ Distributes the directories evenly over the shards, keeping the directories of a device in one shard if possible. """
+    device_groups = group_directories_by_device(directories)
+    groups = device_groups if len(device_groups) >= shard_count else [[directory] for directory in directories]
+    shards: List[List[str]] = [[] for _ in range(min(shard_count, len(groups)))]
+    for group in sorted(groups, key=len, reverse=True):
+        min(shards, key=len).extend(group)
+
+    return [shard for shard in shards if len(shard) > 0]
+
+
+def get_shard_plot_directories(
+    plot_directories: List[str],
+    mount_roots: List[str],
+    shards: Union[int, str, List[List[str]]],
+    logical_cores: int,
+) -> List[List[str]]:
+    if isinstance(shards, list):
+        return [[str(directory) for directory in shard] for shard in shards if len(shard) > 0]
+    # Mounts below the mount roots are assigned on startup, a disk mounted later needs a restart to be farmed
+    directories = list(dict.fromkeys([*plot_directories, *get_mount_points_below(mount_roots)]))
+    if len(directories) == 0:
+        return []
+    if shards == "auto":
+        shard_count = min(len(group_directories_by_device(directories)), logical_cores)
+    else:
+        shard_count = int(shards)
+    if shard_count <= 1:
+        return [directories]
+
+    return assign_directories_to_shards(directories, shard_count)
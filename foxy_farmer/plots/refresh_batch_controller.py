@@ -0,0 +1,154 @@
+from collections import deque
+from dataclasses import replace
+from logging import Logger, getLogger
+from time import monotonic
+from typing import Any, Deque, Iterator, List, Optional, Tuple
+
+from foxy_farmer.monitoring.harvester_lookup_stats import HarvesterLookupStats
+from foxy_farmer.util.histogram import percentile_of_sorted
+
+
+class RefreshBatchController:
+    """ Adapts the plot refresh batch size and sleep of the embedded harvester to the plot lookup latency. """
+    _harvester: Any
+    _harvester_lookup_stats: HarvesterLookupStats
+    _lookup_latency_target_seconds: float
+    _min_batch_size: int
+    _max_batch_size: int
+    _min_batch_sleep_ms: int
+    _max_batch_sleep_ms: int
+    _baseline_window_seconds: float = 300
+    _lookups: Deque[Tuple[float, float]]
+    _baseline_lookup_seconds: Optional[float] = None
+    _last_adjusted_at: Optional[float] = None
+    _refresh_started_at: Optional[float] = None
+    _refresh_processed: int = 0
+    _original_to_batches: Optional[Any] = None
+    batch_size: int
+    batch_sleep_ms: int
+    _logger: Logger = getLogger("refresh_batch_controller")
+
+    def __init__(
+        self,
+        harvester: Any,
+        harvester_lookup_stats: HarvesterLookupStats,
+        lookup_latency_target_seconds: float,
+        min_batch_size: int = 10,
+        max_batch_size: int = 2000,
+        min_batch_sleep_ms: int = 0,
+        max_batch_sleep_ms: int = 10000,
+    ):
+        self._harvester = harvester
+        self._harvester_lookup_stats = harvester_lookup_stats
+        self._lookup_latency_target_seconds = lookup_latency_target_seconds
+        self._min_batch_size = min_batch_size
+        self._max_batch_size = max_batch_size
+        self._min_batch_sleep_ms = min_batch_sleep_ms
+        self._max_batch_sleep_ms = max_batch_sleep_ms
+        self._lookups = deque(maxlen=10000)
+        refresh_parameter = harvester.plot_manager.refresh_parameter
+        # The configured values serve as starting point
+        self.batch_size = min(max(int(refresh_parameter.batch_size), min_batch_size), max_batch_size)
+        self.batch_sleep_ms = min(max(int(refresh_parameter.batch_sleep_milliseconds), min_batch_sleep_ms), max_batch_sleep_ms)
+
+    def install(self) -> None:
+        import chia.plotting.manager
+
+        self._original_to_batches = chia.plotting.manager.to_batches
+        chia.plotting.manager.to_batches = self.to_batches
+        self._harvester_lookup_stats.add_plot_lookup_listener(self.observe_plot_lookup)
+
+    def uninstall(self) -> None:
+        import chia.plotting.manager
+
+        self._harvester_lookup_stats.remove_plot_lookup_listener(self.observe_plot_lookup)
+        if self._original_to_batches is not None:
+            chia.plotting.manager.to_batches = self._original_to_batches
+            self._original_to_batches = None
+
+    def observe_plot_lookup(self, _plot_directory: str, lookup_seconds: float) -> None:
+        # Called from the harvester threads, appending to a deque is thread safe
+        self._lookups.append((monotonic(), lookup_seconds))
+
+    def to_batches(self, to_split: Any, _batch_size: int) -> Iterator[Any]:
+        """ Replaces `to_batches` of the plot manager, the batch size is re-evaluated before every batch. """
+        from chia.util.batches import Batch
+
+        entries = list(to_split)
+        self._on_refresh_started()
+        # Every periodic refresh passes all plots, only the initial refresh actually loads them
+        log = self._logger.info if self._harvester.plot_manager.initial_refresh() else self._logger.debug
+        start = 0
+        while start < len(entries):
+            self._adjust()
+            end = min(start + self.batch_size, len(entries))
+            if end == len(entries) and start > 0:
+                # The plot manager stops iterating after the last batch
+                log(
+                    f"Processed {start} of {len(entries)} plots in {monotonic() - self._refresh_started_at:.2f}s, "
+                    f"loading the last {end - start} plots with batches of {self.batch_size} plots and {self.batch_sleep_ms}ms sleep"
+                )
+            yield Batch(len(entries) - end, entries[start:end])
+            self._refresh_processed += end - start
+            start = end
+
+    def _on_refresh_started(self) -> None:
+        now = monotonic()
+        self._refresh_started_at = now
+        self._refresh_processed = 0
+        # Lookups outside of refreshes show what the disks deliver without the refresh competing for them
+        baseline_lookups = sorted(
+            lookup_seconds
+            for observed_at, lookup_seconds in list(self._lookups)
+            if now - observed_at <= self._baseline_window_seconds
+        )
+        if len(baseline_lookups) > 0:
+            self._baseline_lookup_seconds = percentile_of_sorted(baseline_lookups, 90)
+        self._last_adjusted_at = now
+
+    def _get_recent_lookups(self, since: float) -> List[float]:
+        return sorted(lookup_seconds for observed_at, lookup_seconds in list(self._lookups) if observed_at >= since)
+
+    def _get_high_latency_threshold(self) -> float:
+        if self._baseline_lookup_seconds is None:
+            return self._lookup_latency_target_seconds
+
+        # Back off once the refresh noticeably slows down lookups, but never above the target
+        return min(self._lookup_latency_target_seconds, max(2 * self._baseline_lookup_seconds, 0.05))
+
+    def _adjust(self) -> None:
+        now = monotonic()
+        last_adjusted_at = self._last_adjusted_at if self._last_adjusted_at is not None else now
+        self._last_adjusted_at = now
+        if self._refresh_processed == 0:
+            return
+        recent_lookups = self._get_recent_lookups(since=last_adjusted_at)
+        batch_size = self.batch_size
+        batch_sleep_ms = self.batch_sleep_ms
+        if len(recent_lookups) > 0 and percentile_of_sorted(recent_lookups, 90) > self._get_high_latency_threshold():
+            batch_size = max(self._min_batch_size, batch_size // 2)
+            batch_sleep_ms = min(self._max_batch_sleep_ms, max(batch_sleep_ms * 2, 100))
+        elif len(recent_lookups) == 0 or percentile_of_sorted(recent_lookups, 90) <= self._get_high_latency_threshold() / 2:
+            # Disks are idle or lookups are unaffected, load plots faster
+            batch_size = min(self._max_batch_size, batch_size + max(batch_size // 2, 10))
+            batch_sleep_ms = max(self._min_batch_sleep_ms, batch_sleep_ms // 2)
+        if batch_size == self.batch_size and batch_sleep_ms == self.batch_sleep_ms:
+            return
+        self._logger.debug(
+            f"Adjusted the plot refresh to batches of {batch_size} plots with {batch_sleep_ms}ms sleep "
+            f"({self._refresh_processed} plots processed in {now - self._refresh_started_at:.2f}s)"
+        )
+        self._apply(batch_size, batch_sleep_ms)
+
+    def _apply(self, batch_size: int, batch_sleep_ms: int) -> None:
+        from chia_rs.sized_ints import uint32
+
+        self.batch_size = batch_size
+        self.batch_sleep_ms = batch_sleep_ms
+        # The plot manager reads the sleep from the refresh parameter after every batch
+        plot_manager = self._harvester.plot_manager
+        plot_manager.refresh_parameter = replace(
+            plot_manager.refresh_parameter,
+            batch_size=uint32(batch_size),
+            batch_sleep_milliseconds=uint32(batch_sleep_ms),
+        )
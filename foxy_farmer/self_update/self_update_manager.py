@@ -1,17 +1,22 @@
+import json
 import sys
-from asyncio import Task, create_task, sleep
+from asyncio import Task, create_task, sleep, to_thread, wait_for, TimeoutError
+from asyncio.subprocess import Process, create_subprocess_exec, DEVNULL, PIPE
+from hashlib import sha256
 from logging import getLogger
 from os.path import join
 from sys import platform
 from pathlib import Path
 from platform import machine, system
-from shutil import move
-from tempfile import TemporaryDirectory
+from shutil import move, rmtree
+from tempfile import TemporaryDirectory, mkdtemp
+from time import monotonic
 from typing import Optional, Dict, Any, Callable
 
 from aiohttp import ClientSession, ClientTimeout
 from packaging.version import Version
 
+from foxy_farmer.binary_manager.binary_manager import bin_cache_path
 from foxy_farmer.download.download_manager import DownloadManager
 from foxy_farmer.util.is_binary import is_binary
 from foxy_farmer.util.ssl_context import ssl_context
@@ -57,14 +62,25 @@ class SelfUpdateManager:
 
         return f"{prefix}ubuntu.zip"
 
+    @property
+    def _release_cache_path(self) -> Path:
+        return Path(join(bin_cache_path, "foxy-farmer"))
+
     did_update: bool = False
-    _download_manager: DownloadManager = DownloadManager()
+    _backend: Optional[str]
+    _download_manager: DownloadManager = DownloadManager(download_directory=Path(join(bin_cache_path, "downloads")))
     _logger = getLogger("self_updater")
     _periodic_update_task: Optional[Task[None]] = None
+    _prefetch_process: Optional[Process] = None
     _shut_down: bool = False
 
+    def __init__(self, backend: Optional[str] = None):
+        self._backend = backend
+
     async def shutdown(self):
         self._shut_down = True
+        if self._prefetch_process is not None and self._prefetch_process.returncode is None:
+            self._prefetch_process.terminate()
         if self._periodic_update_task is not None:
             await self._periodic_update_task
 
@@ -99,21 +115,106 @@ class SelfUpdateManager:
 
             return
 
-        self._logger.info(f"New version detected, starting self-update from {current_version} to {version_to_update_to} ..")
-        await self._replace_with_binary(version_to_update_to)
+        self._logger.info(f"New version detected, preparing the self-update from {current_version} to {version_to_update_to} in the background ..")
+        await self._prefetch_release(version_to_update_to)
+        if self._shut_down:
+            return
+        self._swap_binary(await to_thread(self._get_verified_staged_binary_path, version_to_update_to))
+        rmtree(self._release_cache_path, ignore_errors=True)
         self.did_update = True
         self._logger.info(f"✅ Completed self-update to {version_to_update_to}, restarting ..")
 
-    async def _replace_with_binary(self, version: str):
-        file_description = f"Foxy-Farmer {version}"
-        with TemporaryDirectory() as temp_dir:
+    async def _prefetch_release(self, version: str) -> None:
+        """ Stages the release and its backend binaries in a low priority process, so farming is not slowed down. """
+        started_at = monotonic()
+        backend_arguments = ["--backend", self._backend] if self._backend is not None else []
+        self._prefetch_process = await create_subprocess_exec(
+            sys.executable,
+            "prefetch",
+            "--release",
+            version,
+            *backend_arguments,
+            stdout=DEVNULL,
+            stderr=PIPE,
+        )
+        try:
+            _, stderr = await self._prefetch_process.communicate()
+            if self._shut_down:
+                return
+            output = stderr.decode("utf-8", errors="replace")[-2000:].strip()
+            if self._prefetch_process.returncode != 0:
+                raise RuntimeError(f"Preparing version {version} failed with code {self._prefetch_process.returncode}:\n{output}")
+            if len(output) > 0:
+                # Staging the backend binaries is allowed to fail, the new version downloads them on startup as well
+                self._logger.warning(f"Preparing version {version} reported:\n{output}")
+        finally:
+            self._prefetch_process = None
+        self._logger.info(f"Downloaded and verified version {version} in {monotonic() - started_at:.0f}s")
+
+    async def stage_release(self, version: str) -> Path:
+        """ Downloads, extracts and verifies a release into the bin-cache, which leaves only a rename for the update. """
+        staged_release_path = Path(join(self._release_cache_path, version))
+        if self._is_staged(version):
+            return Path(join(staged_release_path, self._binary_file_name_in_archive))
+        self._release_cache_path.mkdir(parents=True, exist_ok=True)
+        staging_path = Path(mkdtemp(prefix=f".{version}.staging-", dir=self._release_cache_path))
+        try:
             await self._download_manager.download_archive_and_extract(
                 file_url=f"https://downloads.foxypool.io/chia/foxy-farmer/{version}/{self._binary_archive_name}",
                 file_name=self._binary_archive_name,
-                to_path=temp_dir,
-                file_description=file_description,
+                to_path=staging_path,
+                file_description=f"Foxy-Farmer {version}",
             )
-            self._swap_binary(Path(join(temp_dir, self._binary_file_name_in_archive)))
+            # The archive checksums were verified before extracting, the version check catches a wrong release
+            binary_path = Path(join(staging_path, self._binary_file_name_in_archive))
+            await self._verify_binary_version(binary_path, version)
+            # Only detects changes to the staged binary, until the update uses it
+            manifest = {"version": version, "sha256": await to_thread(self._hash_file, binary_path)}
+            Path(join(staging_path, "manifest.json")).write_text(json.dumps(manifest))
+            rmtree(staged_release_path, ignore_errors=True)
+            staging_path.rename(staged_release_path)
+        finally:
+            rmtree(staging_path, ignore_errors=True)
+
+        return Path(join(staged_release_path, self._binary_file_name_in_archive))
+
+    def _is_staged(self, version: str) -> bool:
+        try:
+            self._get_verified_staged_binary_path(version)
+        except (OSError, ValueError, RuntimeError):
+            return False
+
+        return True
+
+    def _get_verified_staged_binary_path(self, version: str) -> Path:
+        # The staged binary might have been sitting in the cache for a while, check it is still what was verified
+        staged_release_path = Path(join(self._release_cache_path, version))
+        manifest = json.loads(Path(join(staged_release_path, "manifest.json")).read_text())
+        binary_path = Path(join(staged_release_path, self._binary_file_name_in_archive))
+        if manifest.get("version") != version or manifest.get("sha256") != self._hash_file(binary_path):
+            raise RuntimeError(f"The staged binary of version {version} does not match its manifest")
+
+        return binary_path
+
+    async def _verify_binary_version(self, binary_path: Path, version: str) -> None:
+        process = await create_subprocess_exec(str(binary_path), "--version", stdout=PIPE, stderr=DEVNULL)
+        try:
+            stdout, _ = await wait_for(process.communicate(), timeout=120)
+        except TimeoutError:
+            process.kill()
+
+            raise RuntimeError(f"The binary of version {version} did not respond in time")
+        output = stdout.decode("utf-8", errors="replace").strip()
+        if process.returncode != 0 or output != f"Foxy-Farmer {version}":
+            raise RuntimeError(f"The binary of version {version} reported '{output}' with code {process.returncode}")
+
+    def _hash_file(self, path: Path) -> str:
+        file_hash = sha256()
+        with open(path, "rb") as file:
+            while chunk := file.read(1024 * 1024):
+                file_hash.update(chunk)
+
+        return file_hash.hexdigest()
 
     def _swap_binary(self, new_binary_path: Path):
         if self._old_binary_path.exists():
@@ -0,0 +1,180 @@
+import json
+import sys
+from asyncio import sleep
+from logging import Logger, getLogger
+from os import environ, getpid
+from pathlib import Path
+from subprocess import Popen
+from time import time, monotonic
+from typing import Optional, Dict, Any
+
+# Signage points arrive 64 times per sub slot of 600 seconds
+signage_point_interval_seconds = 600 / 64
+handover_directory_environment_variable = "FOXY_FARMER_HANDOVER_DIRECTORY"
+
+
+def get_missed_signage_points(downtime_seconds: float) -> int:
+    return max(0, round(downtime_seconds / signage_point_interval_seconds) - 1)
+
+
+class UpdateHandover:
+    """ Hands farming over from the running process to the updated one through files in a shared directory. """
+    _poll_interval_seconds: float = 0.2
+    _directory: Path
+    _is_followed: bool = False
+    _logger: Logger = getLogger("update_handover")
+
+    def __init__(self, directory: Path):
+        self._directory = directory
+
+    @staticmethod
+    def from_environment() -> Optional["UpdateHandover"]:
+        directory = environ.pop(handover_directory_environment_variable, None)
+        if directory is None:
+            return None
+
+        return UpdateHandover(Path(directory))
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    @property
+    def is_followed(self) -> bool:
+        """ Whether the process this one was started from waits for this one, it follows the recorded successor instead. """
+        return self._is_followed
+
+    @property
+    def _predecessor_path(self) -> Path:
+        return self._directory / "predecessor.json"
+
+    @property
+    def _harvester_handshake_path(self) -> Path:
+        return self._directory / "harvester_handshake.bin"
+
+    @property
+    def _ready_path(self) -> Path:
+        return self._directory / "ready.json"
+
+    @property
+    def _drained_path(self) -> Path:
+        return self._directory / "drained.json"
+
+    @property
+    def _successor_path(self) -> Path:
+        return self._directory / "successor.json"
+
+    def prepare(self, harvester_handshake: Optional[bytes]) -> None:
+        self._directory.mkdir(parents=True, exist_ok=True)
+        for path in [self._harvester_handshake_path, self._ready_path, self._drained_path]:
+            path.unlink(missing_ok=True)
+        self._write_json(self._predecessor_path, {"pid": getpid()})
+        if harvester_handshake is not None:
+            self._harvester_handshake_path.write_bytes(harvester_handshake)
+
+    def start_successor(self) -> Popen:
+        # The binary was already replaced, so this starts the new version with the same arguments
+        return Popen(
+            [sys.executable, *sys.argv[1:]],
+            env={**environ, handover_directory_environment_variable: str(self._directory)},
+        )
+
+    def set_up_restart(self) -> None:
+        """ Lets the restarted process find the handover directory to measure the downtime of the update. """
+        environ[handover_directory_environment_variable] = str(self._directory)
+
+    def record_successor(self, successor: Popen) -> None:
+        # Recorded before this process exits, so the waiting process moves on to the successor instead of exiting
+        self._is_followed = self.read_successor_pid() == getpid()
+        self._write_json(self._successor_path, {"pid": successor.pid})
+
+    def read_successor_pid(self) -> Optional[int]:
+        return (self._read_json(self._successor_path) or {}).get("pid")
+
+    async def wait_until_successor_is_ready(self, successor: Popen, timeout_seconds: float) -> bool:
+        """ Returns False if the successor exited before it was ready, a successor which is not ready in time is used anyway. """
+        started_at = monotonic()
+        while not self._ready_path.exists():
+            if successor.poll() is not None:
+                return False
+            if monotonic() - started_at >= timeout_seconds:
+                self._logger.warning(f"The new version is not ready after {timeout_seconds:.0f}s, handing over anyway")
+
+                return True
+            await sleep(self._poll_interval_seconds)
+        ready = self._read_json(self._ready_path) or {}
+        self._logger.info(f"The new version is ready after {monotonic() - started_at:.1f}s with {ready.get('plot_count', 0)} plots loaded")
+
+        return True
+
+    def mark_drained(self, last_signage_point_at: Optional[float]) -> None:
+        self._write_json(self._drained_path, {"drained_at": time(), "last_signage_point_at": last_signage_point_at})
+
+    def read_harvester_handshake(self) -> Optional[bytes]:
+        if not self._harvester_handshake_path.exists():
+            return None
+
+        return self._harvester_handshake_path.read_bytes()
+
+    def mark_ready(self, plot_count: int) -> None:
+        self._write_json(self._ready_path, {"ready_at": time(), "plot_count": plot_count})
+
+    async def wait_until_drained(self) -> Dict[str, Any]:
+        predecessor_pid = (self._read_json(self._predecessor_path) or {}).get("pid")
+        while not self._drained_path.exists():
+            if predecessor_pid is not None and not self._is_process_running(predecessor_pid):
+                self._logger.warning("The previous version exited without handing over")
+
+                return {}
+            await sleep(self._poll_interval_seconds)
+
+        return self._read_json(self._drained_path) or {}
+
+    def _is_process_running(self, pid: int) -> bool:
+        from psutil import pid_exists
+
+        return pid_exists(pid)
+
+    def _write_json(self, path: Path, data: Dict[str, Any]) -> None:
+        # Write to a temporary file first, so the other process never reads a partial file
+        temporary_path = path.with_suffix(".tmp")
+        temporary_path.write_text(json.dumps(data))
+        temporary_path.replace(path)
+
+    def _read_json(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+
+
+def wait_for_successor(successor: Popen, update_handover: UpdateHandover) -> int:
+    """ Keeps this process around until the latest successor exits and forwards stop signals to it, like a restart on Windows. """
+    from psutil import Process, NoSuchProcess
+
+    successor_pid = successor.pid
+    if sys.platform != "win32":
+        from os import kill
+        from signal import signal, SIGINT, SIGTERM
+
+        def forward_signal(signal_number: int, _) -> None:
+            try:
+                kill(successor_pid, signal_number)
+            except OSError:
+                pass
+
+        signal(SIGINT, forward_signal)
+        signal(SIGTERM, forward_signal)
+
+    exit_code = successor.wait()
+    # Later updates hand over without keeping their process around, so follow the successor they recorded
+    while True:
+        next_successor_pid = update_handover.read_successor_pid()
+        if next_successor_pid is None or next_successor_pid == successor_pid:
+            return exit_code
+        successor_pid = next_successor_pid
+        try:
+            # Only the exit code of children is known, the later successors are not
+            exit_code = Process(successor_pid).wait() or 0
+        except NoSuchProcess:
+            exit_code = 0
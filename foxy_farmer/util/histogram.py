@@ -0,0 +1,76 @@
+from bisect import bisect_left
+from math import ceil
+from typing import Tuple, List, Dict, Any, Sequence
+
+latency_buckets_seconds: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30,
+)
+
+
+def percentile_of_sorted(values: Sequence[float], percentile: float) -> float:
+    """ Returns the nearest-rank percentile of already sorted values. """
+    rank = max(1, ceil(percentile / 100 * len(values)))
+
+    return values[min(rank, len(values)) - 1]
+
+
+class Histogram:
+    buckets: Tuple[float, ...]
+    counts: List[int]
+    count: int
+    sum: float
+    max: float
+
+    def __init__(self, buckets: Tuple[float, ...] = latency_buckets_seconds):
+        self.buckets = buckets
+        self.reset()
+
+    def reset(self) -> None:
+        # The last count is the implicit +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percentile: float) -> float:
+        """ Returns the upper bound of the bucket containing the percentile, capped to the largest observed value. """
+        if self.count == 0:
+            return 0
+        rank = percentile / 100 * self.count
+        cumulative_count = 0
+        for index, count in enumerate(self.counts):
+            cumulative_count += count
+            if cumulative_count >= rank and count > 0:
+                if index == len(self.buckets):
+                    return self.max
+
+                return min(self.buckets[index], self.max)
+
+        return self.max
+
+    def cumulative_counts(self) -> List[Tuple[float, int]]:
+        cumulative: List[Tuple[float, int]] = []
+        cumulative_count = 0
+        for upper_bound, count in zip((*self.buckets, float("inf")), self.counts):
+            cumulative_count += count
+            cumulative.append((upper_bound, cumulative_count))
+
+        return cumulative
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "buckets": {("+Inf" if upper_bound == float("inf") else str(upper_bound)): count for upper_bound, count in self.cumulative_counts()},
+        }
@@ -0,0 +1,24 @@
+from logging import getLogger
+from sys import platform
+
+
+def lower_process_priority() -> None:
+    """ Lowers the CPU and I/O priority of this process, so background work does not slow down proof lookups. """
+    from psutil import Process, Error
+
+    process = Process()
+    try:
+        if platform == "win32":
+            from psutil import IDLE_PRIORITY_CLASS, IOPRIO_VERYLOW
+
+            process.nice(IDLE_PRIORITY_CLASS)
+            process.ionice(IOPRIO_VERYLOW)
+
+            return
+        process.nice(19)
+        if platform == "linux":
+            from psutil import IOPRIO_CLASS_IDLE
+
+            process.ionice(IOPRIO_CLASS_IDLE)
+    except (Error, OSError) as e:
+        getLogger("process_priority").debug(f"Could not lower the process priority: {e}")
@@ -4,13 +4,11 @@ from setuptools import find_packages, setup
 
 dependencies = [
     "aiohttp>=3.10.4",
-    "aioudp==1.0.1",
     "chia-blockchain@git+https://github.com/foxypool/chia-blockchain@2.5.4-og-1.6.1#egg=chia-blockchain",
     "click>=8.1.7",
     "colorlog>=6.9.0",
     "humanize==4.11.0",
     "packaging>=24.0",
-    "pyparsing==3.2.0",
     "PyYAML>=6.0.2",
     "questionary==2.0.1",
     "sentry-sdk==2.17.0",
@@ -0,0 +1,213 @@
+import json
+import os
+import tarfile
+from asyncio import run
+from pathlib import Path
+from typing import Optional, List, Tuple
+
+import pytest
+from aiohttp import web
+
+from foxy_farmer.download.download_manager import DownloadManager
+
+segment_size = 64 * 1024
+
+
+class StandInServer:
+    """ Serves a file with range support like a release host, with knobs to misbehave. """
+    data: bytes
+    etag: Optional[str] = '"v1"'
+    honor_if_range: bool = True
+    failing_ranges: List[int]
+    requested_ranges: List[Tuple[int, int]]
+    change_after_requests: Optional[Tuple[int, bytes, str]] = None
+    _runner: web.AppRunner
+    url: str
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.failing_ranges = []
+        self.requested_ranges = []
+
+    async def __aenter__(self) -> "StandInServer":
+        app = web.Application()
+        app.router.add_get("/file.tar.gz", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/file.tar.gz"
+
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        if self.change_after_requests is not None and len(self.requested_ranges) >= self.change_after_requests[0]:
+            _, self.data, self.etag = self.change_after_requests
+            self.change_after_requests = None
+        headers = {"ETag": self.etag} if self.etag is not None else {}
+        range_header = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if range_header is None or (if_range is not None and (not self.honor_if_range or if_range != self.etag)):
+            return web.Response(body=self.data, headers=headers)
+        start, end = (int(position) for position in range_header.removeprefix("bytes=").split("-"))
+        self.requested_ranges.append((start, end))
+        if start in self.failing_ranges:
+            self.failing_ranges.remove(start)
+
+            return web.Response(status=503)
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(self.data)}"
+
+        return web.Response(status=206, body=self.data[start:end + 1], headers=headers)
+
+
+def make_download_manager() -> DownloadManager:
+    return DownloadManager(connections=3, segment_size=segment_size, retry_delay_seconds=0)
+
+
+def write_journal(partial_path: Path, url: str, data: bytes, validator: Optional[str], downloaded_segments: int) -> None:
+    segments = []
+    for start in range(0, len(data), segment_size):
+        end = min(start + segment_size, len(data)) - 1
+        segments.append([start, end, end - start + 1 if len(segments) < downloaded_segments else 0])
+    with open(partial_path, "wb") as file:
+        file.truncate(len(data))
+        file.write(data[:downloaded_segments * segment_size])
+    journal_path = partial_path.with_name(f"{partial_path.name}.json")
+    journal_path.write_text(json.dumps({"url": url, "total_bytes": len(data), "validator": validator, "segments": segments}))
+
+
+def test_resumes_from_journal(tmp_path: Path):
+    data = os.urandom(5 * segment_size + 123)
+
+    async def download() -> None:
+        async with StandInServer(data) as server:
+            to_path = tmp_path / "file.tar.gz"
+            write_journal(tmp_path / "file.tar.gz.part", server.url, data, server.etag, downloaded_segments=2)
+            stats = await make_download_manager().download_file(server.url, to_path, "test file")
+
+            assert to_path.read_bytes() == data
+            assert stats.resumed_bytes == 2 * segment_size
+            assert (0, segment_size - 1) not in server.requested_ranges
+            assert (segment_size, 2 * segment_size - 1) not in server.requested_ranges
+            assert not (tmp_path / "file.tar.gz.part.json").exists()
+
+    run(download())
+
+
+def test_falls_back_to_a_single_connection_when_ranges_are_ignored(tmp_path: Path):
+    data = os.urandom(4 * segment_size)
+
+    async def download() -> None:
+        async with StandInServer(data) as server:
+            server.honor_if_range = False
+            to_path = tmp_path / "file.tar.gz"
+            stats = await make_download_manager().download_file(server.url, to_path, "test file")
+
+            assert to_path.read_bytes() == data
+            assert stats.connections == 1
+
+    run(download())
+
+
+def test_does_not_resume_without_a_validator(tmp_path: Path):
+    data = os.urandom(3 * segment_size)
+
+    async def download() -> None:
+        async with StandInServer(data) as server:
+            server.etag = None
+            to_path = tmp_path / "file.tar.gz"
+            write_journal(tmp_path / "file.tar.gz.part", server.url, os.urandom(len(data)), None, downloaded_segments=2)
+            stats = await make_download_manager().download_file(server.url, to_path, "test file")
+
+            assert to_path.read_bytes() == data
+            assert stats.resumed_bytes == 0
+
+    run(download())
+
+
+def test_starts_over_when_the_validator_changed(tmp_path: Path):
+    data = os.urandom(3 * segment_size)
+
+    async def download() -> None:
+        async with StandInServer(data) as server:
+            to_path = tmp_path / "file.tar.gz"
+            write_journal(tmp_path / "file.tar.gz.part", server.url, os.urandom(len(data)), '"v0"', downloaded_segments=2)
+            stats = await make_download_manager().download_file(server.url, to_path, "test file")
+
+            assert to_path.read_bytes() == data
+            assert stats.resumed_bytes == 0
+
+    run(download())
+
+
+def test_starts_over_when_the_file_changes_during_the_download(tmp_path: Path):
+    data = os.urandom(6 * segment_size)
+    changed_data = os.urandom(6 * segment_size)
+
+    async def download() -> None:
+        async with StandInServer(data) as server:
+            server.change_after_requests = (3, changed_data, '"v2"')
+            to_path = tmp_path / "file.tar.gz"
+            await make_download_manager().download_file(server.url, to_path, "test file")
+
+            assert to_path.read_bytes() == changed_data
+
+    run(download())
+
+
+def test_retries_failed_segments(tmp_path: Path):
+    data = os.urandom(4 * segment_size)
+
+    async def download() -> None:
+        async with StandInServer(data) as server:
+            server.failing_ranges = [segment_size, 3 * segment_size, 3 * segment_size]
+            to_path = tmp_path / "file.tar.gz"
+            stats = await make_download_manager().download_file(server.url, to_path, "test file")
+
+            assert to_path.read_bytes() == data
+            assert stats.retries == 3
+            assert stats.connections == 3
+
+    run(download())
+
+
+def make_archive(tmp_path: Path) -> bytes:
+    archive_path = tmp_path / "source.tar.gz"
+    (tmp_path / "chia").write_bytes(os.urandom(3 * segment_size))
+    with tarfile.open(archive_path, "w:gz") as archive:
+        archive.add(tmp_path / "chia", arcname="chia")
+
+    return archive_path.read_bytes()
+
+
+def test_extracts_a_verified_archive(tmp_path: Path):
+    data = make_archive(tmp_path)
+
+    async def download() -> None:
+        async with StandInServer(data) as server:
+            download_manager = DownloadManager(download_directory=tmp_path / "downloads", segment_size=segment_size)
+            await download_manager.download_archive_and_extract(server.url, "file.tar.gz", tmp_path / "extracted", "test archive")
+
+            assert (tmp_path / "extracted" / "chia").read_bytes() == (tmp_path / "chia").read_bytes()
+
+    run(download())
+
+
+def test_does_not_extract_a_corrupt_archive(tmp_path: Path):
+    data = bytearray(make_archive(tmp_path))
+    data[len(data) // 2] ^= 0xFF
+
+    async def download() -> None:
+        async with StandInServer(bytes(data)) as server:
+            download_manager = DownloadManager(download_directory=tmp_path / "downloads", segment_size=segment_size)
+            with pytest.raises(RuntimeError):
+                await download_manager.download_archive_and_extract(server.url, "file.tar.gz", tmp_path / "extracted", "test archive")
+
+            assert not (tmp_path / "extracted").exists()
+            assert not (tmp_path / "downloads" / "file.tar.gz").exists()
+
+    run(download())